@@ -0,0 +1,241 @@
+"""
+Phase2: OpenAI による注文フィールド抽出の非同期クライアント
+
+ChatCompletion.acreate を同時実行数の上限（セマフォ）付きで呼び出し、リクエストごとの制限時間、
+レート制限（429）時のバックオフ再送、処理中の同一本文のリクエスト集約を行う。
+1回のポーリング分のメールをまとめて投入し、まとめて結果を待てる（extract_many）。
+同期コード（パイプラインのスレッド）からは LLMExtractionRunner 経由で共有のイベントループに委譲する。
+"""
+import asyncio
+import copy
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import openai
+
+from src.phase2.extraction_router import ExtractionRouter, get_default_router
+from src.phase2.llm_stub import LLM_MODEL, build_messages, parse_llm_response
+
+logger = logging.getLogger(__name__)
+
+
+class LLMExtractionError(Exception):
+    """LLM による抽出に失敗した（再送上限までレート制限が続いた等）"""
+
+
+class LLMExtractionTimeout(LLMExtractionError):
+    """LLM の応答が制限時間内に返らなかった"""
+
+
+@dataclass
+class LLMExtractionStats:
+    requests: int = 0
+    coalesced: int = 0
+    retries: int = 0
+    timeouts: int = 0
+    errors: int = 0
+
+
+class AsyncLLMExtractor:
+    """
+    extract_order_fields の非同期版。ExtractionRouter で決定的抽出の確信度が足りない
+    文書だけを、上限付きの同時実行で OpenAI に送る。
+    同じ本文のリクエストが処理中なら新たに送らず、その結果を共有する。
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 4,
+        timeout: float = 30.0,
+        max_retries: int = 3,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0,
+        model: str = LLM_MODEL,
+        router: Optional[ExtractionRouter] = None,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.model = model
+        self.router = router or get_default_router()
+        self.stats = LLMExtractionStats()
+        # セマフォと処理中リクエストはイベントループごとに持つ（asyncio.run を跨いで使えるように）
+        self._loops: "weakref.WeakKeyDictionary[Any, Tuple[asyncio.Semaphore, Dict[str, asyncio.Future]]]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def _state(self) -> Tuple[asyncio.Semaphore, Dict[str, asyncio.Future]]:
+        loop = asyncio.get_running_loop()
+        state = self._loops.get(loop)
+        if state is None:
+            state = (asyncio.Semaphore(self.max_concurrency), {})
+            self._loops[loop] = state
+        return state
+
+    def _backoff(self, error: Exception, attempt: int) -> float:
+        headers = getattr(error, "headers", None) or {}
+        try:
+            return float(headers.get("retry-after"))
+        except (TypeError, ValueError):
+            cap = min(self.backoff_max, self.backoff_base * (2**attempt))
+            return random.uniform(cap / 2, cap)
+
+    async def _request(self, text: str, semaphore: asyncio.Semaphore) -> dict:
+        openai.api_key = os.getenv("OPENAI_API_KEY")
+        messages = build_messages(text)
+        attempt = 0
+        while True:
+            async with semaphore:
+                self.stats.requests += 1
+                try:
+                    resp = await asyncio.wait_for(
+                        openai.ChatCompletion.acreate(
+                            model=self.model,
+                            messages=messages,
+                            temperature=0,
+                            request_timeout=self.timeout,
+                        ),
+                        self.timeout,
+                    )
+                    return parse_llm_response(resp)
+                except (asyncio.TimeoutError, openai.error.Timeout) as e:
+                    self.stats.timeouts += 1
+                    raise LLMExtractionTimeout(
+                        f"LLM extraction exceeded {self.timeout:.1f}s"
+                    ) from e
+                except openai.error.RateLimitError as e:
+                    if attempt >= self.max_retries:
+                        self.stats.errors += 1
+                        raise LLMExtractionError(
+                            f"LLM rate limited after {attempt + 1} attempts: {e}"
+                        ) from e
+                    delay = self._backoff(e, attempt)
+            # 待機中は同時実行枠を他のリクエストに譲る
+            self.stats.retries += 1
+            logger.warning(f"OpenAI rate limited; retry in {delay:.2f}s")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def complete(self, text: str) -> dict:
+        """振り分けをせずに OpenAI で抽出する（処理中の同一本文とはリクエストを共有）"""
+        semaphore, inflight = self._state()
+        task = inflight.get(text)
+        if task is None:
+            task = asyncio.ensure_future(self._request(text, semaphore))
+            inflight[text] = task
+            task.add_done_callback(lambda _, key=text: inflight.pop(key, None))
+        else:
+            self.stats.coalesced += 1
+        # 待ち手の1つがキャンセルされても共有中のリクエストは止めない
+        return copy.deepcopy(await asyncio.shield(task))
+
+    async def extract(self, text: str) -> dict:
+        """本文から注文フィールドを抽出する（戻り値は extract_order_fields と同じ形式）"""
+        fields = self.router.route(text)
+        if fields is not None:
+            return fields
+        start = time.perf_counter()
+        try:
+            return await self.complete(text)
+        finally:
+            self.router.record_llm(time.perf_counter() - start)
+
+    async def extract_many(self, texts: Iterable[str]) -> List[Any]:
+        """
+        複数の本文をまとめて抽出する。結果は入力順で、失敗した本文の位置には例外が入る。
+        """
+        return await asyncio.gather(
+            *(self.extract(text) for text in texts), return_exceptions=True
+        )
+
+
+class LLMExtractionRunner:
+    """
+    AsyncLLMExtractor を専用スレッドのイベントループで動かし、同期コードから利用する。
+    複数スレッドからの呼び出しは同じループに集まるため、同時実行数の上限と
+    リクエスト集約はプロセス全体で効く。
+    """
+
+    def __init__(self, extractor: Optional[AsyncLLMExtractor] = None):
+        self.extractor = extractor or AsyncLLMExtractor()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="llm-extractor", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, text: str) -> "Future[dict]":
+        """抽出を投入し、結果を受け取る Future を返す"""
+        return asyncio.run_coroutine_threadsafe(
+            self.extractor.extract(text), self._loop
+        )
+
+    def extract(self, text: str) -> dict:
+        return self.submit(text).result()
+
+    def complete(self, text: str) -> dict:
+        """振り分け済みの本文を OpenAI で抽出する（extract_order_fields の LLM 段階から利用）"""
+        return asyncio.run_coroutine_threadsafe(
+            self.extractor.complete(text), self._loop
+        ).result()
+
+    def extract_batch(self, texts: Iterable[str]) -> List[Any]:
+        """1回のポーリング分などをまとめて投入して待つ（失敗した位置には例外が入る）"""
+        return asyncio.run_coroutine_threadsafe(
+            self.extractor.extract_many(list(texts)), self._loop
+        ).result()
+
+    def close(self) -> None:
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def __enter__(self) -> "LLMExtractionRunner":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+_running: Optional[LLMExtractionRunner] = None
+_running_lock = threading.Lock()
+
+
+def start_llm_extractor() -> LLMExtractionRunner:
+    """
+    プロセス共有の LLMExtractionRunner を起動する。起動中は extract_order_fields の
+    LLM 呼び出しがこのランナーに委譲される。
+    LLM_MAX_CONCURRENCY, LLM_TIMEOUT（秒）, LLM_MAX_RETRIES で調整可能。
+    """
+    global _running
+    with _running_lock:
+        if _running is None:
+            _running = LLMExtractionRunner(
+                AsyncLLMExtractor(
+                    max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "4")),
+                    timeout=float(os.getenv("LLM_TIMEOUT", "30")),
+                    max_retries=int(os.getenv("LLM_MAX_RETRIES", "3")),
+                )
+            )
+        return _running
+
+
+def get_running_llm_extractor() -> Optional[LLMExtractionRunner]:
+    return _running
+
+
+def stop_llm_extractor() -> None:
+    global _running
+    with _running_lock:
+        runner, _running = _running, None
+    if runner is not None:
+        runner.close()
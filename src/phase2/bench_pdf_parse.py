@@ -0,0 +1,149 @@
+"""
+Phase2: 複数ページ請求書PDFの解析時間を計測するベンチマーク
+
+ParsedPdf で添付を一度だけ開く parse_order と、従来どおり抽出関数ごとに
+PDFを開き直す処理（legacy）の1件あたりの所要時間を比較する。
+
+    python -m src.phase2.bench_pdf_parse --pages 1 5 10 --repeat 5
+"""
+import argparse
+import time
+
+from src.phase2.transform import ParsedPdf, extract_metadata_from_text, parse_order
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _page_stream(lines: list[str], rows: list[tuple[str, str]]) -> bytes:
+    ops = ["BT /F1 10 Tf 50 800 Td 14 TL"]
+    ops += [f"({_escape(line)}) Tj T*" for line in lines]
+    ops.append("ET")
+    if rows:
+        # 罫線付きの明細テーブル（Product / Quantity）
+        top, height, xs = 340, 14, (50, 250, 350)
+        bottom = top - height * len(rows)
+        for i in range(len(rows) + 1):
+            ops.append(f"{xs[0]} {top - i * height} m {xs[-1]} {top - i * height} l S")
+        for x in xs:
+            ops.append(f"{x} {top} m {x} {bottom} l S")
+        for i, (pid, qty) in enumerate(rows):
+            y = top - (i + 1) * height + 4
+            ops.append(f"BT /F1 9 Tf {xs[0] + 4} {y} Td ({_escape(pid)}) Tj ET")
+            ops.append(f"BT /F1 9 Tf {xs[1] + 4} {y} Td ({_escape(qty)}) Tj ET")
+    return "\n".join(ops).encode("latin-1")
+
+
+def make_invoice_pdf(
+    pages: int,
+    rows_per_page: int = 20,
+    table: bool = True,
+    table_page: int | None = None,
+) -> bytes:
+    """
+    ベンチマーク/テスト用の請求書PDFを生成する。
+    table=True なら罫線付き明細表、False なら「品名 単価 数量 金額」の行形式。
+    明細は table_page ページ目（0始まり、既定は最終ページ）に置き、他は注記のみ。
+    """
+    table_page = pages - 1 if table_page is None else table_page
+    streams = []
+    for n in range(pages):
+        last = n == table_page
+        lines = [f"Invoice page {n + 1}/{pages}"]
+        lines += [f"Note {n}-{i}: terms and conditions apply" for i in range(30)]
+        rows: list[tuple[str, str]] = []
+        if last and table:
+            rows = [("Product", "Quantity")]
+            rows += [(f"P{i:03d}", str(i % 9 + 1)) for i in range(rows_per_page)]
+        elif last:
+            lines += [
+                f"Item{i:03d} 1,200 {i % 9 + 1} 3,600" for i in range(rows_per_page)
+            ]
+        streams.append(_page_stream(lines, rows))
+
+    objects: list[bytes] = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"",  # Pages（ページ番号確定後に設定）
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for stream in streams:
+        content_id = len(objects) + 1
+        objects.append(
+            b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream)
+        )
+        kids.append(len(objects) + 1)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % k for k in kids),
+        len(kids),
+    )
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (i, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % off for off in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1,
+        xref,
+    )
+    return bytes(out)
+
+
+def _fresh_text(pdf_bytes: bytes) -> str:
+    with ParsedPdf(pdf_bytes) as parsed:
+        return parsed.text
+
+
+def legacy_parse(pdf_bytes: bytes) -> None:
+    """従来の parse_order と同じ順序で、抽出ごとにPDFを開き直す"""
+    # 1回目: テーブル抽出
+    with ParsedPdf(pdf_bytes) as parsed:
+        tables = [parsed.page_tables(i) for i in range(parsed.page_count)]
+    if not any(tables):
+        # 2回目: extract_items_from_pdf 内のテキストフォールバック
+        _fresh_text(pdf_bytes)
+    # 3回目: メタ情報（または LLM 入力）用のテキスト抽出
+    extract_metadata_from_text(_fresh_text(pdf_bytes))
+
+
+def measure(func, pdf_bytes: bytes, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(pdf_bytes)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 5, 10, 20])
+    parser.add_argument("--rows", type=int, default=20, help="明細行数")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(
+        f"{'layout':>6} {'pages':>6} {'legacy[ms]':>11} {'single[ms]':>11} {'speedup':>8}"
+    )
+    for layout in ("table", "text"):
+        for pages in args.pages:
+            pdf_bytes = make_invoice_pdf(pages, args.rows, table=layout == "table")
+            legacy = measure(legacy_parse, pdf_bytes, args.repeat)
+            single = measure(
+                lambda b: parse_order({"pdf": b, "body": ""}), pdf_bytes, args.repeat
+            )
+            print(
+                f"{layout:>6} {pages:>6} {legacy * 1000:>11.1f} "
+                f"{single * 1000:>11.1f} {legacy / single:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Phase2: 明細ページの絞り込み（キーワードプローブ + ページ数上限）の効果を計測するベンチマーク
+
+明細表が1〜2ページ目にあり、後続に約款ページが続く請求書を生成し、
+全ページを走査する従来方式（full）と ParsedPdf の遅延走査（lazy）を比較する。
+
+    python -m src.phase2.bench_pdf_scan --pages 2 10 30 --max-pages 5
+"""
+import argparse
+import time
+
+from src.phase2.bench_pdf_parse import make_invoice_pdf
+from src.phase2.transform import ParsedPdf, extract_items_from_pdf
+
+
+def full_scan(pdf_bytes: bytes) -> None:
+    """全ページでテーブル抽出し、全ページのテキストを抽出する（従来方式）"""
+    with ParsedPdf(pdf_bytes, max_pages=0) as parsed:
+        for index in range(parsed.page_count):
+            if parsed.page_tables(index):
+                break
+        parsed.text
+
+
+def lazy_scan(pdf_bytes: bytes, max_pages: int) -> None:
+    with ParsedPdf(pdf_bytes, max_pages=max_pages) as parsed:
+        extract_items_from_pdf(parsed)
+        parsed.text
+
+
+def build_corpus(page_counts: list[int], rows: int) -> list[tuple[str, bytes]]:
+    corpus = []
+    for pages in page_counts:
+        for table_page in sorted({0, min(1, pages - 1)}):
+            name = f"table p{table_page + 1}/{pages}"
+            corpus.append((name, make_invoice_pdf(pages, rows, table_page=table_page)))
+    return corpus
+
+
+def measure(func, *args, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(*args)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, nargs="+", default=[2, 10, 30])
+    parser.add_argument("--rows", type=int, default=15, help="明細行数")
+    parser.add_argument("--max-pages", type=int, default=5, help="解析ページ数上限")
+    parser.add_argument("--repeat", type=int, default=2)
+    args = parser.parse_args()
+
+    print(f"{'fixture':>16} {'full[ms]':>9} {'lazy[ms]':>9} {'speedup':>8}")
+    total_full = total_lazy = 0.0
+    for name, pdf_bytes in build_corpus(args.pages, args.rows):
+        full = measure(full_scan, pdf_bytes, repeat=args.repeat)
+        lazy = measure(lazy_scan, pdf_bytes, args.max_pages, repeat=args.repeat)
+        total_full += full
+        total_lazy += lazy
+        print(
+            f"{name:>16} {full * 1000:>9.1f} {lazy * 1000:>9.1f} {full / lazy:>7.1f}x"
+        )
+    print(
+        f"{'total':>16} {total_full * 1000:>9.1f} {total_lazy * 1000:>9.1f} "
+        f"{total_full / total_lazy:>7.1f}x"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Phase2: LLM プロンプトのトークン数を絞り込み前後で比較するベンチマーク
+
+bench_field_extractor のメール本文に、過去のやり取りの引用（旧注文の商品コード入り）、
+会社署名、PDFのOCRテキスト（約款）を付けた長い返信スレッドを生成し、
+本文全体を埋め込む従来のプロンプトと reduce_prompt_text 適用後のプロンプトを比較する。
+今回の注文の商品コードが残っているか（保持率）、旧注文のコードが混入していないかも確認する。
+
+    python -m src.phase2.bench_prompt_size --emails 1000 --budget 1000
+"""
+import argparse
+import random
+import re
+import statistics
+import time
+
+from src.phase2.bench_field_extractor import make_corpus
+from src.phase2.llm_stub import build_messages
+from src.phase2.prompt_window import estimate_tokens, reduce_prompt_text
+
+_CODE_RE = re.compile(r"\b[ABCPZ]\d{3}\b")
+
+SIGNATURE = """
+━━━━━━━━━━━━━━━━━━━━
+株式会社サンプル商事 購買部
+佐藤 太郎
+〒100-0001 東京都千代田区千代田1-1
+TEL: 03-1234-5678 / FAX: 03-1234-5679
+E-mail: sato@example.co.jp
+━━━━━━━━━━━━━━━━━━━━
+"""
+
+TERMS = [
+    "本請求書の記載内容に誤りがある場合は、受領後7日以内にご連絡ください。",
+    "お支払いは請求書発行日の翌月末日までに指定口座へお振込みください。",
+    "振込手数料は貴社にてご負担いただきますようお願いいたします。",
+    "返品・交換は未開封の商品に限り、到着後14日以内に承ります。",
+]
+
+
+def _old_message(rng: random.Random, n: int) -> str:
+    rows = "".join(
+        f"> 商品: Z{rng.randint(100, 999)}\n> 数量: {rng.randint(1, 20)}\n"
+        for _ in range(3)
+    )
+    return (
+        f"\n-----Original Message-----\nFrom: 購買部 <buyer{n}@example.co.jp>\n"
+        f"Sent: 2025/0{rng.randint(1, 9)}/1{n} 10:00\n\n"
+        f"前回の注文内容です。\n{rows}" + "> よろしくお願いいたします。\n" * 10
+    )
+
+
+def make_thread_corpus(n: int, seed: int = 0) -> list[tuple[str, set[str]]]:
+    """(メール全文, 今回の注文の商品コード) の組を生成する"""
+    rng = random.Random(seed)
+    corpus = []
+    for i, email in enumerate(make_corpus(n, seed)):
+        expected = set(_CODE_RE.findall(email))
+        text = email + SIGNATURE
+        if i % 3 == 0:
+            # PDF添付のOCRテキスト（parse_order では本文の後ろに連結される）
+            text += "\n" + "\n".join(TERMS * 5)
+        text += "".join(_old_message(rng, k) for k in range(rng.randint(1, 6)))
+        corpus.append((text, expected))
+    return corpus
+
+
+def prompt_tokens(text: str, budget: int, reduce: bool) -> int:
+    """system/user メッセージの合計トークン数"""
+    overhead = sum(estimate_tokens(m["content"]) for m in build_messages(""))
+    body = reduce_prompt_text(text, budget) if reduce else text
+    return overhead + estimate_tokens(body)
+
+
+def _summary(values: list[int]) -> str:
+    ordered = sorted(values)
+    p95 = ordered[int(len(ordered) * 0.95) - 1]
+    return (
+        f"mean {statistics.mean(values):>8.1f}  median {statistics.median(values):>7.1f}"
+        f"  p95 {p95:>6}  max {ordered[-1]:>6}  total {sum(values):>9}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--emails", type=int, default=1000)
+    parser.add_argument("--budget", type=int, default=1000, help="本文のトークン上限")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = make_thread_corpus(args.emails, args.seed)
+    before = [prompt_tokens(t, args.budget, reduce=False) for t, _ in corpus]
+    start = time.perf_counter()
+    reduced = [reduce_prompt_text(t, args.budget) for t, _ in corpus]
+    elapsed = time.perf_counter() - start
+    after = [prompt_tokens(t, args.budget, reduce=True) for t, _ in corpus]
+
+    kept = sum(
+        len(exp & set(_CODE_RE.findall(r))) for r, (_, exp) in zip(reduced, corpus)
+    )
+    total = sum(len(exp) for _, exp in corpus)
+    leaked = sum(1 for r in reduced if re.search(r"\bZ\d{3}\b", r))
+
+    print(f"emails: {len(corpus)}  budget: {args.budget} tokens")
+    print(f"before: {_summary(before)}")
+    print(f"after : {_summary(after)}")
+    print(f"reduction: {1 - sum(after) / sum(before):.1%}")
+    print(f"order codes kept: {kept}/{total}  old-thread codes leaked: {leaked}")
+    print(f"reduce_prompt_text: {elapsed / len(corpus) * 1e6:.1f} us/email")
+
+
+if __name__ == "__main__":
+    main()
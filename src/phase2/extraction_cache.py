@@ -0,0 +1,219 @@
+"""Phase2: parse_order 結果のコンテンツハッシュキャッシュ（SQLite + LRU）"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import date
+from typing import Any, Callable, Dict, Optional
+
+from src.phase2.transform import OrderData, parse_order
+
+# 抽出ロジックを変更したら上げる。キーに含まれるため旧バージョンの結果は参照されない
+EXTRACTOR_VERSION = "1"
+
+
+def _normalize_body(body: str) -> str:
+    # 改行コードと行末空白の違いだけを同一視する。抽出は行・表の構造や全角文字に
+    # 依存するため、改行の位置や文字そのものは変えない
+    lines = body.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).rstrip("\n")
+
+
+def _encode(result: Any) -> str:
+    orders = result if isinstance(result, list) else [result]
+    return json.dumps(
+        {
+            "single": not isinstance(result, list),
+            "orders": [
+                {
+                    **vars(o),
+                    "delivery_date": (
+                        o.delivery_date.isoformat()
+                        if isinstance(o.delivery_date, date)
+                        else o.delivery_date
+                    ),
+                }
+                for o in orders
+            ],
+        },
+        ensure_ascii=False,
+    )
+
+
+def _decode(value: str) -> Any:
+    data = json.loads(value)
+    orders = []
+    for o in data["orders"]:
+        raw = o.get("delivery_date")
+        o["delivery_date"] = date.fromisoformat(raw) if raw else raw
+        orders.append(OrderData(**o))
+    return orders[0] if data["single"] else orders
+
+
+class ExtractionCache:
+    """
+    PDFバイト列・正規化した本文・抽出ロジックのバージョンの SHA-256 をキーに、
+    parse_order の結果を SQLite に保存するキャッシュ。件数上限を超えると
+    最終参照が最も古いエントリから削除する。
+    """
+
+    def __init__(
+        self,
+        path: str = ":memory:",
+        max_entries: int = 10000,
+        version: str = EXTRACTOR_VERSION,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.version = version
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # 参照のたびに最終参照時刻を書き込むため、WAL で書き込みコストを抑える
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS extraction_cache ("
+            " key TEXT PRIMARY KEY, version TEXT NOT NULL, value TEXT NOT NULL,"
+            " created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_extraction_cache_accessed"
+            " ON extraction_cache (accessed_at)"
+        )
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key_for(self, input_data: Any) -> str:
+        """parse_order の入力からキャッシュキーを計算する"""
+        h = hashlib.sha256()
+        h.update(f"v{self.version}\0".encode())
+        if isinstance(input_data, dict):
+            pdf = input_data.get("pdf")
+            body = input_data.get("body", "") or ""
+        else:
+            pdf = None
+            body = input_data
+        if isinstance(body, (bytes, bytearray)):
+            body = bytes(body).decode(errors="ignore")
+        if pdf is not None:
+            h.update(b"pdf\0")
+            h.update(hashlib.sha256(pdf).digest())
+        h.update(b"body\0")
+        h.update(_normalize_body(str(body)).encode())
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM extraction_cache WHERE key = ? AND version = ?",
+                (key, self.version),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE extraction_cache SET accessed_at = ? WHERE key = ?",
+                (time.time(), key),
+            )
+            self._conn.commit()
+            self.hits += 1
+        return _decode(row[0])
+
+    def put(self, key: str, result: Any) -> None:
+        value = _encode(result)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO extraction_cache"
+                " (key, version, value, created_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, self.version, value, now, now),
+            )
+            (count,) = self._conn.execute(
+                "SELECT COUNT(*) FROM extraction_cache"
+            ).fetchone()
+            overflow = count - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM extraction_cache WHERE key IN ("
+                    " SELECT key FROM extraction_cache"
+                    " ORDER BY accessed_at LIMIT ?)",
+                    (overflow,),
+                )
+                self.evictions += overflow
+            self._conn.commit()
+
+    def get_or_parse(
+        self, input_data: Any, parse: Optional[Callable[[], Any]] = None
+    ) -> Any:
+        """キャッシュにあれば返し、なければ parse()（既定は parse_order）の結果を保存して返す"""
+        key = self.key_for(input_data)
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        result = parse() if parse is not None else parse_order(input_data)
+        self.put(key, result)
+        return result
+
+    def invalidate(self, all_versions: bool = True) -> int:
+        """
+        キャッシュを破棄し、削除件数を返す。
+        all_versions=False の場合は現在のバージョン以外（古い抽出ロジックの結果）のみ削除する。
+        """
+        with self._lock:
+            if all_versions:
+                cur = self._conn.execute("DELETE FROM extraction_cache")
+            else:
+                cur = self._conn.execute(
+                    "DELETE FROM extraction_cache WHERE version != ?", (self.version,)
+                )
+            self._conn.commit()
+            return cur.rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        """ヒット/ミス/追い出し件数とヒット率を返す"""
+        with self._lock:
+            (size,) = self._conn.execute(
+                "SELECT COUNT(*) FROM extraction_cache"
+            ).fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": size,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_default_cache: Optional[ExtractionCache] = None
+_default_lock = threading.Lock()
+
+
+def get_default_extraction_cache() -> Optional[ExtractionCache]:
+    """
+    環境変数 EXTRACTION_CACHE_PATH（SQLiteファイル）が設定されている場合に
+    プロセス共有のキャッシュを返す。未設定時はキャッシュ無効（None）。
+    件数上限は EXTRACTION_CACHE_MAX_ENTRIES。
+    """
+    global _default_cache
+    path = os.getenv("EXTRACTION_CACHE_PATH", "")
+    if not path:
+        return None
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ExtractionCache(
+                path,
+                max_entries=int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", "10000")),
+            )
+            # 抽出ロジック更新後の起動時に旧バージョンの結果を掃除する
+            _default_cache.invalidate(all_versions=False)
+        return _default_cache
@@ -0,0 +1,217 @@
+"""
+Phase2: 段階的な注文フィールド抽出ルーター
+
+安価な決定的抽出（明細表・英語レイアウト → 正規表現スタブ）を順に試し、結果の確信度
+（必須項目の有無・商品IDのカタログ一致・数量の妥当性）が閾値以上ならそのまま採用する。
+どの段階も閾値に届かない文書だけを LLM に回し、段階ごとの採用数・所要時間、
+LLM への昇格率と LLM 呼び出しを省いた推定コストを集計する。
+"""
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Collection, Dict, List, Optional, Tuple
+
+from src.phase2.llm_stub import extract_rule_based, stub_fields
+
+# 決定的抽出の段階（安い順）。None を返した段階は該当なしとして次へ進む
+TIERS: List[Tuple[str, Callable[[str], Optional[dict]]]] = [
+    ("rule", extract_rule_based),
+    ("regex", stub_fields),
+]
+
+
+@dataclass
+class Confidence:
+    """抽出結果の確信度（0〜1）と減点理由"""
+
+    score: float
+    reasons: List[str] = field(default_factory=list)
+
+
+def _items(fields: dict) -> List[dict]:
+    if fields.get("items"):
+        return [i for i in fields["items"] if isinstance(i, dict)]
+    if fields.get("product_id") is not None or fields.get("quantity") is not None:
+        return [
+            {"product_id": fields.get("product_id"), "quantity": fields.get("quantity")}
+        ]
+    return []
+
+
+class ExtractionRouter:
+    """
+    extract_order_fields の段階振り分け。catalog（商品ID/商品名の集合）を渡すと、
+    カタログにない商品IDを含む結果の確信度を下げる。
+    """
+
+    # 確信度の配点（明細がなければ0点）
+    WEIGHT_ITEMS = 0.4
+    WEIGHT_QUANTITY = 0.2
+    WEIGHT_CATALOG = 0.2
+    WEIGHT_CUSTOMER = 0.1
+    WEIGHT_DELIVERY = 0.1
+
+    def __init__(
+        self,
+        catalog: Optional[Collection[str]] = None,
+        threshold: float = 0.8,
+        max_quantity: int = 10000,
+        llm_cost_per_call: float = 0.01,
+    ):
+        self.catalog = catalog
+        self.threshold = threshold
+        self.max_quantity = max_quantity
+        self.llm_cost_per_call = llm_cost_per_call
+        self._lock = threading.Lock()
+        self.documents = 0
+        self.escalations = 0
+        # 段階振り分けがなければ LLM に送っていた文書数（省いた呼び出し数の基準）
+        self.baseline_llm_calls = 0
+        self.tier_stats: Dict[str, Dict[str, float]] = {
+            name: {"attempts": 0, "accepted": 0, "seconds": 0.0}
+            for name in [t[0] for t in TIERS] + ["llm"]
+        }
+
+    def set_catalog(self, catalog: Optional[Collection[str]]) -> None:
+        self.catalog = catalog
+
+    def score(self, fields: Optional[dict]) -> Confidence:
+        """抽出結果の確信度を計算する"""
+        if not fields:
+            return Confidence(0.0, ["empty"])
+        items = _items(fields)
+        complete = [
+            i for i in items if i.get("product_id") and i.get("quantity") is not None
+        ]
+        if not items or len(complete) < len(items):
+            return Confidence(0.0, ["missing items"])
+        reasons = []
+        score = self.WEIGHT_ITEMS
+        sane = [
+            i
+            for i in items
+            if isinstance(i["quantity"], int) and 0 < i["quantity"] <= self.max_quantity
+        ]
+        score += self.WEIGHT_QUANTITY * len(sane) / len(items)
+        if len(sane) < len(items):
+            reasons.append("quantity out of range")
+        if self.catalog is not None:
+            known = [i for i in items if str(i["product_id"]) in self.catalog]
+            score += self.WEIGHT_CATALOG * len(known) / len(items)
+            if len(known) < len(items):
+                reasons.append("unknown product")
+        else:
+            score += self.WEIGHT_CATALOG
+        if fields.get("customer_name"):
+            score += self.WEIGHT_CUSTOMER
+        else:
+            reasons.append("missing customer_name")
+        if fields.get("delivery_date"):
+            score += self.WEIGHT_DELIVERY
+        else:
+            reasons.append("missing delivery_date")
+        return Confidence(round(score, 6), reasons)
+
+    def _record(self, tier: str, seconds: float, accepted: bool) -> None:
+        with self._lock:
+            stats = self.tier_stats[tier]
+            stats["attempts"] += 1
+            stats["seconds"] += seconds
+            if accepted:
+                stats["accepted"] += 1
+
+    def route(self, text: str) -> Optional[dict]:
+        """
+        決定的抽出を安い順に試し、確信度が閾値以上の最初の結果を返す。
+        LLM に回すべき文書では None を返す。LLM が使えない（OPENAI_API_KEY 未設定）場合は
+        最初に得られた結果を返す。
+        """
+        llm_available = bool(os.getenv("OPENAI_API_KEY"))
+        fallback = None
+        for n, (name, extract) in enumerate(TIERS):
+            start = time.perf_counter()
+            fields = extract(text)
+            accepted = fields is not None and self.score(fields).score >= self.threshold
+            self._record(name, time.perf_counter() - start, accepted)
+            if n == 0 and fields is None and llm_available:
+                # 明細表でない文書は従来すべて LLM に送っていた
+                with self._lock:
+                    self.baseline_llm_calls += 1
+            if accepted:
+                break
+            if fallback is None:
+                fallback = fields
+        else:
+            fields = None
+        with self._lock:
+            self.documents += 1
+            if fields is None and llm_available:
+                self.escalations += 1
+        if fields is not None or llm_available:
+            return fields
+        return fallback if fallback is not None else {}
+
+    def record_llm(self, seconds: float) -> None:
+        """LLM 段階の所要時間を記録する"""
+        self._record("llm", seconds, True)
+
+    def extract(self, text: str, llm: Callable[[str], dict]) -> dict:
+        """route() で決まらなかった文書だけ llm(text) で抽出する"""
+        fields = self.route(text)
+        if fields is not None:
+            return fields
+        start = time.perf_counter()
+        try:
+            return llm(text)
+        finally:
+            self.record_llm(time.perf_counter() - start)
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        昇格率・段階ごとの採用数と平均所要時間・省いたLLM呼び出しの推定コストを返す。
+        省いた呼び出し数は、明細表以外をすべて LLM に送っていた従来の振り分けとの差。
+        """
+        with self._lock:
+            tiers = {
+                name: {
+                    **stats,
+                    "avg_ms": (
+                        stats["seconds"] * 1000 / stats["attempts"]
+                        if stats["attempts"]
+                        else 0.0
+                    ),
+                }
+                for name, stats in self.tier_stats.items()
+            }
+            saved = self.baseline_llm_calls - self.escalations
+            return {
+                "documents": self.documents,
+                "escalations": self.escalations,
+                "escalation_rate": (
+                    self.escalations / self.documents if self.documents else 0.0
+                ),
+                "tiers": tiers,
+                "llm_calls_saved": saved,
+                "cost_saved": saved * self.llm_cost_per_call,
+            }
+
+
+_default_router: Optional[ExtractionRouter] = None
+_default_lock = threading.Lock()
+
+
+def get_default_router() -> ExtractionRouter:
+    """
+    プロセス共有のルーターを返す。
+    EXTRACTION_CONFIDENCE_THRESHOLD, EXTRACTION_MAX_QUANTITY, LLM_COST_PER_CALL（USD）で調整可能。
+    """
+    global _default_router
+    with _default_lock:
+        if _default_router is None:
+            _default_router = ExtractionRouter(
+                threshold=float(os.getenv("EXTRACTION_CONFIDENCE_THRESHOLD", "0.8")),
+                max_quantity=int(os.getenv("EXTRACTION_MAX_QUANTITY", "10000")),
+                llm_cost_per_call=float(os.getenv("LLM_COST_PER_CALL", "0.01")),
+            )
+        return _default_router
@@ -0,0 +1,163 @@
+"""
+Phase2: 注文テキストの正規表現フィールド抽出
+
+顧客・配送希望日/納期・商品・数量のパターンはモジュール読み込み時に1度だけコンパイルし、
+llm_stub と transform で共有する。各フィールドと行単位の判定（明細表ヘッダ、汎用の品番+数量行）は
+参照されたときに1回だけ走査する。
+"""
+import re
+from typing import Any, Optional
+
+_CUSTOMER_RE = re.compile(r"顧客[:：]\s*(.+)")
+# 「配送希望日: 2025-08-01」形式（数字とハイフンのみ）
+_DELIVERY_DATE_RE = re.compile(r"配送希望日[:：]\s*([\d\-]+)")
+# 「配送希望日/納期: 2025年8月1日」形式も含む生の日付表記
+_DELIVERY_RAW_RE = re.compile(r"(?:配送希望日|納期)[:：]\s*([\d年月日\-]+)")
+_PRODUCT_RE = re.compile(r"商品[:：]\s*([A-Za-z0-9]+)")
+_QUANTITY_RE = re.compile(r"数量[:：]\s*(\d+)")
+# 最終フォールバック: 任意の英数字コードと数値のペア
+_GENERIC_PAIR_RE = re.compile(r"([A-Za-z0-9]{2,})\D+(\d+)")
+# 未計算を表す番兵（None は「一致なし」として保持する）
+_UNSET: Any = object()
+
+
+class FieldScan:
+    """
+    1つの本文に対する抽出候補（値は最初の一致。商品・数量は出現順の全件）。
+    各値は最初に参照されたときに計算し、同じ抽出処理の中で使い回す。
+    """
+
+    __slots__ = (
+        "text",
+        "_customer_name",
+        "_delivery_date",
+        "_delivery_raw",
+        "_products",
+        "_quantities",
+        "_lines",
+        "_header_rows",
+        "_generic_items",
+    )
+
+    def __init__(self, text: str):
+        self.text = text
+        self._customer_name = self._delivery_date = self._delivery_raw = _UNSET
+        self._products: Optional[list[str]] = None
+        self._quantities: Optional[list[int]] = None
+        self._lines: Optional[list[str]] = None
+        self._header_rows: Optional[list[int]] = None
+        self._generic_items: Optional[list[tuple[str, int]]] = None
+
+    def _first(self, pattern: "re.Pattern[str]") -> Optional[str]:
+        m = pattern.search(self.text)
+        return m.group(1).strip() if m else None
+
+    @property
+    def customer_name(self) -> Optional[str]:
+        if self._customer_name is _UNSET:
+            self._customer_name = self._first(_CUSTOMER_RE)
+        return self._customer_name
+
+    @property
+    def delivery_date(self) -> Optional[str]:
+        if self._delivery_date is _UNSET:
+            self._delivery_date = self._first(_DELIVERY_DATE_RE)
+        return self._delivery_date
+
+    @property
+    def delivery_raw(self) -> Optional[str]:
+        if self._delivery_raw is _UNSET:
+            self._delivery_raw = self._first(_DELIVERY_RAW_RE)
+        return self._delivery_raw
+
+    @property
+    def products(self) -> list[str]:
+        if self._products is None:
+            self._products = _PRODUCT_RE.findall(self.text)
+        return self._products
+
+    @property
+    def quantities(self) -> list[int]:
+        if self._quantities is None:
+            self._quantities = [int(q) for q in _QUANTITY_RE.findall(self.text)]
+        return self._quantities
+
+    @property
+    def lines(self) -> list[str]:
+        if self._lines is None:
+            self._lines = self.text.splitlines()
+        return self._lines
+
+    @property
+    def header_rows(self) -> list[int]:
+        """「商品」と「数量」を含む行の行番号"""
+        if self._header_rows is None:
+            rows: list[int] = []
+            if "商品" in self.text and "数量" in self.text:
+                rows = [
+                    idx
+                    for idx, line in enumerate(self.lines)
+                    if "商品" in line and "数量" in line
+                ]
+            self._header_rows = rows
+        return self._header_rows
+
+    @property
+    def name_header_rows(self) -> list[int]:
+        """「商品名」と「数量」を含む行の行番号"""
+        lines = self.lines
+        return [idx for idx in self.header_rows if "商品名" in lines[idx]]
+
+    @property
+    def generic_items(self) -> list[tuple[str, int]]:
+        """各行の先頭の英数字トークンと、それ以降の最初の数値トークンの組"""
+        if self._generic_items is None:
+            generic = []
+            for line in self.lines:
+                pid = None
+                for token in line.split():
+                    if pid is None and token.isalnum():
+                        pid = token
+                    elif pid and token.isdigit():
+                        generic.append((pid, int(token)))
+                        break
+            self._generic_items = generic
+        return self._generic_items
+
+    def table_items(self, header: int) -> list[dict]:
+        """ヘッダ行の次から空行または「合計」行までを「品番 数量」の明細として読む"""
+        items = []
+        for row in self.lines[header + 1 :]:  # noqa: E203
+            cols = row.split()
+            if not cols or cols[0].startswith("合計"):
+                break
+            if len(cols) < 2:
+                continue
+            try:
+                qty = int(cols[1])
+            except ValueError:
+                continue
+            items.append({"product_id": cols[0], "quantity": qty})
+        return items
+
+    def name_table_items(self, header: int) -> list[dict]:
+        """「商品名 数量」ヘッダ以降を「合計」行まで読む（空行は読み飛ばす）"""
+        items = []
+        for row in self.lines[header + 1 :]:  # noqa: E203
+            cols = row.split()
+            if cols and cols[0].startswith("合計"):
+                break
+            if len(cols) >= 2:
+                try:
+                    qty = int(cols[1])
+                except ValueError:
+                    continue
+                items.append({"product_id": cols[0], "quantity": qty})
+        return items
+
+    def generic_pairs(self) -> list[dict]:
+        """任意の英数字コードと数値のペアを抽出する（最終フォールバック）"""
+        return [
+            {"product_id": pid, "quantity": int(qty)}
+            for pid, qty in _GENERIC_PAIR_RE.findall(self.text)
+        ]
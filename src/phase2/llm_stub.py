@@ -1,121 +1,96 @@
 """Phase2: LLM抽出プロンプト設計＆呼び出しラッパー（スタブ実装）"""
 import json
+import logging
 import os
 import re
+from typing import Any, Optional
 
 import openai
 
+from src.phase2.field_extractor import FieldScan
+from src.phase2.prompt_window import reduce_prompt_text
 
-def extract_order_fields(text: str) -> dict:
+logger = logging.getLogger(__name__)
+
+LLM_MODEL = "gpt-4o"
+
+
+def _stub_fields(text: str, scan: FieldScan) -> dict:
+    """APIキー未設定時の正規表現スタブ（戻り値フォーマットは LLM 版と互換）"""
+    data: dict = {}
+    # PDF請求書テーブル形式対応: ヘッダー行「商品名 数量」以降をパース
+    for idx in scan.name_header_rows:
+        items = scan.name_table_items(idx)
+        if items:
+            data["items"] = items
+            return data
+    # 抽出: 顧客名, 配送希望日
+    if scan.customer_name is not None:
+        data["customer_name"] = scan.customer_name
+    if scan.delivery_date is not None:
+        data["delivery_date"] = scan.delivery_date
+    # 複数商品の場合は items リストを返却
+    products, quantities = scan.products, scan.quantities
+    if len(products) > 1 and len(quantities) == len(products):
+        data["items"] = [
+            {"product_id": pid, "quantity": qty}
+            for pid, qty in zip(products, quantities)
+        ]
+        return data
+    # 単一商品の場合: 既存フォーマット
+    if products:
+        data["product_id"] = products[0]
+    if quantities:
+        data["quantity"] = quantities[0]
+    # 単一商品が正しく取得できていればそのまま返却
+    if "product_id" in data and "quantity" in data:
+        return data
+    # 最終フォールバック: 任意の英数字コードと数値ペアを抽出
+    generic2 = scan.generic_pairs()
+    if generic2:
+        return {"items": generic2}
+    return data
+
+
+def extract_rule_based(text: str) -> Optional[dict]:
     """
-    LLM 呼び出し版: メール本文テキストから必須フィールドを JSON で抽出します。
-    抽出項目: customer_name, product_id, quantity, delivery_date
+    LLM を使わずに抽出できる形式（明細表・英語レイアウトの複数商品）を解析する。
+    該当しない場合は None を返す。
     """
+    scan = FieldScan(text)
     # PDF請求書の表形式明細を先に解析: 複数商品明細対応
-    data: dict = {}
-    lines = text.splitlines()
-    for idx, line in enumerate(lines):
-        if "商品" in line and "数量" in line:
-            items = []
-            for row in lines[idx + 1 :]:  # noqa: E203
-                row_s = row.strip()
-                if not row_s or row_s.startswith("合計"):
-                    break
-                cols = row_s.split()
-                if len(cols) < 2:
-                    continue
-                pid, qty_str = cols[0], cols[1]
-                try:
-                    qty = int(qty_str)
-                except ValueError:
-                    continue
-                items.append({"product_id": pid, "quantity": qty})
-            if items:
-                # 顧客名抽出
-                m = re.search(r"顧客[:：]\s*(.+)", text)
-                if m:
-                    data["customer_name"] = m.group(1).strip()
-                # 配送希望日抽出
-                m = re.search(r"配送希望日[:：]\s*([\d\-]+)", text)
-                if m:
-                    data["delivery_date"] = m.group(1).strip()
-                data["items"] = items
-                return data
-    # フォーマット不定のテーブル行から英語レイアウトの複数商品を抽出
-    generic_items = []
-    for line in lines:
-        parts = line.strip().split()
-        pid = None
-        qty = None
-        # 最初の英数字トークンをproduct_id、その後の数値トークンをquantityとみなす
-        for token in parts:
-            if pid is None and token.isalnum():
-                pid = token
-            elif pid and token.isdigit():
-                qty = int(token)
-                break
-        if pid and qty is not None:
-            generic_items.append({"product_id": pid, "quantity": qty})
-    if generic_items:
-        return {"items": generic_items}
-    # テーブル抽出対象でない場合、環境変数 OPENAI_API_KEY の有無でスタブ／本番APIを切り替え
-    if not os.getenv("OPENAI_API_KEY"):
-        # 戻り値フォーマット互換のため旧スタブ実装
-        data: dict = {}
-        # PDF請求書テーブル形式対応: ヘッダー行「商品名 数量」以降をパース
-        lines = text.splitlines()
-        for idx, line in enumerate(lines):
-            if "商品名" in line and "数量" in line:
-                items = []
-                for row in lines[idx + 1 :]:  # noqa: E203
-                    if row.strip().startswith("合計"):
-                        break
-                    cols = row.strip().split()
-                    if len(cols) >= 2:
-                        pid = cols[0]
-                        try:
-                            qty = int(cols[1])
-                        except ValueError:
-                            continue
-                        items.append({"product_id": pid, "quantity": qty})
-                if items:
-                    data["items"] = items
-                    return data
-        # 抽出: 顧客名, 配送希望日
-        m = re.search(r"顧客[:：]\s*(.+)", text)
-        if m:
-            data["customer_name"] = m.group(1).strip()
-        m = re.search(r"配送希望日[:：]\s*([\d\-]+)", text)
-        if m:
-            data["delivery_date"] = m.group(1).strip()
-        # 複数商品の場合は items リストを返却
-        products = re.findall(r"商品[:：]\s*([A-Za-z0-9]+)", text)
-        quantities = re.findall(r"数量[:：]\s*(\d+)", text)
-        if len(products) > 1 and len(quantities) == len(products):
-            items = []
-            for pid, qty in zip(products, quantities):
-                items.append({"product_id": pid.strip(), "quantity": int(qty)})
+    for idx in scan.header_rows:
+        items = scan.table_items(idx)
+        if items:
+            data: dict = {}
+            # 顧客名・配送希望日
+            if scan.customer_name is not None:
+                data["customer_name"] = scan.customer_name
+            if scan.delivery_date is not None:
+                data["delivery_date"] = scan.delivery_date
             data["items"] = items
             return data
-        # 単一商品の場合: 既存フォーマット
-        # product_id, quantity を一つずつ抽出
-        m = re.search(r"商品[:：]\s*([A-Za-z0-9]+)", text)
-        if m:
-            data["product_id"] = m.group(1).strip()
-        m = re.search(r"数量[:：]\s*(\d+)", text)
-        if m:
-            data["quantity"] = int(m.group(1))
-        # 単一商品が正しく取得できていればそのまま返却
-        if "product_id" in data and "quantity" in data:
-            return data
-        # 最終フォールバック: 任意の英数字コードと数値ペアを抽出
-        generic2 = []
-        for pid, qty in re.findall(r"([A-Za-z0-9]{2,})\D+(\d+)", text):
-            generic2.append({"product_id": pid, "quantity": int(qty)})
-        if generic2:
-            return {"items": generic2}
-        return data
-    openai.api_key = os.getenv("OPENAI_API_KEY")
+    # フォーマット不定のテーブル行から英語レイアウトの複数商品を抽出
+    if scan.generic_items:
+        return {
+            "items": [
+                {"product_id": pid, "quantity": qty} for pid, qty in scan.generic_items
+            ]
+        }
+    return None
+
+
+def stub_fields(text: str) -> dict:
+    """APIキー未設定時の正規表現スタブ"""
+    return _stub_fields(text, FieldScan(text))
+
+
+def build_messages(text: str) -> list[dict]:
+    """
+    ChatCompletion に渡すメッセージ（同期版・非同期版で共通）。
+    本文は引用・署名を除いた注文部分だけに絞り、トークン数の上限内に収める。
+    """
+    text = reduce_prompt_text(text)
     prompt = f"""
 あなたは注文受付システムのアシスタントです。
 以下のメール本文から、必ず JSON で抽出結果を返してください。
@@ -139,15 +114,16 @@ def extract_order_fields(text: str) -> dict:
 
 ---- この形式で JSON を返してください ----
 """
-    resp = openai.ChatCompletion.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": "JSON 出力専用モード"},
-            {"role": "user", "content": prompt},
-        ],
-        temperature=0,
-    )
+    return [
+        {"role": "system", "content": "JSON 出力専用モード"},
+        {"role": "user", "content": prompt},
+    ]
+
+
+def parse_llm_response(resp: Any) -> dict:
+    """ChatCompletion のレスポンスから JSON 部分を取り出してパースする"""
     text_out = resp.choices[0].message.content.strip()
+    cleaned_json = None
     try:
         # JSON以外の文字列を削除するための正規表現
         json_match = re.search(r"\{.*?\}", text_out, re.DOTALL)
@@ -159,6 +135,35 @@ def extract_order_fields(text: str) -> dict:
         return json.loads(cleaned_json)
     except Exception as e:
         # デバッグ用にLLMレスポンス全体を出力
-        print(f"LLM レスポンス全体: {text_out}")
-        print(f"整形後のJSON: {cleaned_json}")
+        logger.warning(f"LLM レスポンス全体: {text_out}")
+        logger.warning(f"整形後のJSON: {cleaned_json}")
         raise ValueError(f"LLM レスポンスの JSON パース失敗: {e}\n>> {cleaned_json}")
+
+
+def call_llm(text: str) -> dict:
+    """OpenAI で抽出する（非同期抽出クライアントが起動していれば委譲する）"""
+    # 非同期抽出クライアントが起動していれば、同時実行数の制限・重複排除付きで委譲する
+    from src.phase2.async_llm import get_running_llm_extractor
+
+    runner = get_running_llm_extractor()
+    if runner is not None:
+        return runner.complete(text)
+    openai.api_key = os.getenv("OPENAI_API_KEY")
+    resp = openai.ChatCompletion.create(
+        model=LLM_MODEL,
+        messages=build_messages(text),
+        temperature=0,
+    )
+    return parse_llm_response(resp)
+
+
+def extract_order_fields(text: str) -> dict:
+    """
+    LLM 呼び出し版: メール本文テキストから必須フィールドを JSON で抽出します。
+    抽出項目: customer_name, product_id, quantity, delivery_date
+    決定的抽出（明細表・正規表現）の確信度が低い場合のみ LLM を呼び出す。
+    OPENAI_API_KEY 未設定時は LLM を使わず正規表現スタブの結果を返す。
+    """
+    from src.phase2.extraction_router import get_default_router
+
+    return get_default_router().extract(text, call_llm)
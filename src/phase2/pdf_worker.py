@@ -0,0 +1,259 @@
+"""
+Phase2: PDF抽出をワーカープロセスで実行するサービス
+
+pdfplumber によるテーブル/テキスト抽出は CPU 負荷が高く GIL も握り続けるため、
+専用のワーカープロセスで実行する。文書ごとの実行時間上限（超過時はワーカーを強制終了）、
+ワーカーのメモリ上限（RLIMIT_AS）、N件処理ごとのワーカー再起動に対応する。
+"""
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, List, Optional
+
+from src.phase2.transform import (
+    ExtractedPdf,
+    ParsedPdf,
+    extract_items_from_pdf,
+    extract_text_from_pdf,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class PdfExtractionError(Exception):
+    """ワーカーでのPDF抽出に失敗した（ワーカー異常終了・メモリ不足など）"""
+
+
+class PdfExtractionTimeout(PdfExtractionError):
+    """PDF抽出が制限時間内に終わらなかった"""
+
+
+def _limit_memory(memory_limit_mb: Optional[int]) -> None:
+    if not memory_limit_mb:
+        return
+    try:
+        import resource
+
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError) as e:
+        logger.warning(f"Could not set PDF worker memory limit: {e}")
+
+
+def _worker_main(conn: Any, memory_limit_mb: Optional[int]) -> None:
+    """ワーカープロセス本体: (pdf_bytes, need_text) を受け取り抽出結果を返す"""
+    _limit_memory(memory_limit_mb)
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        pdf_bytes, need_text = task
+        try:
+            with ParsedPdf(pdf_bytes) as parsed:
+                items = extract_items_from_pdf(parsed)
+                text = extract_text_from_pdf(parsed) if need_text or not items else ""
+            conn.send(("ok", items, text))
+        except MemoryError:
+            conn.send(("error", "memory limit exceeded", None))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}", None))
+
+
+class _Worker:
+    def __init__(self, ctx: Any, memory_limit_mb: Optional[int]):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main, args=(child, memory_limit_mb), daemon=True
+        )
+        self.process.start()
+        child.close()
+        self.tasks = 0
+
+    def stop(self, force: bool = False) -> None:
+        if not force:
+            try:
+                self.conn.send(None)
+                self.process.join(timeout=1)
+            except (OSError, ValueError):
+                pass
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+@dataclass
+class PdfExtractionStats:
+    documents: int = 0
+    timeouts: int = 0
+    errors: int = 0
+    recycled: int = 0
+    total_seconds: float = 0.0
+
+
+class PdfExtractionService:
+    """
+    再利用可能なワーカープロセス群で extract_items_from_pdf / extract_text_from_pdf を実行する。
+    extract() は呼び出しスレッドで結果を待つため、複数スレッドから並行に呼び出せる
+    （同時実行数はワーカー数まで）。空きワーカーを queue_timeout 秒（既定は timeout の2倍）
+    待っても得られない場合や close() 後は PdfExtractionError を送出する。
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        timeout: float = 30.0,
+        max_tasks_per_worker: int = 50,
+        memory_limit_mb: Optional[int] = None,
+        start_method: str = "spawn",
+        queue_timeout: Optional[float] = None,
+    ):
+        self.timeout = timeout
+        self.queue_timeout = timeout * 2 if queue_timeout is None else queue_timeout
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.memory_limit_mb = memory_limit_mb
+        self._ctx = multiprocessing.get_context(start_method)
+        # None は close() の通知（待機中の呼び出しを起こす）
+        self._idle: "queue.Queue[Optional[_Worker]]" = queue.Queue()
+        self._all: List[_Worker] = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self.stats = PdfExtractionStats()
+        for _ in range(max(1, workers)):
+            self._idle.put(self._spawn())
+
+    def _spawn(self) -> _Worker:
+        worker = _Worker(self._ctx, self.memory_limit_mb)
+        with self._lock:
+            self._all.append(worker)
+        return worker
+
+    def _retire(self, worker: _Worker, force: bool) -> None:
+        with self._lock:
+            if worker in self._all:
+                self._all.remove(worker)
+        worker.stop(force=force)
+
+    def _release(self, worker: _Worker, broken: bool = False) -> None:
+        """ワーカーを待機列へ戻す。異常時・処理件数上限到達時は新しいワーカーと交換する"""
+        if broken or worker.tasks >= self.max_tasks_per_worker:
+            self._retire(worker, force=broken)
+            if not broken:
+                with self._lock:
+                    self.stats.recycled += 1
+            if self._closed:
+                return
+            try:
+                worker = self._spawn()
+            except Exception as e:
+                logger.error(f"Failed to respawn PDF worker: {e!r}")
+                return
+        elif self._closed:
+            self._retire(worker, force=False)
+            return
+        self._idle.put(worker)
+
+    def _acquire(self) -> _Worker:
+        """空きワーカーを取り出す。close() 後・ワーカー全滅・待ち時間超過時は例外"""
+        deadline = time.monotonic() + self.queue_timeout
+        while True:
+            if self._closed:
+                raise PdfExtractionError("PdfExtractionService is closed")
+            with self._lock:
+                alive = bool(self._all)
+            if not alive:
+                raise PdfExtractionError("No PDF worker available")
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise PdfExtractionError(
+                    f"No PDF worker became available within {self.queue_timeout:.1f}s"
+                )
+            try:
+                # ワーカーの再起動失敗にも気づけるよう、短い間隔で状態を確認し直す
+                worker = self._idle.get(timeout=min(remaining, 1.0))
+            except queue.Empty:
+                continue
+            if worker is None:
+                # close() の通知を他の待機中の呼び出しにも伝える
+                self._idle.put(None)
+                continue
+            return worker
+
+    def extract(
+        self, pdf_bytes: bytes, need_text: bool = True, timeout: Optional[float] = None
+    ) -> ExtractedPdf:
+        """
+        PDFから明細とテキストを抽出する。
+        制限時間を超えた場合はワーカーを強制終了して PdfExtractionTimeout を送出する。
+        """
+        timeout = self.timeout if timeout is None else timeout
+        worker = self._acquire()
+        start = time.monotonic()
+        try:
+            worker.conn.send((pdf_bytes, need_text))
+            worker.tasks += 1
+            if not worker.conn.poll(timeout):
+                raise PdfExtractionTimeout(
+                    f"PDF extraction exceeded {timeout:.1f}s ({len(pdf_bytes)} bytes)"
+                )
+            status, items, text = worker.conn.recv()
+        except PdfExtractionTimeout:
+            self._release(worker, broken=True)
+            with self._lock:
+                self.stats.timeouts += 1
+            raise
+        except (EOFError, OSError) as e:
+            # メモリ上限などでワーカーが落ちた
+            self._release(worker, broken=True)
+            with self._lock:
+                self.stats.errors += 1
+            raise PdfExtractionError(f"PDF worker died: {e!r}") from e
+        self._release(worker)
+        with self._lock:
+            self.stats.documents += 1
+            self.stats.total_seconds += time.monotonic() - start
+            if status != "ok":
+                self.stats.errors += 1
+        if status != "ok":
+            raise PdfExtractionError(items)
+        return ExtractedPdf(items=items, text=text)
+
+    def close(self) -> None:
+        """全ワーカーを停止する"""
+        self._closed = True
+        with self._lock:
+            workers = list(self._all)
+            self._all = []
+        self._idle.put(None)
+        for worker in workers:
+            worker.stop()
+
+    def __enter__(self) -> "PdfExtractionService":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+def create_pdf_extraction_service() -> PdfExtractionService:
+    """
+    環境変数から設定して PdfExtractionService を生成する。
+    PDF_WORKERS, PDF_TIMEOUT（秒）, PDF_MAX_TASKS_PER_WORKER, PDF_WORKER_MEMORY_MB（0で無制限）
+    """
+    memory = int(os.getenv("PDF_WORKER_MEMORY_MB", "1024"))
+    return PdfExtractionService(
+        workers=int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 1))),
+        timeout=float(os.getenv("PDF_TIMEOUT", "30")),
+        max_tasks_per_worker=int(os.getenv("PDF_MAX_TASKS_PER_WORKER", "50")),
+        memory_limit_mb=memory or None,
+    )
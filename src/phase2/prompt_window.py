@@ -0,0 +1,171 @@
+"""
+Phase2: LLM に渡す本文の絞り込み
+
+返信の引用履歴と署名を除き、注文に関係する行（商品コード・数量・日付・顧客など）と
+その前後の行だけを残して、トークン数の上限内に収める（注文行そのものは上限を超えても削らない）。
+"""
+import logging
+import os
+import re
+from typing import Optional
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# 本文のトークン数上限（0 で無制限）
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "1000"))
+# 注文行の前後に残す行数（表のヘッダ行や見出しを含めるため）
+CONTEXT_LINES = 1
+
+# 引用行（> 付き）
+_QUOTE_RE = re.compile(r"^\s*[>＞]")
+# 返信元メッセージの開始行。以降はすべて過去のやり取り
+# 日本語の引用見出しは日付またはメールアドレスを含み「…が/さんは書きました:」で終わる行に限る
+_REPLY_HEADER_RE = re.compile(
+    r"^\s*-{2,}\s*(?:Original Message|元のメッセージ|Reply Message)\s*-{2,}\s*$"
+    r"|^\s*On .+ wrote:\s*$"
+    r"|^(?=.*(?:\d{2,4}\s*[/年.\-]\s*\d{1,2}|[\w.+\-]+@[\w\-]+\.[\w.\-]+))"
+    r".*(?:が|は)書きました[:：]?\s*$",
+    re.IGNORECASE,
+)
+# 署名の区切り（「-- 」または装飾線）
+_SIG_DELIM_RE = re.compile(r"^\s*--\s*$|^\s*[-=＝_─━*＊~〜]{10,}\s*$")
+# 署名らしい連絡先の行
+_CONTACT_RE = re.compile(
+    r"TEL|Tel|FAX|Fax|電話|E-?mail|Mail|〒|https?://|@", re.IGNORECASE
+)
+# 署名内で残す会社名の行
+_COMPANY_RE = re.compile(r"株式会社|有限会社|合同会社|商店|Co\.,? ?Ltd|Inc\.", re.I)
+# 数量の単位（「3台」「2 セット」など）
+_QUANTITY_UNITS = (
+    "個",
+    "本",
+    "台",
+    "箱",
+    "ケース",
+    "セット",
+    "点",
+    "枚",
+    "袋",
+    "組",
+    "式",
+    "缶",
+    "巻",
+    "冊",
+    "kg",
+    "pcs",
+    "units",
+)
+# 数値 + 単位（長い単位から照合）
+_QUANTITY_WITH_UNIT = r"\d+\s*(?:%s)" % "|".join(
+    map(re.escape, sorted(_QUANTITY_UNITS, key=len, reverse=True))
+)
+# 注文に関係する行
+_ORDER_LINE_RE = re.compile(
+    r"商品|品番|品名|型番|数量|個数|注文|発注|顧客|配送|納期|納品|希望日|お届け"
+    r"|合計|様|御中|株式会社|有限会社|合同会社"
+    r"|order|qty|quantity|pcs|deliver|customer"
+    r"|[A-Za-z]{1,4}-?\d{2,}"
+    r"|\d{4}\s*[-/年]\s*\d{1,2}|\d{1,2}月\d{1,2}日"
+    r"|\S\s+[\d,]+(?:\s|$)"
+    r"|" + _QUANTITY_WITH_UNIT,
+    re.IGNORECASE,
+)
+
+
+def _encoding():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model("gpt-4o")
+    except (KeyError, ValueError):
+        return tiktoken.get_encoding("cl100k_base")
+
+
+_ENCODING = _encoding()
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    トークン数を返す。tiktoken が無い場合は近似値
+    （ASCII は4文字で1トークン、それ以外は1文字1トークン）。
+    """
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    ascii_chars = sum(1 for c in text if c < "\x80")
+    return (ascii_chars + 3) // 4 + len(text) - ascii_chars
+
+
+def strip_quoted(text: str) -> str:
+    """引用行と、返信元メッセージの開始行以降を取り除く"""
+    kept = []
+    for line in text.splitlines():
+        if _REPLY_HEADER_RE.search(line):
+            break
+        if not _QUOTE_RE.match(line):
+            kept.append(line)
+    return "\n".join(kept)
+
+
+def strip_signature(text: str) -> str:
+    """署名ブロックを取り除く（会社名の行は顧客名の手掛かりとして残す）"""
+    lines = text.splitlines()
+    for idx, line in enumerate(lines):
+        if not _SIG_DELIM_RE.match(line):
+            continue
+        tail = lines[idx + 1 : idx + 7]  # noqa: E203
+        # 「-- 」は常に署名、装飾線は直後に連絡先がある場合のみ署名とみなす
+        if line.strip() == "--" or any(_CONTACT_RE.search(t) for t in tail):
+            signature = lines[idx + 1 :]  # noqa: E203
+            company = [t for t in signature if _COMPANY_RE.search(t)]
+            return "\n".join(lines[:idx] + company[:1])
+    return text
+
+
+def order_region(text: str, context: int = CONTEXT_LINES) -> str:
+    """注文に関係する行とその前後 context 行だけを残す（空行は詰める）"""
+    lines = text.splitlines()
+    keep = [False] * len(lines)
+    for idx, line in enumerate(lines):
+        if _ORDER_LINE_RE.search(line):
+            for j in range(max(0, idx - context), min(len(lines), idx + context + 1)):
+                keep[j] = True
+    return "\n".join(line.strip() for line, k in zip(lines, keep) if k and line.strip())
+
+
+def fit_token_budget(text: str, budget: int) -> str:
+    """
+    行単位でトークン数の上限内に収める。注文行は削らず、前後の文脈行だけを先頭から
+    上限まで残す。注文行だけで上限を超える場合は警告を出し、注文行はすべて渡す
+    （大口注文の明細が欠けたまま LLM に渡らないようにするため）。
+    """
+    if budget <= 0 or estimate_tokens(text) <= budget:
+        return text
+    lines = text.splitlines()
+    costs = [estimate_tokens(line) + 1 for line in lines]
+    keep = [bool(_ORDER_LINE_RE.search(line)) for line in lines]
+    used = sum(cost for cost, k in zip(costs, keep) if k)
+    if used > budget:
+        logger.warning(
+            f"Order lines need {used} tokens (budget {budget}); sending all of them"
+        )
+    for idx, cost in enumerate(costs):
+        if not keep[idx] and used + cost <= budget:
+            keep[idx] = True
+            used += cost
+    return "\n".join(line for line, k in zip(lines, keep) if k)
+
+
+def reduce_prompt_text(text: str, budget: Optional[int] = None) -> str:
+    """
+    LLM に渡す本文を絞り込む。引用・署名の除去で注文行がなくなった場合は元の本文から探し、
+    注文行が見つからない場合は除去後の本文をそのまま上限まで使う。
+    """
+    budget = PROMPT_TOKEN_BUDGET if budget is None else budget
+    body = strip_signature(strip_quoted(text))
+    region = order_region(body) or order_region(text) or body.strip() or text
+    return fit_token_budget(region, budget)
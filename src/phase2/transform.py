@@ -1,14 +1,18 @@
 """Phase2: 構造化データ変換コンポーネント"""
+import os
 import re
 from dataclasses import dataclass
 from datetime import date
+from functools import lru_cache
 from io import BytesIO
+from typing import Iterator
 
 try:
     import pdfplumber
 except ImportError:
     pdfplumber = None
 
+from src.phase2.field_extractor import FieldScan
 from src.phase2.llm_stub import extract_order_fields
 from src.phase2.ocr_stub import ocr_process
 
@@ -22,47 +26,187 @@ class OrderData:
 
 
 # --- helper functions --------------------------------------------------
-def extract_items_from_pdf(pdf_bytes: bytes) -> list[dict]:
+# 明細テーブルのヘッダ判定キーワード（商品列, 数量列）
+PRODUCT_KEYWORDS = ("商品", "Product")
+QUANTITY_KEYWORDS = ("数量", "Quantity")
+# 解析するページ数の上限（0 で無制限）。明細は先頭数ページにあり、後続は約款等のため
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "20"))
+# 「品名 単価 数量 金額」形式の明細行
+INVOICE_LINE_RE = re.compile(r"^(.+?)\s+[\d,]+\s+(\d+)\s+[\d,]+$")
+# 日本語日付表記と年/年月のみの補完判定
+JP_DATE_RE = re.compile(r"(\d{2,4})年(\d{1,2})月(\d{1,2})日")
+YEAR_RE = re.compile(r"\d{4}")
+YEAR_MONTH_RE = re.compile(r"\d{4}-\d{2}")
+
+
+def _has_header_keywords(text: str) -> bool:
+    return any(k in text for k in PRODUCT_KEYWORDS) and any(
+        k in text for k in QUANTITY_KEYWORDS
+    )
+
+
+class ParsedPdf:
+    """
+    PDFバイト列を一度だけ開き、ページごとのテーブル/テキスト抽出結果を遅延計算して保持する。
+    テーブル抽出・テキスト抽出・メタ情報抽出で同じインスタンスを共有することで、
+    同じ添付を何度も pdfplumber で開き直さないようにする。
+    解析対象は先頭 max_pages ページまで（0 で全ページ）。テーブル抽出は、
+    文字列だけを見る安価なプローブでヘッダのキーワードが見つかったページに限定する。
+    """
+
+    def __init__(self, pdf_bytes: bytes, max_pages: int | None = None):
+        self.pdf_bytes = pdf_bytes
+        self.max_pages = PDF_MAX_PAGES if max_pages is None else max_pages
+        self._pdf = None
+        self._open_failed = False
+        self._tables: dict[int, list] = {}
+        self._texts: dict[int, str] = {}
+        self._probes: dict[int, bool] = {}
+        self._text: str | None = None
+
+    def _document(self):
+        if self._pdf is None and not self._open_failed and pdfplumber:
+            try:
+                self._pdf = pdfplumber.open(BytesIO(self.pdf_bytes))
+            except Exception:
+                self._open_failed = True
+        return self._pdf
+
+    @property
+    def page_count(self) -> int:
+        pdf = self._document()
+        return len(pdf.pages) if pdf else 0
+
+    @property
+    def scan_pages(self) -> int:
+        """ページ数上限を適用した解析対象のページ数"""
+        if self.max_pages > 0:
+            return min(self.page_count, self.max_pages)
+        return self.page_count
+
+    def probe(self, index: int) -> bool:
+        """レイアウト解析をせずにページ内の文字列を連結し、ヘッダのキーワード有無を判定する"""
+        if index not in self._probes:
+            if index in self._texts:
+                text = self._texts[index]
+            else:
+                chars = self._document().pages[index].chars
+                text = "".join(c.get("text", "") for c in chars)
+            self._probes[index] = _has_header_keywords(text)
+        return self._probes[index]
+
+    def table_pages(self) -> Iterator[int]:
+        """テーブル抽出の候補ページを先頭から遅延的に返す"""
+        for index in range(self.scan_pages):
+            if self.probe(index):
+                yield index
+
+    def page_texts(self) -> Iterator[str]:
+        """解析対象ページのテキストを先頭から遅延的に返す"""
+        for index in range(self.scan_pages):
+            yield self.page_text(index)
+
+    def page_tables(self, index: int) -> list:
+        """指定ページのテーブル抽出結果（メモ化）"""
+        if index not in self._tables:
+            self._tables[index] = self._document().pages[index].extract_tables() or []
+        return self._tables[index]
+
+    def page_text(self, index: int) -> str:
+        """指定ページのテキスト抽出結果（メモ化）"""
+        if index not in self._texts:
+            self._texts[index] = self._document().pages[index].extract_text() or ""
+        return self._texts[index]
+
+    @property
+    def text(self) -> str:
+        """解析対象ページのテキスト。抽出できない場合はOCRスタブの結果（メモ化）"""
+        if self._text is None:
+            raw = ""
+            try:
+                raw = "\n".join(self.page_texts()).strip()
+            except Exception:
+                pass
+            # フォールバック: OCR
+            self._text = raw or ocr_process(self.pdf_bytes)
+        return self._text
+
+    def close(self) -> None:
+        if self._pdf is not None:
+            self._pdf.close()
+            self._pdf = None
+
+    def __enter__(self) -> "ParsedPdf":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+@dataclass
+class ExtractedPdf:
+    """抽出済みの明細とテキスト（PDFワーカーの結果。parse_order の pdf に渡せる）"""
+
+    items: list[dict]
+    text: str = ""
+
+
+def _as_parsed(pdf: "bytes | ParsedPdf | ExtractedPdf") -> "ParsedPdf | ExtractedPdf":
+    return pdf if isinstance(pdf, (ParsedPdf, ExtractedPdf)) else ParsedPdf(pdf)
+
+
+def extract_items_from_pdf(pdf: "bytes | ParsedPdf | ExtractedPdf") -> list[dict]:
     """PDF内のテーブルから複数商品のproduct_id, quantityリストを抽出"""
-    items: list[dict] = []
+    if isinstance(pdf, ExtractedPdf):
+        return list(pdf.items)
     if not pdfplumber:
         return []
+    parsed = _as_parsed(pdf)
     try:
-        with pdfplumber.open(BytesIO(pdf_bytes)) as pdf:
-            for page in pdf.pages:
-                tables = page.extract_tables() or []
-                for table in tables:
-                    # header row 判定: 商品/数量 または Product/Quantity
-                    header = table[0] if table else []
-                    has_prod = any(
-                        cell and ("商品" in cell or "Product" in cell) for cell in header
-                    )
-                    has_qty = any(
-                        cell and ("数量" in cell or "Quantity" in cell) for cell in header
-                    )
-                    if not (has_prod and has_qty):
+        return _extract_items(parsed)
+    finally:
+        if parsed is not pdf:
+            parsed.close()
+
+
+def _extract_items(parsed: ParsedPdf) -> list[dict]:
+    items: list[dict] = []
+    try:
+        # ヘッダのキーワードを含むページだけテーブル抽出する
+        for index in parsed.table_pages():
+            for table in parsed.page_tables(index):
+                # header row 判定: 商品/数量 または Product/Quantity
+                header = table[0] if table else []
+                has_prod = any(
+                    cell and any(k in cell for k in PRODUCT_KEYWORDS) for cell in header
+                )
+                has_qty = any(
+                    cell and any(k in cell for k in QUANTITY_KEYWORDS)
+                    for cell in header
+                )
+                if not (has_prod and has_qty):
+                    continue
+                # データ行の読み込み
+                for row in table[1:]:
+                    if not row or len(row) < 2:
                         continue
-                    # データ行の読み込み
-                    for row in table[1:]:
-                        if not row or len(row) < 2:
-                            continue
-                        pid = (row[0] or "").strip()
-                        qty_str = (row[1] or "").strip()
-                        if not pid or not qty_str.isdigit():
-                            continue
-                        items.append({"product_id": pid, "quantity": int(qty_str)})
-                    if items:
-                        return items
+                    pid = (row[0] or "").strip()
+                    qty_str = (row[1] or "").strip()
+                    if not pid or not qty_str.isdigit():
+                        continue
+                    items.append({"product_id": pid, "quantity": int(qty_str)})
+                if items:
+                    return items
     except Exception:
         pass
     # PDFテーブル抽出で取得できなかった場合のフォールバック（日本語請求書形式）
     if not items:
         try:
-            text = extract_text_from_pdf(pdf_bytes)
+            text = extract_text_from_pdf(parsed)
             for line in text.splitlines():
                 line_s = line.strip()
                 # パターン: 品名 + 単価 + 数量 + 金額
-                m = re.match(r"^(.+?)\s+[\d,]+\s+(\d+)\s+[\d,]+$", line_s)
+                m = INVOICE_LINE_RE.match(line_s)
                 if m:
                     name = m.group(1).strip()
                     qty = int(m.group(2))
@@ -72,55 +216,67 @@ def extract_items_from_pdf(pdf_bytes: bytes) -> list[dict]:
     return items
 
 
-def extract_text_from_pdf(pdf_bytes: bytes) -> str:
+def extract_text_from_pdf(pdf: "bytes | ParsedPdf | ExtractedPdf") -> str:
     """PDFからテキスト抽出。抽出できない場合はOCRスタブを実行"""
-    texts: list[str] = []
-    if pdfplumber:
-        try:
-            with pdfplumber.open(BytesIO(pdf_bytes)) as pdf:
-                for page in pdf.pages:
-                    page_text = page.extract_text() or ""
-                    texts.append(page_text)
-            raw = "\n".join(texts).strip()
-            if raw:
-                return raw
-        except Exception:
-            pass
-    # フォールバック: OCR
-    return ocr_process(pdf_bytes)
+    if isinstance(pdf, (ParsedPdf, ExtractedPdf)):
+        return pdf.text
+    with ParsedPdf(pdf) as parsed:
+        return parsed.text
 
 
-def extract_metadata_from_text(text: str) -> dict:
-    """本文テキストから顧客名と配送希望日を抽出し、配送日はdateオブジェクトで返す"""
+def extract_metadata_from_text(text: "str | ParsedPdf | ExtractedPdf") -> dict:
+    """本文テキスト（または ParsedPdf）から顧客名と配送希望日を抽出し、配送日はdateで返す"""
+    if isinstance(text, ParsedPdf):
+        return _metadata_from_pages(text)
+    if isinstance(text, ExtractedPdf):
+        text = text.text
+    scan = FieldScan(text)
     meta: dict = {}
-    m_c = re.search(r"顧客[:：]\s*(.+)", text)
-    if m_c:
-        meta["customer_name"] = m_c.group(1).strip()
+    if scan.customer_name is not None:
+        meta["customer_name"] = scan.customer_name
     # 配送希望日 or 納期で抽出
-    m_d = re.search(r"(?:配送希望日|納期)[:：]\s*([\d年月日\-]+)", text)
-    if m_d:
-        raw = m_d.group(1).strip()
-        # 日本語表記 "YYYY年M月D日" を ISO 形式へ変換
-        m_jp = re.match(r"(\d{2,4})年(\d{1,2})月(\d{1,2})日", raw)
-        if m_jp:
-            y, mo, d = m_jp.groups()
-            if len(y) == 2:
-                y = "20" + y
-            raw_iso = f"{int(y):04d}-{int(mo):02d}-{int(d):02d}"
-        else:
-            raw_iso = raw
-        # 年月のみ or 年のみ補完
-        if re.fullmatch(r"\d{4}$", raw_iso):
-            raw_iso = f"{raw_iso}-01-01"
-        elif re.fullmatch(r"\d{4}-\d{2}$", raw_iso):
-            raw_iso = f"{raw_iso}-01"
-        try:
-            meta["delivery_date"] = date.fromisoformat(raw_iso)
-        except ValueError:
-            pass
+    if scan.delivery_raw is not None:
+        delivery = _parse_delivery_date(scan.delivery_raw)
+        if delivery is not None:
+            meta["delivery_date"] = delivery
     return meta
 
 
+@lru_cache(maxsize=1024)
+def _parse_delivery_date(raw: str) -> "date | None":
+    """日付表記を date に変換する（変換できなければ None）"""
+    # 日本語表記 "YYYY年M月D日" を ISO 形式へ変換
+    m_jp = JP_DATE_RE.match(raw)
+    if m_jp:
+        y, mo, d = m_jp.groups()
+        if len(y) == 2:
+            y = "20" + y
+        raw_iso = f"{int(y):04d}-{int(mo):02d}-{int(d):02d}"
+    else:
+        raw_iso = raw
+    # 年月のみ or 年のみ補完
+    if YEAR_RE.fullmatch(raw_iso):
+        raw_iso = f"{raw_iso}-01-01"
+    elif YEAR_MONTH_RE.fullmatch(raw_iso):
+        raw_iso = f"{raw_iso}-01"
+    try:
+        return date.fromisoformat(raw_iso)
+    except ValueError:
+        return None
+
+
+def _metadata_from_pages(parsed: ParsedPdf) -> dict:
+    """ページ単位でメタ情報を探し、顧客名と配送日が揃った時点で打ち切る"""
+    meta: dict = {}
+    for page_text in parsed.page_texts():
+        for key, value in extract_metadata_from_text(page_text).items():
+            meta.setdefault(key, value)
+        if "customer_name" in meta and "delivery_date" in meta:
+            return meta
+    # テキストが取れないPDFは OCR 結果から抽出
+    return meta or extract_metadata_from_text(parsed.text)
+
+
 def build_orders_from_fields(fields: dict) -> list:
     """LLMまたはregex抽出結果のfieldsからOrderDataリストを構築"""
     orders: list[OrderData] = []
@@ -176,6 +332,7 @@ def parse_order(input_data: any) -> list:  # type: ignore
     1) PDFテーブル抽出を試みる
     2) テーブルなければ本文テキストをOCR/NLP
     3) LLMスタブ or regex でフィールド抽出
+    pdf にはバイト列のほか、ワーカーで抽出済みの ExtractedPdf も指定できる。
     """
     # normalize input
     pdf_bytes = None
@@ -184,35 +341,38 @@ def parse_order(input_data: any) -> list:  # type: ignore
         pdf_bytes = input_data.get("pdf")
         body_text = input_data.get("body", "") or ""
 
-    # 1) PDFテーブル抽出
-    items = []
-    if pdf_bytes:
-        items = extract_items_from_pdf(pdf_bytes)
-    # テーブルから明細取得できた場合、メタ情報を本文から抽出して返す
-    if items:
-        text_for_meta = body_text or extract_text_from_pdf(pdf_bytes)
-        meta = extract_metadata_from_text(text_for_meta)
-        orders = []
-        for itm in items:
-            orders.append(
-                OrderData(
-                    customer_name=meta.get("customer_name", ""),
-                    product_id=itm.get("product_id"),
-                    quantity=itm.get("quantity"),
-                    delivery_date=meta.get("delivery_date"),
+    # 1) PDFテーブル抽出（添付は一度だけ開き、以降の抽出で共有する）
+    parsed = _as_parsed(pdf_bytes) if pdf_bytes else None
+    try:
+        items = extract_items_from_pdf(parsed) if parsed else []
+        # テーブルから明細取得できた場合、メタ情報を本文から抽出して返す
+        if items:
+            meta = extract_metadata_from_text(body_text or parsed)
+            orders = []
+            for itm in items:
+                orders.append(
+                    OrderData(
+                        customer_name=meta.get("customer_name", ""),
+                        product_id=itm.get("product_id"),
+                        quantity=itm.get("quantity"),
+                        delivery_date=meta.get("delivery_date"),
+                    )
                 )
-            )
-        return orders  # type: ignore
+            return orders  # type: ignore
 
-    # 2) 本文テキスト取得
-    if pdf_bytes:
-        ocr_pdf = extract_text_from_pdf(pdf_bytes)
-        text = (body_text + "\n" + ocr_pdf).strip()
-    else:
-        if isinstance(input_data, bytes):
-            text = input_data.decode(errors="ignore")
+        # 2) 本文テキスト取得
+        if parsed:
+            ocr_pdf = extract_text_from_pdf(parsed)
+            text = (body_text + "\n" + ocr_pdf).strip()
         else:
-            text = str(input_data)
+            if isinstance(input_data, bytes):
+                text = input_data.decode(errors="ignore")
+            else:
+                text = str(input_data)
+    finally:
+        # 呼び出し側から渡されたハンドルは閉じない
+        if parsed is not None and parsed is not pdf_bytes:
+            parsed.close()
 
     # 3) フィールド抽出（LLM or regex）
     fields = extract_order_fields(text)
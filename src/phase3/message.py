@@ -125,3 +125,38 @@ def build_order_notification(
     )
     # 戻り値にtextを含めることでプッシュ通知等での表示をフォールバック
     return {"text": summary_text, "blocks": blocks}
+
+
+def build_manual_review_notification(original_text: Any, reason: str) -> Dict[str, Any]:
+    """
+    自動抽出できなかった注文（PDF解析のタイムアウト等）を手動確認に回すメッセージを構築する。
+    """
+    if isinstance(original_text, dict):
+        body = original_text.get("body", "") or ""
+        has_pdf = original_text.get("pdf") is not None
+    else:
+        body = original_text if isinstance(original_text, str) else ""
+        has_pdf = False
+    max_len = 2000
+    truncated = body[:max_len] + "...（以下省略）" if len(body) > max_len else body
+    lines = [f"- 理由: {reason}"]
+    if has_pdf:
+        lines.append("- PDF添付あり（元メールを確認してください）")
+    blocks: List[Dict[str, Any]] = [
+        {
+            "type": "section",
+            "text": {
+                "type": "mrkdwn",
+                "text": ":warning: 注文を自動抽出できませんでした。手動で確認してください",
+            },
+        },
+        {"type": "section", "text": {"type": "mrkdwn", "text": "\n".join(lines)}},
+    ]
+    if truncated:
+        blocks.append(
+            {
+                "type": "section",
+                "text": {"type": "mrkdwn", "text": f"*原文：*```{truncated}```"},
+            }
+        )
+    return {"text": f"⚠️ 手動確認が必要な注文: {reason}", "blocks": blocks}
@@ -17,7 +17,7 @@ except ImportError:
 from slack_bolt import App
 from slack_bolt.adapter.starlette import SlackRequestHandler
 
-from src.phase4.notion_client import NotionClient
+from src.phase4.notion_client import get_notion_client
 from src.phase4.order_service import OrderService
 from src.phase5.email_client import EmailClient
 
@@ -74,11 +74,11 @@ def handle_approve(ack, body, client, logger):
             order_data = {}
     # マルチ商品注文はモーダルを省略し直接登録
     if order_data.get("items"):
-        from src.phase4.notion_client import NotionClient
         from src.phase4.order_service import OrderService
         from src.phase5.email_client import EmailClient
 
-        notion = NotionClient()
+        # 接続プールを共有するクライアントを使い回す
+        notion = get_notion_client()
         service = OrderService(notion, EmailClient())
         order_id = f"ORD{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
         # 登録処理
@@ -168,7 +168,7 @@ def view_submission(ack, body, client, logger):
         "quantity": int(vals["qty"]["quantity"]["value"]),
         "delivery_date": vals["del"]["delivery_date"]["value"],
     }
-    notion = NotionClient()
+    notion = get_notion_client()
     service = OrderService(notion)
     order_id = f"ORD{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
     # 実際の注文登録＆在庫更新
@@ -208,7 +208,9 @@ def handle_reject(ack, body, client, logger):
             order_data = json.loads(actions[0].get("value", "{}"))
         email_client = EmailClient()
         # 顧客のメールアドレス取得
-        cust_page = NotionClient().get_customer(order_data.get("customer_name", ""))
+        cust_page = get_notion_client().get_customer(
+            order_data.get("customer_name", "")
+        )
         email_addr = (
             cust_page.get("properties", {}).get("email", {}).get("email")
             if cust_page
@@ -0,0 +1,102 @@
+"""
+Phase4: OrderService.process_order の明細数ごとの処理時間を計測するベンチマーク
+
+レイテンシを注入した疑似 Notion サーバ（httpx.MockTransport）に対して、
+逐次実行と並列実行（max_workers 指定）の1注文あたりの所要時間を比較する。
+
+    python -m src.phase4.bench_order_service --latency 0.3 --workers 8
+"""
+import argparse
+import json
+import os
+import threading
+import time
+
+import httpx
+
+from src.phase4.notion_client import NotionClient
+from src.phase4.notion_scheduler import NotionRequestScheduler
+from src.phase4.order_service import OrderService
+
+
+class FakeNotionServer:
+    """各リクエストに固定レイテンシを加えて応答する疑似 Notion API"""
+
+    def __init__(self, latency: float, n_products: int):
+        self.latency = latency
+        self.requests = 0
+        self._lock = threading.Lock()
+        self.products = [
+            {
+                "id": f"prod{i}",
+                "properties": {
+                    "id": {"title": [{"plain_text": f"P{i:03d}"}]},
+                    "name": {"rich_text": [{"plain_text": f"商品{i}"}]},
+                    "price": {"number": 100},
+                    "stock": {"number": 10**6},
+                },
+            }
+            for i in range(n_products)
+        ]
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        time.sleep(self.latency)
+        with self._lock:
+            self.requests += 1
+        if request.url.path.endswith("/query"):
+            body = json.loads(request.content or b"{}")
+            if "customers" in request.url.path:
+                return httpx.Response(200, json={"results": [{"id": "cust"}]})
+            wanted = {c["rich_text"]["equals"] for c in body["filter"]["or"]}
+            hits = [
+                p
+                for p in self.products
+                if p["properties"]["id"]["title"][0]["plain_text"] in wanted
+            ]
+            return httpx.Response(200, json={"results": hits, "has_more": False})
+        return httpx.Response(200, json={"id": "page"})
+
+
+def make_client(server: FakeNotionServer) -> NotionClient:
+    for key, value in {
+        "NOTION_API_KEY": "bench",
+        "NOTION_DATABASE_ID_PRODUCTS": "products",
+        "NOTION_DATABASE_ID_CUSTOMERS": "customers",
+        "NOTION_DATABASE_ID_ORDERS": "orders",
+        "NOTION_DATABASE_ID_ORDER_DETAILS": "details",
+    }.items():
+        os.environ.setdefault(key, value)
+    # 流量制御を外し、並列化による短縮だけを計測する
+    client = NotionClient(scheduler=NotionRequestScheduler(rate=0))
+    client.client = httpx.Client(
+        base_url="https://api.notion.com/v1", transport=httpx.MockTransport(server)
+    )
+    return client
+
+
+def run_order(n_items: int, latency: float, workers: int) -> float:
+    server = FakeNotionServer(latency, n_items)
+    service = OrderService(make_client(server), max_workers=workers)
+    items = [{"product_id": f"P{i:03d}", "quantity": 1} for i in range(n_items)]
+    start = time.perf_counter()
+    service.process_order({"order_id": "BENCH", "customer_name": "C", "items": items})
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency", type=float, default=0.3, help="秒/リクエスト")
+    parser.add_argument("--workers", type=int, default=8, help="並列実行数")
+    parser.add_argument("--items", type=int, nargs="+", default=[1, 5, 10, 20, 40])
+    args = parser.parse_args()
+
+    print(f"latency={args.latency}s workers={args.workers}")
+    print(f"{'items':>6} {'sequential[s]':>14} {'parallel[s]':>12} {'speedup':>8}")
+    for n in args.items:
+        seq = run_order(n, args.latency, 1)
+        par = run_order(n, args.latency, args.workers)
+        print(f"{n:>6} {seq:>14.2f} {par:>12.2f} {seq / par:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
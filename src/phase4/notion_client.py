@@ -1,16 +1,78 @@
 """Phase4: Notion APIクライアントラッパー"""
 import logging
 import os
+import threading
 from datetime import datetime
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterable, List, Optional, Set
 
 import httpx
 
+from .notion_scheduler import NotionRequestScheduler, get_default_scheduler
+
+# Notion の compound filter (or/and) に含められる条件数の上限
+MAX_FILTER_CONDITIONS = 100
+
+
+def _plain_text(prop: Optional[Dict[str, Any]]) -> str:
+    """title / rich_text プロパティからプレーンテキストを取り出す"""
+    if not prop:
+        return ""
+    fragments = prop.get("title") or prop.get("rich_text") or []
+    texts = []
+    for frag in fragments:
+        text = frag.get("plain_text")
+        if text is None:
+            text = frag.get("text", {}).get("content", "")
+        texts.append(text)
+    return "".join(texts)
+
+
+# 接続プール設定（keep-alive 接続を使い回して TLS ハンドシェイクを省く）
+NOTION_HTTP_LIMITS = httpx.Limits(
+    max_connections=int(os.getenv("NOTION_MAX_CONNECTIONS", "20")),
+    max_keepalive_connections=int(os.getenv("NOTION_MAX_KEEPALIVE", "10")),
+    keepalive_expiry=float(os.getenv("NOTION_KEEPALIVE_EXPIRY", "120")),
+)
+NOTION_TIMEOUT = httpx.Timeout(30.0, connect=10.0)
+
 
 class NotionClient:
     """Notion APIへの問い合わせを行うクライアント"""
 
-    def __init__(self, base_url: str = "https://api.notion.com/v1"):
+    def __init__(
+        self,
+        base_url: str = "https://api.notion.com/v1",
+        product_cache: Optional[Any] = None,
+        scheduler: Optional[NotionRequestScheduler] = None,
+    ):
+        headers = self._load_config(product_cache)
+        # 全リクエストはスケジューラ経由で送信（流量制御と 429/5xx 再送）
+        self.scheduler = scheduler or get_default_scheduler()
+        self.client = httpx.Client(
+            base_url=base_url,
+            headers=headers,
+            limits=NOTION_HTTP_LIMITS,
+            timeout=NOTION_TIMEOUT,
+        )
+
+    def close(self) -> None:
+        self.client.close()
+
+    def _request(
+        self,
+        method: str,
+        url: str,
+        retry_server_errors: Optional[bool] = None,
+        **kwargs: Any,
+    ) -> Any:
+        """retry_server_errors を省略すると冪等なリクエストだけ 5xx で再送する"""
+        if retry_server_errors is None:
+            retry_server_errors = self.scheduler.is_idempotent(method, url)
+        send = getattr(self.client, method)
+        return self.scheduler.send(lambda: send(url, **kwargs), retry_server_errors)
+
+    def _load_config(self, product_cache: Optional[Any]) -> Dict[str, str]:
+        """環境変数を検証してDB IDを設定し、リクエストヘッダを返す"""
         # 必須環境変数の検証
         api_key = os.getenv("NOTION_API_KEY")
         if not api_key:
@@ -33,85 +95,55 @@ class NotionClient:
         # 注文明細用データベースIDはオプション（サブオーダー登録時に使用）
         # self.database_id_order_details may be None if detail creation is not needed
 
-        headers = {
+        # Logger for warning messages
+        self.logger = logging.getLogger(__name__)
+        # 商品キャッシュ（未指定時は環境変数に応じたプロセス共有キャッシュ、無効ならNone）
+        if product_cache is None:
+            from .product_cache import get_default_product_cache
+
+            product_cache = get_default_product_cache()
+        self.product_cache = product_cache
+        return {
             "Authorization": f"Bearer {api_key}",
             "Notion-Version": "2022-06-28",
             "Content-Type": "application/json",
         }
-        self.client = httpx.Client(base_url=base_url, headers=headers)
-        # Logger for warning messages
-        import logging
 
-        self.logger = logging.getLogger(__name__)
-
-    def query_database(
-        self, database_id: str, filter: Optional[Dict[str, Any]] = None
-    ) -> Dict[str, Any]:
-        payload: Dict[str, Any] = {}
-        if filter:
-            payload["filter"] = filter
-        resp = self.client.post(f"/databases/{database_id}/query", json=payload)
-        resp.raise_for_status()
-        return resp.json()
+    def _products_filter(self, chunk: List[str]) -> Dict[str, Any]:
+        conditions = []
+        for pid in chunk:
+            conditions.append({"property": "id", "rich_text": {"equals": pid}})
+            conditions.append({"property": "name", "rich_text": {"equals": pid}})
+        return {"or": conditions}
 
-    def get_product(self, product_id: str) -> Optional[Dict[str, Any]]:
-        """指定IDの商品ページを取得"""
-        # First, try lookup by product ID (title property 'id')
-        from httpx import HTTPStatusError
+    def _match_products(
+        self, chunk: List[str], pages: List[Dict[str, Any]]
+    ) -> Dict[str, Dict[str, Any]]:
+        """一括取得した商品ページを要求識別子に対応付ける（id一致を優先）"""
+        by_id: Dict[str, Dict[str, Any]] = {}
+        by_name: Dict[str, Dict[str, Any]] = {}
+        for page in pages:
+            props = page.get("properties", {})
+            by_id.setdefault(_plain_text(props.get("id")), page)
+            by_name.setdefault(_plain_text(props.get("name")), page)
+        found: Dict[str, Dict[str, Any]] = {}
+        for pid in chunk:
+            page = by_id.get(pid) or by_name.get(pid)
+            if page:
+                found[pid] = page
+                if self.product_cache is not None:
+                    self.product_cache.put(page, pid)
+        return found
 
-        try:
-            result = self.query_database(
-                self.database_id_products,
-                {"property": "id", "rich_text": {"equals": product_id}},
-            )
-            items = result.get("results", [])
-            if items:
-                return items[0]
-        except HTTPStatusError as e:
-            self.logger.warning(f"get_product by id filter failed: {e}")
-        # Fallback: lookup by product name (rich_text property 'name')
-        try:
-            result_name = self.query_database(
-                self.database_id_products,
-                {"property": "name", "rich_text": {"equals": product_id}},
-            )
-            items_name = result_name.get("results", [])
-            if items_name:
-                return items_name[0]
-        except HTTPStatusError as e:
-            self.logger.warning(f"get_product by name filter failed: {e}")
-        return None
-
-    def get_customer(self, customer_name: str) -> Optional[Dict[str, Any]]:
-        """指定顧客名（rich_textプロパティ customer_name）にマッチする顧客ページを取得"""
-        result = self.query_database(
-            self.database_id_customers,
-            {"property": "customer_name", "rich_text": {"equals": customer_name}},
-        )
-        items = result.get("results", [])
-        return items[0] if items else None
-
-    def get_product_stock(self, product_id: str) -> Optional[int]:
-        """指定商品の在庫数を返す"""
-        page = self.get_product(product_id)
-        if not page:
-            return None
-        props = page.get("properties", {})
-        return props.get("stock", {}).get("number")
-
-    def update_product_stock(self, page_id: str, new_stock: int) -> Dict[str, Any]:
-        """商品ページの在庫数と更新日時を更新"""
-        props = {
+    def _stock_props(self, new_stock: int) -> Dict[str, Any]:
+        return {
             "stock": {"number": new_stock},
             "last_updated": {"date": {"start": datetime.utcnow().isoformat()}},
         }
-        resp = self.client.patch(f"/pages/{page_id}", json={"properties": props})
-        resp.raise_for_status()
-        return resp.json()
 
-    def create_order(self, data: Dict[str, Any]) -> Dict[str, Any]:
+    def _order_payload(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """
-        注文ヘッダ or 注文明細 or 単一商品注文をデータベースに作成
+        注文ヘッダ or 注文明細 or 単一商品注文のページ作成ペイロードを構築
         data により orders または order_details に振り分け
         """
         # デバッグ: 呼び出しデータをログ出力
@@ -139,11 +171,11 @@ class NotionClient:
             logging.getLogger(__name__).debug(
                 "Notion create_order(detail) payload: %s", payload
             )
-            resp = self.client.post("/pages", json=payload)
+            return payload
         # 注文ヘッダ (orders) 登録
-        elif data.get("total_price") is not None:
+        if data.get("total_price") is not None:
             # 注文ヘッダ (orders) 登録
-            props: Dict[str, Any] = {
+            props = {
                 "order_id": {"title": [{"text": {"content": data["order_id"]}}]},
                 "total_price": {"number": data["total_price"]},
                 "status": {"select": {"name": data.get("status", "")}},
@@ -165,51 +197,42 @@ class NotionClient:
             logging.getLogger(__name__).debug(
                 "Notion create_order(header) payload: %s", payload
             )
-            resp = self.client.post("/pages", json=payload)
+            return payload
         # 従来の単一商品注文
-        else:
-            cust_page_id = data.get("customer_page_id")
-            prod_page_id = data.get("product_page_id")
-            props: Dict[str, Any] = {
-                "order_id": {"title": [{"text": {"content": data["order_id"]}}]},
-                "quantity": {"number": data["quantity"]},
-                "status": {"select": {"name": data.get("status", "")}},
-                "approved_by": {
-                    "rich_text": [{"text": {"content": data.get("approved_by", "")}}]
-                },
-            }
-            # delivery_date が設定されていれば追加
-            dd2 = data.get("delivery_date")
-            if dd2:
-                dd2_str = dd2.isoformat() if hasattr(dd2, "isoformat") else str(dd2)
-                props["delivery_date"] = {"date": {"start": dd2_str}}
-            # created_at は必須なので常に追加
-            ca = data.get("created_at") or datetime.utcnow().isoformat()
-            props["created_at"] = {"date": {"start": ca}}
-            if cust_page_id:
-                props["customers"] = {"relation": [{"id": cust_page_id}]}
-            if prod_page_id:
-                props["products"] = {"relation": [{"id": prod_page_id}]}
-            resp = self.client.post(
-                "/pages",
-                json={
-                    "parent": {"database_id": self.database_id_orders},
-                    "properties": props,
-                },
-            )
-        # エラーハンドリング：詳細ログ出力
-        try:
-            resp.raise_for_status()
-        except Exception:
-            text = getattr(resp, "text", None)
-            logging.getLogger(__name__).error(
-                "Notion create_order failed (status=%s): %s", resp.status_code, text
-            )
-            raise
-        return resp.json()
+        cust_page_id = data.get("customer_page_id")
+        prod_page_id = data.get("product_page_id")
+        props = {
+            "order_id": {"title": [{"text": {"content": data["order_id"]}}]},
+            "quantity": {"number": data["quantity"]},
+            "status": {"select": {"name": data.get("status", "")}},
+            "approved_by": {
+                "rich_text": [{"text": {"content": data.get("approved_by", "")}}]
+            },
+        }
+        # delivery_date が設定されていれば追加
+        dd2 = data.get("delivery_date")
+        if dd2:
+            dd2_str = dd2.isoformat() if hasattr(dd2, "isoformat") else str(dd2)
+            props["delivery_date"] = {"date": {"start": dd2_str}}
+        # created_at は必須なので常に追加
+        ca = data.get("created_at") or datetime.utcnow().isoformat()
+        props["created_at"] = {"date": {"start": ca}}
+        if cust_page_id:
+            props["customers"] = {"relation": [{"id": cust_page_id}]}
+        if prod_page_id:
+            props["products"] = {"relation": [{"id": prod_page_id}]}
+        return {
+            "parent": {"database_id": self.database_id_orders},
+            "properties": props,
+        }
 
-    def create_product(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        """productsデータベースに商品ページを作成"""
+    def _log_create_order_error(self, resp: Any) -> None:
+        text = getattr(resp, "text", None)
+        logging.getLogger(__name__).error(
+            "Notion create_order failed (status=%s): %s", resp.status_code, text
+        )
+
+    def _product_payload(self, data: Dict[str, Any]) -> Dict[str, Any]:
         props: Dict[str, Any] = {
             # Notion上のプロパティ型(id: title, name: rich_text)に合わせて設定
             "id": {"title": [{"text": {"content": data["id"]}}]},
@@ -220,18 +243,12 @@ class NotionClient:
             "created_at": {"date": {"start": data["created_at"]}},
             "last_updated": {"date": {"start": data["last_updated"]}},
         }
-        resp = self.client.post(
-            "/pages",
-            json={
-                "parent": {"database_id": self.database_id_products},
-                "properties": props,
-            },
-        )
-        resp.raise_for_status()
-        return resp.json()
+        return {
+            "parent": {"database_id": self.database_id_products},
+            "properties": props,
+        }
 
-    def create_customer(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        """customersデータベースに顧客ページを作成（存在しない場合の新規登録用）"""
+    def _customer_payload(self, data: Dict[str, Any]) -> Dict[str, Any]:
         # titleプロパティ id、rich_textプロパティ customer_name, email, first_order_date, is_existing, created_at
         # properties を必須項目と任意項目に分けて定義
         props: Dict[str, Any] = {
@@ -252,20 +269,247 @@ class NotionClient:
         props["created_at"] = {
             "date": {"start": data.get("created_at", datetime.utcnow().isoformat())}
         }
-        resp = self.client.post(
+        return {
+            "parent": {"database_id": self.database_id_customers},
+            "properties": props,
+        }
+
+    def _log_create_customer_error(self, e: httpx.HTTPStatusError) -> None:
+        text = getattr(e.response, "text", "")
+        logging.getLogger(__name__).error(
+            f"create_customer failed: {e.response.status_code} {text}",
+            exc_info=True,
+        )
+
+    def query_database(
+        self,
+        database_id: str,
+        filter: Optional[Dict[str, Any]] = None,
+        start_cursor: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {}
+        if filter:
+            payload["filter"] = filter
+        if start_cursor:
+            payload["start_cursor"] = start_cursor
+        resp = self._request("post", f"/databases/{database_id}/query", json=payload)
+        resp.raise_for_status()
+        return resp.json()
+
+    def query_database_all(
+        self, database_id: str, filter: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """next_cursor を辿って全ページ分の結果を返す"""
+        results: List[Dict[str, Any]] = []
+        result = self.query_database(database_id, filter)
+        while True:
+            results.extend(result.get("results", []))
+            cursor = result.get("next_cursor")
+            if not result.get("has_more") or not cursor:
+                return results
+            result = self.query_database(database_id, filter, start_cursor=cursor)
+
+    def get_product(self, product_id: str) -> Optional[Dict[str, Any]]:
+        """指定IDの商品ページを取得"""
+        if self.product_cache is not None:
+            cached = self.product_cache.get(product_id)
+            if cached is not None:
+                return cached
+        page = self._fetch_product(product_id)
+        if page and self.product_cache is not None:
+            self.product_cache.put(page, product_id)
+        return page
+
+    def _fetch_product(self, product_id: str) -> Optional[Dict[str, Any]]:
+        # First, try lookup by product ID (title property 'id')
+        from httpx import HTTPStatusError
+
+        try:
+            result = self.query_database(
+                self.database_id_products,
+                {"property": "id", "rich_text": {"equals": product_id}},
+            )
+            items = result.get("results", [])
+            if items:
+                return items[0]
+        except HTTPStatusError as e:
+            self.logger.warning(f"get_product by id filter failed: {e}")
+        # Fallback: lookup by product name (rich_text property 'name')
+        try:
+            result_name = self.query_database(
+                self.database_id_products,
+                {"property": "name", "rich_text": {"equals": product_id}},
+            )
+            items_name = result_name.get("results", [])
+            if items_name:
+                return items_name[0]
+        except HTTPStatusError as e:
+            self.logger.warning(f"get_product by name filter failed: {e}")
+        return None
+
+    def get_products(self, product_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        複数の商品ID/商品名をまとめて解決する。
+        id・name の OR フィルタを上限件数ごとにチャンク分割して問い合わせ、
+        要求した識別子をキーとする辞書を返す（見つからないものは含まない）。
+        get_product と同様に id 一致を name 一致より優先する。
+        """
+        from httpx import HTTPStatusError
+
+        wanted = list(dict.fromkeys(pid for pid in product_ids if pid))
+        found: Dict[str, Dict[str, Any]] = {}
+        if self.product_cache is not None:
+            for pid in wanted:
+                cached = self.product_cache.get(pid)
+                if cached is not None:
+                    found[pid] = cached
+            wanted = [pid for pid in wanted if pid not in found]
+        # 1識別子あたり id/name の2条件を使う
+        chunk_size = MAX_FILTER_CONDITIONS // 2
+        for start in range(0, len(wanted), chunk_size):
+            chunk = wanted[start : start + chunk_size]  # noqa: E203
+            try:
+                pages = self.query_database_all(
+                    self.database_id_products, self._products_filter(chunk)
+                )
+            except HTTPStatusError as e:
+                self.logger.warning(f"get_products batch query failed: {e}")
+                # フォールバック: 1件ずつ取得
+                for pid in chunk:
+                    page = self.get_product(pid)
+                    if page:
+                        found[pid] = page
+                continue
+            found.update(self._match_products(chunk, pages))
+        return found
+
+    def list_product_identifiers(self) -> Set[str]:
+        """商品DBの全商品の id と name の集合を返す（抽出結果のカタログ照合用）"""
+        identifiers: Set[str] = set()
+        for page in self.query_database_all(self.database_id_products):
+            props = page.get("properties", {})
+            identifiers.update(
+                t
+                for t in (_plain_text(props.get("id")), _plain_text(props.get("name")))
+                if t
+            )
+        return identifiers
+
+    def list_changed_pages(
+        self, database_id: str, date_property: str, since: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        日付プロパティ date_property（created_at / last_updated）またはページの最終編集日時が
+        since（ISO 8601）以降のページを返す。since=None なら全ページ（RAG インデックスの差分同期用）
+        """
+        filter = None
+        if since:
+            filter = {
+                "or": [
+                    {"property": date_property, "date": {"on_or_after": since}},
+                    {
+                        "timestamp": "last_edited_time",
+                        "last_edited_time": {"on_or_after": since},
+                    },
+                ]
+            }
+        return self.query_database_all(database_id, filter)
+
+    def get_customer(self, customer_name: str) -> Optional[Dict[str, Any]]:
+        """指定顧客名（rich_textプロパティ customer_name）にマッチする顧客ページを取得"""
+        result = self.query_database(
+            self.database_id_customers,
+            {"property": "customer_name", "rich_text": {"equals": customer_name}},
+        )
+        items = result.get("results", [])
+        return items[0] if items else None
+
+    def get_product_stock(self, product_id: str) -> Optional[int]:
+        """指定商品の在庫数を返す"""
+        page = self.get_product(product_id)
+        if not page:
+            return None
+        props = page.get("properties", {})
+        return props.get("stock", {}).get("number")
+
+    def update_product_stock(self, page_id: str, new_stock: int) -> Dict[str, Any]:
+        """商品ページの在庫数と更新日時を更新"""
+        props = self._stock_props(new_stock)
+        resp = self._request("patch", f"/pages/{page_id}", json={"properties": props})
+        resp.raise_for_status()
+        # 同一プロセス内の在庫値を一貫させるためキャッシュにも書き込む
+        if self.product_cache is not None:
+            self.product_cache.update_stock(page_id, new_stock)
+        return resp.json()
+
+    def update_page(self, page_id: str, properties: Dict[str, Any]) -> Dict[str, Any]:
+        """ページのプロパティを更新（注文ヘッダの total_price 更新など）"""
+        resp = self._request(
+            "patch", f"/pages/{page_id}", json={"properties": properties}
+        )
+        resp.raise_for_status()
+        return resp.json()
+
+    def create_order(
+        self, data: Dict[str, Any], retry_server_errors: bool = False
+    ) -> Dict[str, Any]:
+        """
+        注文ヘッダ or 注文明細 or 単一商品注文をデータベースに作成
+        data により orders または order_details に振り分け
+        """
+        resp = self._request(
+            "post",
             "/pages",
-            json={
-                "parent": {"database_id": self.database_id_customers},
-                "properties": props,
-            },
+            retry_server_errors=retry_server_errors,
+            json=self._order_payload(data),
+        )
+        # エラーハンドリング：詳細ログ出力
+        try:
+            resp.raise_for_status()
+        except Exception:
+            self._log_create_order_error(resp)
+            raise
+        return resp.json()
+
+    def create_product(
+        self, data: Dict[str, Any], retry_server_errors: bool = False
+    ) -> Dict[str, Any]:
+        """productsデータベースに商品ページを作成"""
+        resp = self._request(
+            "post",
+            "/pages",
+            retry_server_errors=retry_server_errors,
+            json=self._product_payload(data),
+        )
+        resp.raise_for_status()
+        return resp.json()
+
+    def create_customer(
+        self, data: Dict[str, Any], retry_server_errors: bool = False
+    ) -> Dict[str, Any]:
+        """customersデータベースに顧客ページを作成（存在しない場合の新規登録用）"""
+        resp = self._request(
+            "post",
+            "/pages",
+            retry_server_errors=retry_server_errors,
+            json=self._customer_payload(data),
         )
         try:
             resp.raise_for_status()
         except httpx.HTTPStatusError as e:
-            text = getattr(e.response, "text", "")
-            logging.getLogger(__name__).error(
-                f"create_customer failed: {e.response.status_code} {text}",
-                exc_info=True,
-            )
+            self._log_create_customer_error(e)
             raise
         return resp.json()
+
+
+_shared_client: Optional[NotionClient] = None
+_shared_lock = threading.Lock()
+
+
+def get_notion_client() -> NotionClient:
+    """プロセス内で共有する NotionClient（接続プールを使い回す）を返す"""
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            _shared_client = NotionClient()
+        return _shared_client
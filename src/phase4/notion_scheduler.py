@@ -0,0 +1,177 @@
+"""Phase4: Notion API のレート制限に合わせたリクエストスケジューラ"""
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class NotionRequestScheduler:
+    """
+    プロセス内の全 Notion リクエストで共有するトークンバケット。
+    rate（リクエスト/秒）と burst（瞬間的に許容する件数）で送信間隔を制御し、
+    429 では Retry-After の間すべての送信を止め、5xx ではジッタ付き指数バックオフで再送する。
+    5xx の再送は retry_server_errors=True（冪等なリクエスト）のときだけ行う。
+    ページ作成（POST /pages）は Notion 側で作成済みでも 502/504 が返ることがあり、
+    再送すると重複ページができるため既定では再送しない。
+    rate <= 0 の場合は流量制御を行わない（再送のみ）。
+    """
+
+    def __init__(
+        self,
+        rate: float = 3.0,
+        burst: int = 3,
+        max_retries: int = 5,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        # メトリクス
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.requests = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.throttled = 0
+        self.server_errors = 0
+        self.retries = 0
+
+    def _reserve(self) -> float:
+        """送信枠を1つ予約し、送信までに待つべき秒数を返す"""
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self._paused_until - now)
+            if self.rate > 0:
+                self._tokens = min(
+                    float(self.burst), self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                # トークンが足りない分は負の残高として予約し、補充時刻まで待つ
+                self._tokens -= 1
+                if self._tokens < 0:
+                    wait = max(wait, -self._tokens / self.rate)
+            self.requests += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            if wait > 0:
+                self.queue_depth += 1
+                self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+            return wait
+
+    def _release(self) -> None:
+        with self._lock:
+            self.queue_depth -= 1
+
+    def acquire(self) -> None:
+        """送信可能になるまでブロックする"""
+        wait = self._reserve()
+        if wait > 0:
+            try:
+                time.sleep(wait)
+            finally:
+                self._release()
+
+    def _pause(self, seconds: float) -> None:
+        """429 応答時に全リクエストの送信を指定秒数止める"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _backoff(self, attempt: int) -> float:
+        cap = min(self.backoff_max, self.backoff_base * (2**attempt))
+        return random.uniform(cap / 2, cap)
+
+    def _retry_delay(
+        self, resp: Any, attempt: int, retry_server_errors: bool = True
+    ) -> Optional[float]:
+        """再送すべき応答なら待機秒数を、そうでなければ None を返す"""
+        status = getattr(resp, "status_code", 200)
+        if attempt >= self.max_retries:
+            return None
+        if status == 429:
+            with self._lock:
+                self.throttled += 1
+                self.retries += 1
+            headers = getattr(resp, "headers", None) or {}
+            try:
+                delay = float(headers.get("Retry-After"))
+            except (TypeError, ValueError):
+                delay = self._backoff(attempt)
+            self._pause(delay)
+            logger.warning(f"Notion rate limited (429); retry after {delay:.2f}s")
+            # 待機は次回の acquire で行う
+            return 0.0
+        if 500 <= status < 600 and retry_server_errors:
+            with self._lock:
+                self.server_errors += 1
+                self.retries += 1
+            delay = self._backoff(attempt)
+            logger.warning(f"Notion server error ({status}); retry in {delay:.2f}s")
+            return delay
+        return None
+
+    @staticmethod
+    def is_idempotent(method: str, url: str) -> bool:
+        """5xx で再送してよいリクエストか（GET/PATCH とデータベースの query）"""
+        method = method.lower()
+        return method in ("get", "patch") or (
+            method == "post" and url.endswith("/query")
+        )
+
+    def send(self, request: Callable[[], Any], retry_server_errors: bool = True) -> Any:
+        """流量制御と再送を行いながら request() を実行し、最終応答を返す"""
+        attempt = 0
+        while True:
+            self.acquire()
+            resp = request()
+            delay = self._retry_delay(resp, attempt, retry_server_errors)
+            if delay is None:
+                return resp
+            if delay > 0:
+                time.sleep(delay)
+            attempt += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        """待ち行列長・待機時間・再送回数などのメトリクスを返す"""
+        with self._lock:
+            return {
+                "queue_depth": self.queue_depth,
+                "max_queue_depth": self.max_queue_depth,
+                "requests": self.requests,
+                "total_wait": self.total_wait,
+                "avg_wait": self.total_wait / self.requests if self.requests else 0.0,
+                "max_wait": self.max_wait,
+                "throttled": self.throttled,
+                "server_errors": self.server_errors,
+                "retries": self.retries,
+            }
+
+
+_default_scheduler: Optional[NotionRequestScheduler] = None
+_default_lock = threading.Lock()
+
+
+def get_default_scheduler() -> NotionRequestScheduler:
+    """
+    プロセス共有のスケジューラを返す。
+    NOTION_RATE_LIMIT（既定3req/s）、NOTION_RATE_BURST、NOTION_MAX_RETRIES で調整可能。
+    """
+    global _default_scheduler
+    with _default_lock:
+        if _default_scheduler is None:
+            _default_scheduler = NotionRequestScheduler(
+                rate=float(os.getenv("NOTION_RATE_LIMIT", "3")),
+                burst=int(os.getenv("NOTION_RATE_BURST", "3")),
+                max_retries=int(os.getenv("NOTION_MAX_RETRIES", "5")),
+            )
+        return _default_scheduler
@@ -1,7 +1,10 @@
 """Phase4: 注文登録＆在庫更新サービス"""
 import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
-from typing import Any, Dict, Optional
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, List, Optional
 
 from .notion_client import NotionClient
 
@@ -9,10 +12,35 @@ from .notion_client import NotionClient
 class OrderService:
     """注文登録と在庫更新ロジックおよび自動返信メール送信を提供するサービス"""
 
-    def __init__(self, notion: NotionClient, email_client: Optional[Any] = None):
+    def __init__(
+        self,
+        notion: NotionClient,
+        email_client: Optional[Any] = None,
+        max_workers: Optional[int] = None,
+    ):
         self.notion = notion
         self.email_client = email_client
         self.logger = logging.getLogger(__name__)
+        # 明細作成・在庫更新の同時実行数（1 なら逐次実行）
+        if max_workers is None:
+            max_workers = int(os.getenv("ORDER_WRITE_CONCURRENCY", "1"))
+        self.max_workers = max(1, max_workers)
+
+    def _run_writes(self, tasks: List[Callable[[], Any]]) -> List[Any]:
+        """
+        書き込みタスクを最大 max_workers 並列で実行し、投入順の結果を返す。
+        失敗したタスクがあれば全タスクの完了を待ってから最初の例外を送出する。
+        """
+        if self.max_workers <= 1 or len(tasks) <= 1:
+            return [task() for task in tasks]
+        workers = min(self.max_workers, len(tasks))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(task) for task in tasks]
+            wait(futures)
+        for future in futures:
+            if future.exception() is not None:
+                raise future.exception()
+        return [future.result() for future in futures]
 
     def check_stock(self, product_id: str, quantity: int) -> bool:
         """在庫が足りるかチェック"""
@@ -21,6 +49,69 @@ class OrderService:
             raise ValueError(f"Product {product_id} not found")
         return stock >= quantity
 
+    def get_products(self, product_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """商品ページをまとめて取得（get_products 未実装のクライアントは1件ずつ取得）"""
+        product_ids = list(product_ids)
+        get_many = getattr(self.notion, "get_products", None)
+        if callable(get_many):
+            return get_many(product_ids)
+        found: Dict[str, Dict[str, Any]] = {}
+        for pid in dict.fromkeys(product_ids):
+            page = self.notion.get_product(pid)
+            if page:
+                found[pid] = page
+        return found
+
+    def check_stocks(self, items: List[Dict[str, Any]]) -> bool:
+        """複数明細の在庫が全て足りるかを一括取得でチェック"""
+        products = self.get_products(item.get("product_id") for item in items)
+        required: Dict[str, int] = {}
+        for item in items:
+            pid = item.get("product_id")
+            if pid not in products:
+                raise ValueError(f"Product {pid} not found")
+            required[pid] = required.get(pid, 0) + (item.get("quantity") or 0)
+        for pid, qty in required.items():
+            stock = products[pid].get("properties", {}).get("stock", {}).get("number")
+            if stock is None or stock < qty:
+                return False
+        return True
+
+    def _resolve_items(
+        self, items: List[Dict[str, Any]]
+    ) -> "tuple[List[Dict[str, Any]], Dict[str, int]]":
+        """
+        明細の商品ページを一括取得し、在庫を検証する。
+        明細ごとの小計と、商品ページIDごとの更新後在庫を返す。
+        """
+        products = self.get_products(item.get("product_id") for item in items)
+        lines: List[Dict[str, Any]] = []
+        new_stocks: Dict[str, int] = {}
+        for item in items:
+            pid = item.get("product_id")
+            qty = item.get("quantity")
+            prod = products.get(pid)
+            if not prod:
+                raise ValueError(f"Product {pid} not found")
+            prod_page_id = prod.get("id")
+            props = prod.get("properties", {})
+            stock = new_stocks.get(prod_page_id, props.get("stock", {}).get("number"))
+            if stock is None:
+                raise ValueError(f"Product {pid} not found")
+            if stock < qty:
+                raise ValueError(f"Insufficient stock for {pid}")
+            new_stocks[prod_page_id] = stock - qty
+            price = props.get("price", {}).get("number") or 0
+            lines.append(
+                {
+                    "product_id": pid,
+                    "product_page_id": prod_page_id,
+                    "quantity": qty,
+                    "sub_total": price * qty,
+                }
+            )
+        return lines, new_stocks
+
     def process_order(self, order: Dict[str, Any]) -> Dict[str, Any]:
         """
         注文をDB登録し、在庫を更新するトランザクション処理。
@@ -36,6 +127,8 @@ class OrderService:
                     "quantity": order.get("quantity", 0),
                 }
             ]
+        # 商品を一括取得して在庫を検証（不足時は顧客・ヘッダを作成せず例外）
+        lines, new_stocks = self._resolve_items(items)
         # 顧客取得・作成
         cust_page_id = None
         get_cust = getattr(self.notion, "get_customer", None)
@@ -59,9 +152,7 @@ class OrderService:
                 cust_page_id = cust_page.get("id")
         # マルチアイテムの場合
         if items:
-            # 価格取得と在庫チェック
-            total_price = 0
-            # 先に注文ヘッダを作成
+            total_price = sum(line["sub_total"] for line in lines)
             header_id = order.get("order_id")
             created_at = datetime.utcnow().isoformat()
             header_data = {
@@ -75,41 +166,29 @@ class OrderService:
             }
             header_page = self.notion.create_order(header_data)
             header_page_id = header_page.get("id")
-            # 各明細処理
-            for item in items:
-                pid = item.get("product_id")
-                qty = item.get("quantity")
-                prod = self.notion.get_product(pid)
-                if not prod:
-                    raise ValueError(f"Product {pid} not found")
-                prod_page_id = prod.get("id")
-                # 在庫チェック
-                if not self.check_stock(pid, qty):
-                    raise ValueError(f"Insufficient stock for {pid}")
-                price = prod.get("properties", {}).get("price", {}).get("number") or 0
-                sub_total = price * qty
-                total_price += sub_total
-                # 明細レコード作成
-                detail_id = f"{header_id}-{pid}"  # 明細ID生成
+            # 明細レコード作成と在庫更新（同一商品は合算して1回だけ更新）
+            tasks: List[Callable[[], Any]] = []
+            for line in lines:
                 detail_data = {
                     "order_id": header_id,
-                    "id": detail_id,
+                    "id": f"{header_id}-{line['product_id']}",  # 明細ID生成
                     "order_page_id": header_page_id,
-                    "product_page_id": prod_page_id,
-                    "quantity": qty,
-                    "sub_total": sub_total,
+                    "product_page_id": line["product_page_id"],
+                    "quantity": line["quantity"],
+                    "sub_total": line["sub_total"],
                     "created_at": created_at,
                 }
-                self.notion.create_order(detail_data)
-                # 在庫更新
-                old_stock = self.notion.get_product_stock(pid)
-                self.notion.update_product_stock(prod_page_id, old_stock - qty)
+                tasks.append(partial(self.notion.create_order, detail_data))
+            for prod_page_id, new_stock in new_stocks.items():
+                tasks.append(
+                    partial(self.notion.update_product_stock, prod_page_id, new_stock)
+                )
+            self._run_writes(tasks)
             # ヘッダの total_price 更新
             try:
                 # total_priceフィールドを更新
-                self.notion.client.patch(
-                    f"/pages/{header_page.get('id')}",
-                    json={"properties": {"total_price": {"number": total_price}}},
+                self.notion.update_page(
+                    header_page_id, {"total_price": {"number": total_price}}
                 )
             except Exception as e:
                 self.logger.error(f"failed to update header total_price: {e}")
@@ -0,0 +1,143 @@
+"""Phase4: 商品カタログのプロセス内キャッシュ（TTL + LRU）"""
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from .notion_client import _plain_text
+
+
+class ProductCache:
+    """
+    商品ページを id と name の両方のキーで引けるプロセス内キャッシュ。
+    エントリは商品ページ単位で管理し、TTL 経過で失効、件数上限を超えると
+    最も古く参照されたエントリから追い出す。
+    get はページの複製を返すため、呼び出し側が書き換えてもキャッシュには影響しない。
+    """
+
+    def __init__(self, ttl: float = 300.0, max_size: int = 1024):
+        self.ttl = ttl
+        self.max_size = max_size
+        # page_id -> (保存時刻, 商品ページ)
+        self._entries: "OrderedDict[str, tuple[float, Dict[str, Any]]]" = OrderedDict()
+        # 商品ID/商品名/追加キー -> page_id
+        self._keys: Dict[str, str] = {}
+        # page_id -> そのページを指す全キー（put の追加キーを含む）
+        self._page_keys: Dict[str, set] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _aliases(self, page: Dict[str, Any]) -> list[str]:
+        props = page.get("properties", {})
+        keys = [_plain_text(props.get("id")), _plain_text(props.get("name"))]
+        return [k for k in keys if k]
+
+    def _drop(self, page_id: str) -> None:
+        self._entries.pop(page_id, None)
+        for key in self._page_keys.pop(page_id, ()):
+            if self._keys.get(key) == page_id:
+                del self._keys[key]
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """商品ID または商品名でキャッシュを参照する"""
+        with self._lock:
+            page_id = self._keys.get(key)
+            if page_id is None:
+                self.misses += 1
+                return None
+            entry = self._entries.get(page_id)
+            if entry is None:
+                # 追い出し済みページを指す古いキー
+                del self._keys[key]
+                self.misses += 1
+                return None
+            stored_at, page = entry
+            if time.monotonic() - stored_at > self.ttl:
+                self._drop(page_id)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(page_id)
+            self.hits += 1
+            return copy.deepcopy(page)
+
+    def put(self, page: Dict[str, Any], *keys: str) -> None:
+        """商品ページを保存し、プロパティ id/name と追加キーで参照可能にする"""
+        page_id = page.get("id")
+        if not page_id:
+            return
+        with self._lock:
+            if page_id in self._entries:
+                self._drop(page_id)
+            self._entries[page_id] = (time.monotonic(), copy.deepcopy(page))
+            page_keys = self._page_keys.setdefault(page_id, set())
+            for key in (*self._aliases(page), *keys):
+                if key:
+                    previous = self._keys.get(key)
+                    if previous is not None and previous != page_id:
+                        self._page_keys.get(previous, set()).discard(key)
+                    self._keys[key] = page_id
+                    page_keys.add(key)
+            while len(self._entries) > self.max_size:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def update_stock(self, page_id: str, new_stock: int) -> None:
+        """在庫更新をキャッシュへ書き込む（ライトスルー）"""
+        with self._lock:
+            entry = self._entries.get(page_id)
+            if entry is None:
+                return
+            stored_at, page = entry
+            props = dict(page.get("properties", {}))
+            props["stock"] = {**props.get("stock", {}), "number": new_stock}
+            self._entries[page_id] = (stored_at, {**page, "properties": props})
+
+    def invalidate(self, page_id: Optional[str] = None) -> None:
+        """指定ページ、または全エントリを破棄する"""
+        with self._lock:
+            if page_id is None:
+                self._entries.clear()
+                self._keys.clear()
+                self._page_keys.clear()
+            elif page_id in self._entries:
+                self._drop(page_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """ヒット/ミス/追い出し件数を返す"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "size": len(self._entries),
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_default_cache: Optional[ProductCache] = None
+_default_lock = threading.Lock()
+
+
+def get_default_product_cache() -> Optional[ProductCache]:
+    """
+    環境変数 NOTION_PRODUCT_CACHE_TTL（秒）が正の場合にプロセス共有のキャッシュを返す。
+    未設定時はキャッシュ無効（None）。件数上限は NOTION_PRODUCT_CACHE_SIZE。
+    """
+    global _default_cache
+    ttl = float(os.getenv("NOTION_PRODUCT_CACHE_TTL", "0") or 0)
+    if ttl <= 0:
+        return None
+    with _default_lock:
+        if _default_cache is None:
+            size = int(os.getenv("NOTION_PRODUCT_CACHE_SIZE", "1024"))
+            _default_cache = ProductCache(ttl=ttl, max_size=size)
+        return _default_cache
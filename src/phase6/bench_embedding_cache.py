@@ -0,0 +1,117 @@
+"""
+Phase6: 埋め込みキャッシュによるインデックス再構築・検索の効果を計測するベンチマーク
+
+Embedding API を模した埋め込み器（1リクエストごとに --latency 秒待つ）を使い、
+キャッシュなし / 初回構築 / 全件キャッシュ済みの再構築（新しいプロセスを想定してメモリLRUは空）/
+一部の文書だけ変更した再構築、の所要時間と API リクエスト数を比較する。
+最後に、同じ顧客名・商品名が繰り返し問い合わせられる検索のヒット率を表示する。
+
+    python -m src.phase6.bench_embedding_cache --docs 20000 --changed 0.1
+"""
+import argparse
+import hashlib
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+
+from src.phase6.embedding_cache import CachedEmbedder
+from src.phase6.vector_store import VectorStore
+
+
+class SimulatedEmbedder:
+    """テキストのハッシュから決定的なベクトルを作り、API と同じくバッチごとに待つ"""
+
+    model = "simulated-embedding"
+
+    def __init__(self, dim: int, latency: float, batch_size: int = 512):
+        self.dim = dim
+        self.latency = latency
+        self.batch_size = batch_size
+        self.requests = 0
+
+    def _vector(self, text: str) -> np.ndarray:
+        seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+        return np.random.default_rng(seed).standard_normal(self.dim, dtype=np.float32)
+
+    def embed_texts(self, texts: list) -> list:
+        out = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = texts[start : start + self.batch_size]  # noqa: E203
+            self.requests += 1
+            time.sleep(self.latency)
+            out += [self._vector(t) for t in batch]
+        return out
+
+    def embed_text(self, text: str) -> np.ndarray:
+        return self.embed_texts([text])[0]
+
+
+def timed_build(embedder, docs: list) -> float:
+    start = time.perf_counter()
+    VectorStore(embedder).build(docs)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--latency", type=float, default=0.3, help="1リクエストの秒数")
+    parser.add_argument("--changed", type=float, default=0.1, help="変更する文書の割合")
+    parser.add_argument("--queries", type=int, default=5000)
+    args = parser.parse_args()
+
+    docs = [f"商品{i:06d} サンプル商品 {i % 97}色" for i in range(args.docs)]
+    rng = random.Random(0)
+    changed = list(docs)
+    for i in rng.sample(range(args.docs), int(args.docs * args.changed)):
+        changed[i] += " (改訂)"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "embeddings.sqlite")
+        rows = []
+
+        api = SimulatedEmbedder(args.dim, args.latency)
+        rows.append(("no cache", timed_build(api, docs), api.requests, None))
+
+        def cached_build(name: str, corpus: list) -> None:
+            api = SimulatedEmbedder(args.dim, args.latency)
+            cache = CachedEmbedder(api, path)
+            seconds = timed_build(cache, corpus)
+            rows.append((name, seconds, api.requests, cache.stats()["hit_rate"]))
+            cache.close()
+
+        cached_build("cold cache", docs)
+        cached_build("warm rebuild", docs)
+        cached_build(f"{args.changed:.0%} changed", changed)
+
+        print(f"docs: {args.docs}  dim: {args.dim}  latency: {args.latency}s/request")
+        print(f"{'build':>14} {'seconds':>9} {'requests':>9} {'hit rate':>9}")
+        for name, seconds, requests, hit_rate in rows:
+            rate = "-" if hit_rate is None else f"{hit_rate:.1%}"
+            print(f"{name:>14} {seconds:>9.2f} {requests:>9} {rate:>9}")
+
+        # 毎週同じ顧客・商品名で問い合わせる想定（Zipf 分布の表記ゆれ 500 種）
+        names = [f"ヤマダ商店 {i}" for i in range(500)]
+        weights = [1 / (i + 1) for i in range(len(names))]
+        stream = rng.choices(names, weights=weights, k=args.queries)
+        api = SimulatedEmbedder(args.dim, args.latency / 10)
+        cache = CachedEmbedder(api, path, memory_size=256)
+        start = time.perf_counter()
+        for q in stream:
+            cache.embed_text(q)
+        elapsed = time.perf_counter() - start
+        stats = cache.stats()
+        print(
+            f"queries: {args.queries}  hit rate {stats['hit_rate']:.1%}"
+            f" (memory {stats['memory_hits']}, disk {stats['disk_hits']})"
+            f"  API requests {api.requests}  {elapsed / args.queries * 1000:.2f} ms/query"
+        )
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Phase6: RAG インデックスの起動時間を形式ごとに比較するベンチマーク
+
+ランダムな埋め込みで VectorStore を構築し、従来の pickle とディレクトリ形式
+（np.memmap / FAISS mmap）で保存する。形式ごとに新しいプロセスを起動して、
+読み込み時間・最初の検索時間・読み込み直後と検索後の RSS を計測する。
+
+    python -m src.phase6.bench_index_startup --docs 100000 --dim 1536
+"""
+import argparse
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+FORMATS = ("pickle", "mmap-faiss", "mmap-numpy")
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def child(fmt: str, path: str, dim: int) -> None:
+    """子プロセス: インデックスを読み込んで1回検索し、計測値を JSON で出力する"""
+    from src.phase6.index_store import load_vector_store
+
+    base = _rss_mb()
+    start = time.perf_counter()
+    if fmt == "pickle":
+        with open(path, "rb") as f:
+            store = pickle.load(f)
+    else:
+        store = load_vector_store(path, use_faiss=fmt == "mmap-faiss")
+    loaded = time.perf_counter() - start
+    rss_loaded = _rss_mb() - base
+    query = np.random.default_rng(1).standard_normal((1, dim), dtype=np.float32)
+    start = time.perf_counter()
+    store.search_vectors(query, 5)
+    first_query = time.perf_counter() - start
+    print(
+        json.dumps(
+            {
+                "load": loaded,
+                "first_query": first_query,
+                "rss_loaded": rss_loaded,
+                "rss_query": _rss_mb() - base,
+            }
+        )
+    )
+
+
+def run_child(fmt: str, path: str, dim: int) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-m", __spec__.name, "--child", fmt, path, "--dim", str(dim)],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--child", nargs=2, metavar=("FORMAT", "PATH"))
+    args = parser.parse_args()
+    if args.child:
+        child(args.child[0], args.child[1], args.dim)
+        return
+
+    from src.phase6.bench_vector_search import _PrecomputedEmbedder
+    from src.phase6.index_store import save_vector_store
+    from src.phase6.vector_store import VectorStore
+
+    rng = np.random.default_rng(0)
+    matrix = rng.standard_normal((args.docs, args.dim), dtype=np.float32)
+    store = VectorStore(_PrecomputedEmbedder(matrix))
+    store.build([f"商品{i:07d} サンプル商品名" for i in range(args.docs)])
+    store.embedder = None
+    del matrix
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = {
+            "pickle": os.path.join(tmp, "rag_index.pkl"),
+            "mmap-faiss": os.path.join(tmp, "rag_index"),
+        }
+        paths["mmap-numpy"] = paths["mmap-faiss"]
+        with open(paths["pickle"], "wb") as f:
+            pickle.dump(store, f)
+        save_vector_store(store, paths["mmap-faiss"])
+        del store
+
+        size_mb = args.docs * args.dim * 4 / 1e6
+        print(f"docs: {args.docs}  dim: {args.dim}  embeddings: {size_mb:.0f} MB")
+        print(
+            f"{'format':>11} {'load[ms]':>10} {'1st query[ms]':>14}"
+            f" {'RSS load[MB]':>13} {'RSS query[MB]':>14}"
+        )
+        for fmt in FORMATS:
+            r = run_child(fmt, paths[fmt], args.dim)
+            print(
+                f"{fmt:>11} {r['load'] * 1000:>10.1f} {r['first_query'] * 1000:>14.1f}"
+                f" {r['rss_loaded']:>13.1f} {r['rss_query']:>14.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
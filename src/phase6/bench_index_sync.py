@@ -0,0 +1,100 @@
+"""
+Phase6: RAG インデックスの全件再構築と Notion 差分同期（MasterIndexSync）の時間を比較するベンチマーク
+
+Notion を模したメモリ上のマスタ（商品 --products 件、顧客はその1/10）と、Embedding API を模した
+埋め込み器（1リクエスト --latency 秒）を使い、--changed 件の新規顧客・商品名変更があったときの
+全件再構築（build_rag_index 相当）と差分同期の所要時間・埋め込み件数を比較する。
+
+    python -m src.phase6.bench_index_sync --products 20000 --changed 20
+"""
+import argparse
+import time
+from datetime import datetime, timezone
+
+from src.phase6.bench_embedding_cache import SimulatedEmbedder
+from src.phase6.index_sync import SYNC_SOURCES, MasterIndexSync
+from src.phase6.master_index import MasterIndex
+
+
+class InMemoryNotion:
+    """list_changed_pages を提供するメモリ上の商品・顧客DB"""
+
+    database_id_products = "products"
+    database_id_customers = "customers"
+
+    def __init__(self):
+        self.pages = {"products": {}, "customers": {}}
+
+    def put(self, database_id: str, page_id: str, props: dict) -> None:
+        self.pages[database_id][page_id] = {
+            "id": page_id,
+            "properties": {
+                k: {"rich_text": [{"plain_text": v}]} for k, v in props.items()
+            },
+            "edited": datetime.now(timezone.utc).isoformat(),
+        }
+
+    def list_changed_pages(self, database_id, date_property, since=None):
+        pages = self.pages[database_id].values()
+        return [p for p in pages if since is None or p["edited"] >= since]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--changed", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.3, help="1リクエストの秒数")
+    parser.add_argument("--dim", type=int, default=256)
+    args = parser.parse_args()
+
+    notion = InMemoryNotion()
+    for i in range(args.products):
+        notion.put("products", f"p{i}", {"id": f"P{i:05d}", "name": f"サンプル商品{i}"})
+    for i in range(args.products // 10):
+        notion.put("customers", f"c{i}", {"customer_name": f"顧客{i}商店"})
+
+    api = SimulatedEmbedder(args.dim, args.latency)
+    index = MasterIndex({}, api)
+    syncer = MasterIndexSync(index, notion, full_every=1000)
+    syncer.sync()
+
+    for i in range(args.changed):
+        if i % 2:
+            notion.put("customers", f"new{i}", {"customer_name": f"新規顧客{i}"})
+        else:
+            notion.put("products", f"p{i}", {"id": f"P{i:05d}", "name": f"改名商品{i}"})
+
+    entries = {}
+    for kind, (db_attr, _, entry) in SYNC_SOURCES.items():
+        pages = notion.list_changed_pages(getattr(notion, db_attr), None)
+        entries[kind] = [e for e in map(entry, pages) if e]
+    api.requests = 0
+    start = time.perf_counter()
+    MasterIndex.build(entries, api)
+    rebuild = (
+        time.perf_counter() - start,
+        api.requests,
+        sum(map(len, entries.values())),
+    )
+
+    api.requests = 0
+    start = time.perf_counter()
+    result = syncer.sync()
+    embedded = sum(result[k]["added"] + result[k]["updated"] for k in SYNC_SOURCES)
+    incremental = (time.perf_counter() - start, api.requests, embedded)
+
+    total = sum(map(len, entries.values()))
+    print(
+        f"entries: {total}  changed: {args.changed}  latency: {args.latency}s/request"
+    )
+    print(f"{'mode':>12} {'seconds':>9} {'requests':>9} {'embedded':>9}")
+    for name, (seconds, requests, count) in (
+        ("full rebuild", rebuild),
+        ("incremental", incremental),
+    ):
+        print(f"{name:>12} {seconds:>9.2f} {requests:>9} {count:>9}")
+    print(f"new customer searchable: {index.query('新規顧客1', kind='customer')}")
+
+
+if __name__ == "__main__":
+    main()
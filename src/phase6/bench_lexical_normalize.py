@@ -0,0 +1,112 @@
+"""
+Phase6: 商品名正規化の字句索引（exact / fuzzy）の処理時間と段階別の割合を計測するベンチマーク
+
+合成した商品マスタ（商品ID + 商品名 + 別名）に対し、ID そのまま・全角/大文字小文字/空白の揺れ・
+別名・1文字の誤字・マスタにない名前を混ぜた問い合わせを LexicalIndex.lookup で処理する。
+該当なしの問い合わせはベクトル検索 + LLM（--rag-ms ミリ秒と仮定）に回るものとして、
+全件を RAG で処理した場合との推定所要時間を比較する。
+
+    python -m src.phase6.bench_lexical_normalize --products 5000 --queries 20000
+"""
+import argparse
+import random
+import time
+from collections import Counter
+
+from src.phase6.lexical_index import LexicalIndex
+
+_KANA = "アイウエオカキクケコサシスセソタチツテトナニヌネノハヒフヘホマミムメモラリルレロ"
+_KINDS = ("id", "variant", "alias", "typo", "unknown")
+
+
+def _word(rng: random.Random, n: int) -> str:
+    return "".join(rng.choice(_KANA) for _ in range(n))
+
+
+def _to_fullwidth(text: str) -> str:
+    return "".join(chr(ord(c) + 0xFEE0) if "!" <= c <= "~" else c for c in text.upper())
+
+
+def _typo(rng: random.Random, text: str) -> str:
+    i = rng.randrange(len(text))
+    return text[:i] + rng.choice(_KANA) + text[i + 1 :]  # noqa: E203
+
+
+def make_master(rng: random.Random, size: int) -> list:
+    return [
+        (f"P{i:05d}", f"{_word(rng, 6)}シリーズ{i % 50}", _word(rng, 5))
+        for i in range(size)
+    ]
+
+
+def make_queries(rng: random.Random, master: list, size: int) -> list:
+    weights = (0.4, 0.2, 0.15, 0.15, 0.1)
+    queries = []
+    for kind in rng.choices(_KINDS, weights=weights, k=size):
+        pid, name, alias = rng.choice(master)
+        text = {
+            "id": pid,
+            "variant": _to_fullwidth(f"{pid[0]}-{pid[1:]}").lower(),
+            "alias": f" {alias} ",
+            "typo": _typo(rng, name),
+            "unknown": _word(rng, 8),
+        }[kind]
+        queries.append((kind, text, None if kind == "unknown" else pid))
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=20000)
+    parser.add_argument("--threshold", type=float, default=0.85)
+    parser.add_argument("--rag-ms", type=float, default=800.0, help="RAG 1件の時間")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    master = make_master(rng, args.products)
+    start = time.perf_counter()
+    index = LexicalIndex(
+        ((pid, [name, alias]) for pid, name, alias in master),
+        threshold=args.threshold,
+    )
+    build_ms = (time.perf_counter() - start) * 1000
+    queries = make_queries(rng, master, args.queries)
+
+    tiers: Counter = Counter()
+    seconds: Counter = Counter()
+    by_kind: Counter = Counter()
+    wrong = 0
+    for kind, text, expected in queries:
+        start = time.perf_counter()
+        match = index.lookup(text)
+        elapsed = time.perf_counter() - start
+        tier = match.tier if match else "rag"
+        tiers[tier] += 1
+        seconds[tier] += elapsed
+        by_kind[kind, tier] += 1
+        if match and match.value != expected:
+            wrong += 1
+    lexical_s = sum(seconds.values())
+
+    n = len(queries)
+    print(
+        f"products: {args.products} ({len(index)} keys, built in {build_ms:.0f} ms)"
+        f"  queries: {n}"
+    )
+    print(f"lexical lookup: {lexical_s / n * 1e6:.1f} us/query  wrong matches: {wrong}")
+    print(f"{'tier':>6} {'share':>7} {'us/lookup':>10}  queries by kind")
+    for tier in ("exact", "fuzzy", "rag"):
+        per_kind = " ".join(f"{k}={by_kind[k, tier]}" for k in _KINDS)
+        us = seconds[tier] / max(tiers[tier], 1) * 1e6
+        print(f"{tier:>6} {tiers[tier] / n:>7.1%} {us:>10.1f}  {per_kind}")
+    rag_only = n * args.rag_ms / 1000
+    with_fast_path = lexical_s + tiers["rag"] * args.rag_ms / 1000
+    print(
+        f"estimated time: RAG only {rag_only:.0f} s -> with fast path"
+        f" {with_fast_path:.0f} s ({rag_only / with_fast_path:.1f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Phase6: マスタのインデックス構成ごとの検索精度と LLM プロンプトサイズを比較するベンチマーク
+
+合成した商品マスタ（1行「商品ID: 商品名, 別名」）と顧客マスタを、API を使わない
+文字 bigram のハッシュ埋め込みで索引し、誤字・部分一致の問い合わせで次を比較する。
+- legacy: ファイル全体を1文書にした従来の索引（検索結果は常にマスタ全体）
+- per-entry: MasterIndex（1行1エントリ、商品/顧客の名前空間で絞り込み）
+recall@k は正解エントリが検索結果（= プロンプトの候補）に含まれる割合、
+tokens は correct_product_name のプロンプトの推定トークン数（legacy は数万件で
+モデルのコンテキスト長を超えるため、recall 1.0 でも実際には送れない）。
+
+    python -m src.phase6.bench_master_retrieval --sizes 1000 10000 50000
+"""
+import argparse
+import random
+import time
+import zlib
+
+import numpy as np
+
+from src.phase2.prompt_window import estimate_tokens
+from src.phase6.master_index import MasterIndex
+
+_KANA = "アイウエオカキクケコサシスセソタチツテトナニヌネノハヒフヘホマミムメモヤユヨラリルレロワン"
+_CATEGORIES = ("ケーブル", "マウス", "モニター", "キーボード", "プリンター", "ノート")
+_TEMPLATE = (
+    "以下の商品マスタ辞書を参考に、ユーザー入力の商品名を正規化してください。\n"
+    "商品リスト:\n{docs}\nユーザー入力: {query}\n正規化された商品IDを返してください。"
+)
+
+
+class HashingEmbedder:
+    """文字 bigram をハッシュで dim 次元に畳み込み、L2 正規化した埋め込み"""
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def embed_texts(self, texts: list) -> list:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            padded = f"^{text}$"
+            for i in range(len(padded) - 1):
+                out[row, zlib.crc32(padded[i : i + 2].encode()) % self.dim] += 1  # noqa
+        out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-6)
+        return list(out)
+
+    def embed_text(self, text: str) -> np.ndarray:
+        return self.embed_texts([text])[0]
+
+
+def _word(rng: random.Random, n: int) -> str:
+    return "".join(rng.choice(_KANA) for _ in range(n))
+
+
+def make_products(rng: random.Random, size: int) -> list:
+    return [
+        (f"P{i:05d}", f"{_word(rng, 4)}{rng.choice(_CATEGORIES)}", _word(rng, 5))
+        for i in range(size)
+    ]
+
+
+def make_query(rng: random.Random, name: str) -> str:
+    """誤字1文字、または末尾の欠けた商品名"""
+    if rng.random() < 0.5:
+        i = rng.randrange(len(name))
+        return name[:i] + rng.choice(_KANA) + name[i + 1 :]  # noqa: E203
+    return name[: max(3, len(name) - 2)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--dim", type=int, default=1024)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    embedder = HashingEmbedder(args.dim)
+    print(
+        f"{'entries':>8} {'index':>9} {'recall@1':>9} {'recall@k':>9}"
+        f" {'tokens':>9} {'ms/query':>9}"
+    )
+    for size in args.sizes:
+        products = make_products(rng, size)
+        lines = [f"{pid}: {name}, {alias}" for pid, name, alias in products]
+        customers = [f"{_word(rng, 4)}商店: {_word(rng, 4)}" for _ in range(size // 10)]
+        sample = rng.sample(range(size), min(args.queries, size))
+        queries = [make_query(rng, products[i][1]) for i in sample]
+
+        # 従来: 商品マスタ全体が1文書なので、候補は常にマスタ全体
+        legacy_prompt = _TEMPLATE.format(
+            docs="\n".join(["\n".join(lines), "\n".join(customers)]), query=queries[0]
+        )
+        print(
+            f"{size:>8} {'legacy':>9} {1.0:>9.3f} {1.0:>9.3f}"
+            f" {estimate_tokens(legacy_prompt):>9} {'-':>9}"
+        )
+
+        index = MasterIndex.build({"product": lines, "customer": customers}, embedder)
+        start = time.perf_counter()
+        results = index.query_many(
+            queries, top_k=args.top_k, kinds=["product"] * len(queries)
+        )
+        ms = (time.perf_counter() - start) / len(queries) * 1000
+        hit1 = hitk = tokens = 0
+        for i, query, docs in zip(sample, queries, results):
+            expected = lines[i]
+            hit1 += docs[:1] == [expected]
+            hitk += expected in docs
+            tokens += estimate_tokens(
+                _TEMPLATE.format(docs="\n".join(docs), query=query)
+            )
+        n = len(queries)
+        print(
+            f"{size:>8} {'per-entry':>9} {hit1 / n:>9.3f} {hitk / n:>9.3f}"
+            f" {tokens // n:>9} {ms:>9.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
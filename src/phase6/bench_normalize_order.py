@@ -0,0 +1,107 @@
+"""
+Phase6: 注文単位の正規化（normalize_order）と明細ごとの正規化の往復回数・所要時間を比較するベンチマーク
+
+Embedding API（1リクエスト --embed-ms）と ChatCompletion（1回 --llm-ms）を模した待ち時間を入れ、
+N 明細の注文を次の2通りで正規化する（字句索引は使わず、全件を RAG 経路で処理する）。
+- per-item: 明細ごとの correct_product_name + correct_customer_name（従来の使い方）
+- batched: normalize_order（埋め込み・検索・LLM をそれぞれ1回）
+
+    python -m src.phase6.bench_normalize_order --items 1 5 20
+"""
+import argparse
+import json
+import os
+import re
+import time
+from datetime import date
+from types import SimpleNamespace
+
+import numpy as np
+import openai
+
+from src.phase2.transform import OrderData
+from src.phase6.rag_pipeline import RAGPipeline
+from src.phase6.vector_store import VectorStore
+
+
+class SimulatedAPI:
+    """埋め込み器と ChatCompletion.create の代わり。呼び出し回数を数える"""
+
+    def __init__(self, embed_ms: float, llm_ms: float, dim: int = 64):
+        self.embed_ms = embed_ms
+        self.llm_ms = llm_ms
+        self.dim = dim
+        self.embed_requests = 0
+        self.llm_requests = 0
+
+    def embed_texts(self, texts: list) -> list:
+        self.embed_requests += 1
+        time.sleep(self.embed_ms / 1000)
+        return [
+            np.random.default_rng(abs(hash(t)) % (1 << 32)).standard_normal(self.dim)
+            for t in texts
+        ]
+
+    def embed_text(self, text: str) -> list:
+        return self.embed_texts([text])[0]
+
+    def create(self, model: str, messages: list) -> SimpleNamespace:
+        self.llm_requests += 1
+        time.sleep(self.llm_ms / 1000)
+        prompt = messages[0]["content"]
+        ids = [int(i) for i in re.findall(r'"id": (\d+)', prompt)]
+        content = json.dumps([{"id": i, "normalized": f"N{i}"} for i in ids])
+        if not ids:
+            content = "P001"
+        message = SimpleNamespace(content=content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def run(rag: RAGPipeline, api: SimulatedAPI, orders: list, batched: bool) -> tuple:
+    api.embed_requests = api.llm_requests = 0
+    start = time.perf_counter()
+    if batched:
+        rag.normalize_order(orders)
+    else:
+        for o in orders:
+            rag.correct_product_name(o.product_id)
+            rag.correct_customer_name(o.customer_name)
+    seconds = time.perf_counter() - start
+    return seconds, api.embed_requests, api.llm_requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--embed-ms", type=float, default=150.0)
+    parser.add_argument("--llm-ms", type=float, default=800.0)
+    parser.add_argument("--docs", type=int, default=2000)
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+    api = SimulatedAPI(args.embed_ms, args.llm_ms)
+    openai.ChatCompletion.create = api.create
+    store = VectorStore(api)
+    store.build([f"P{i:05d}: サンプル商品{i}" for i in range(args.docs)])
+    rag = RAGPipeline(store)
+
+    print(
+        f"{'items':>5} {'mode':>9} {'seconds':>8} {'embed req':>10}"
+        f" {'LLM req':>8} {'speedup':>8}"
+    )
+    for n in args.items:
+        orders = [
+            OrderData("ヤマダ商店", f"商品名{i}", i + 1, date(2024, 1, 1)) for i in range(n)
+        ]
+        base = None
+        for mode in ("per-item", "batched"):
+            seconds, embeds, llms = run(rag, api, orders, mode == "batched")
+            base = base or seconds
+            print(
+                f"{n:>5} {mode:>9} {seconds:>8.2f} {embeds:>10} {llms:>8}"
+                f" {base / seconds:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
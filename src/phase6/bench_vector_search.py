@@ -0,0 +1,107 @@
+"""
+Phase6: VectorStore の総当たり検索と FAISS IndexFlatL2 の検索時間を比較するベンチマーク
+
+文書数ごとにランダムな埋め込み行列を作り、次の方式で1クエリあたりの時間を計測する。
+- legacy: 行ベクトルのリストに対する Python ループ + argsort（従来の実装）
+- numpy: 行列演算 + argpartition（1クエリずつ）
+- numpy-batch: query_many と同じく全クエリを1回の行列積で検索
+- faiss / faiss-batch: IndexFlatL2（faiss がインストールされている場合）
+上位 top_k が FAISS の結果と一致する割合（recall）も表示する。
+speedup は各文書数の先頭行（legacy、計測対象外の規模では numpy）に対する比。
+
+    python -m src.phase6.bench_vector_search --sizes 10000 100000 1000000 --dim 128
+"""
+import argparse
+import time
+from typing import Any, Callable
+
+import numpy as np
+
+from src.phase6.vector_store import VectorStore, faiss
+
+
+class _PrecomputedEmbedder:
+    """生成済みの行列をそのまま埋め込みとして返す"""
+
+    def __init__(self, matrix: np.ndarray):
+        self.matrix = matrix
+
+    def iter_embeddings(self, docs: Any) -> Any:
+        yield 0, self.matrix
+
+
+def legacy_search(rows: list, query: np.ndarray, top_k: int) -> np.ndarray:
+    dists = [np.linalg.norm(query - emb) for emb in rows]
+    return np.argsort(dists)[:top_k]
+
+
+def per_query(func: Callable[[np.ndarray], Any], queries: np.ndarray) -> float:
+    start = time.perf_counter()
+    for q in queries:
+        func(q)
+    return (time.perf_counter() - start) / len(queries)
+
+
+def batched(func: Callable[[np.ndarray], Any], queries: np.ndarray) -> float:
+    start = time.perf_counter()
+    func(queries)
+    return (time.perf_counter() - start) / len(queries)
+
+
+def recall(found: np.ndarray, expected: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(e)) for f, e in zip(found, expected))
+    return hits / expected.size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument(
+        "--legacy-max", type=int, default=100000, help="legacy を計測する最大文書数"
+    )
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'docs':>9} {'method':>12} {'ms/query':>10} {'speedup':>8} {'recall':>7}")
+    for size in args.sizes:
+        matrix = rng.standard_normal((size, args.dim), dtype=np.float32)
+        queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+        store = VectorStore(_PrecomputedEmbedder(matrix))
+        store.build([""] * size)
+        index, store.index = store.index, None
+
+        expected = store.search_vectors(queries, args.top_k)[1]
+        if index is not None:
+            expected = index.search(queries, args.top_k)[1]
+
+        results = []
+        if size <= args.legacy_max:
+            rows = list(matrix)
+            n = max(1, min(args.queries, 5))
+            t = per_query(lambda q: legacy_search(rows, q, args.top_k), queries[:n])
+            found = [legacy_search(rows, q, args.top_k) for q in queries[:n]]
+            results.append(("legacy", t, recall(found, expected[:n])))
+        t = per_query(lambda q: store.search_vectors(q, args.top_k), queries)
+        found = np.vstack([store.search_vectors(q, args.top_k)[1] for q in queries])
+        results.append(("numpy", t, recall(found, expected)))
+        t = batched(lambda q: store.search_vectors(q, args.top_k), queries)
+        found = store.search_vectors(queries, args.top_k)[1]
+        results.append(("numpy-batch", t, recall(found, expected)))
+        if index is not None:
+            t = per_query(lambda q: index.search(q[None, :], args.top_k), queries)
+            results.append(("faiss", t, 1.0))
+            t = batched(lambda q: index.search(q, args.top_k), queries)
+            results.append(("faiss-batch", t, 1.0))
+
+        base = results[0][1]
+        for name, t, r in results:
+            print(f"{size:>9} {name:>12} {t * 1000:>10.3f} {base / t:>7.1f}x {r:>7.3f}")
+    if faiss is None:
+        print("faiss is not installed; skipped IndexFlatL2")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,10 @@
 """Phase6: 辞書ファイルをベクトル化して Faiss インデックスを構築・保存するスクリプト"""
 import os
-import pickle
 
 from src.phase6.embedding import OpenAIEmbedder
-from src.phase6.vector_store import VectorStore
+from src.phase6.embedding_cache import create_cached_embedder
+from src.phase6.master_index import MASTER_FILES, MasterIndex, master_entries
+from src.phase6.vector_store import log_progress
 
 
 def load_docs(path: str) -> list[str]:
@@ -16,22 +17,22 @@ def load_docs(path: str) -> list[str]:
 
 
 def main():
-    # 辞書ファイルとして products.md と customers.md を想定
-    docs = []
-    for fname in ("products.md", "customers.md"):
-        entries = load_docs(fname)
-        docs.append("\n".join(entries))
-
-    embedder = OpenAIEmbedder()
-    vs = VectorStore(embedder)
-    vs.build(docs)
-    # Drop embedder before pickling (stub embedder may not be picklable)
-    vs.embedder = None
-
-    out_path = os.getenv("RAG_INDEX_PATH", "rag_index.pkl")
-    with open(out_path, "wb") as f:
-        pickle.dump(vs, f)
-    print(f"RAG index saved to {out_path}")
+    # 辞書ファイル products.md / customers.md の1行を1エントリとして、名前空間ごとに索引する
+    entries = {
+        kind: master_entries(load_docs(fname)) for kind, fname in MASTER_FILES.items()
+    }
+
+    # EMBEDDING_CACHE_PATH が設定されていれば、変更のない文書は API を呼ばずに再構築する
+    embedder = create_cached_embedder(OpenAIEmbedder())
+    index = MasterIndex.build(entries, embedder, progress=log_progress)
+
+    # メモリマップで読み込めるディレクトリ形式で保存（MasterIndex.load で復元）
+    out_path = os.getenv("RAG_INDEX_PATH", "rag_index")
+    index.save(out_path)
+    counts = ", ".join(f"{len(v)} {k}" for k, v in entries.items())
+    print(f"RAG index saved to {out_path} ({counts} entries)")
+    if hasattr(embedder, "stats"):
+        print(f"Embedding cache: {embedder.stats()}")
 
 
 if __name__ == "__main__":
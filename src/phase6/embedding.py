@@ -1,19 +1,88 @@
 """Phase6: OpenAI Embedding API のラッパー"""
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterator, List, Sequence, Tuple
 
 import openai
 
+# 1リクエストに含める入力数（API上限は2048）と、1リクエストの入力量の上限。
+# 入力量は文字数で概算する（日本語は1文字≒1トークン以上になるため安全側）
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "512"))
+EMBEDDING_MAX_BATCH_TOKENS = int(os.getenv("EMBEDDING_MAX_BATCH_TOKENS", "200000"))
+# 並行に送るバッチ数
+EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", "4"))
+
 
 class OpenAIEmbedder:
     """OpenAI Embedding API を使ってテキストをベクトルに変換するラッパー"""
 
-    def __init__(self, model: str = "text-embedding-ada-002"):
+    def __init__(
+        self,
+        model: str = "text-embedding-ada-002",
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        max_batch_tokens: int = EMBEDDING_MAX_BATCH_TOKENS,
+        max_workers: int = EMBEDDING_WORKERS,
+    ):
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
             raise ValueError("Missing OPENAI_API_KEY environment variable")
         openai.api_key = api_key
         self.model = model
+        self.batch_size = max(1, min(batch_size, 2048))
+        self.max_batch_tokens = max_batch_tokens
+        self.max_workers = max(1, max_workers)
 
     def embed_text(self, text: str) -> list[float]:
         resp = openai.Embedding.create(model=self.model, input=text)
         return resp["data"][0]["embedding"]
+
+    def _batches(self, texts: Sequence[str]) -> Iterator[Tuple[int, List[str]]]:
+        """入力数と入力量の上限ごとに (先頭位置, テキスト列) に分割する"""
+        start = 0
+        batch: List[str] = []
+        size = 0
+        for i, text in enumerate(texts):
+            # 空文字は API がエラーにするため空白に置き換える
+            text = text or " "
+            if batch and (
+                len(batch) >= self.batch_size
+                or size + len(text) > self.max_batch_tokens
+            ):
+                yield start, batch
+                start, batch, size = i, [], 0
+            batch.append(text)
+            size += len(text)
+        if batch:
+            yield start, batch
+
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        resp = openai.Embedding.create(model=self.model, input=batch)
+        # 応答の並びは保証されないため index で並べ直す
+        data = sorted(resp["data"], key=lambda d: d["index"])
+        return [d["embedding"] for d in data]
+
+    def iter_embeddings(
+        self, texts: Sequence[str]
+    ) -> Iterator[Tuple[int, List[List[float]]]]:
+        """
+        バッチ単位で埋め込みを取得し、(先頭位置, ベクトル列) を完了した順に返す。
+        複数バッチは max_workers 並列で送信する。
+        """
+        batches = list(self._batches(texts))
+        if len(batches) <= 1 or self.max_workers <= 1:
+            for start, batch in batches:
+                yield start, self._embed_batch(batch)
+            return
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {
+                pool.submit(self._embed_batch, batch): start for start, batch in batches
+            }
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
+    def embed_texts(self, texts: Sequence[str]) -> List[List[float]]:
+        """複数テキストをまとめて埋め込む（戻り値は入力順）"""
+        out: List[List[float]] = [[] for _ in texts]
+        for start, vectors in self.iter_embeddings(texts):
+            out[start : start + len(vectors)] = vectors  # noqa: E203
+        return out
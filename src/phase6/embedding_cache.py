@@ -0,0 +1,176 @@
+"""Phase6: 埋め込みベクトルの永続キャッシュ（SQLite + メモリ上のLRU）"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# iter_embeddings で1回に処理する件数（この単位で進捗を報告する）
+CACHE_CHUNK_SIZE = 4096
+# SQLite の IN 句に一度に渡すキー数
+_LOOKUP_CHUNK = 500
+
+
+class CachedEmbedder:
+    """
+    埋め込み器をラップし、(モデル名, テキスト) の SHA-256 をキーに float32 ベクトルを
+    SQLite に保存する。直近に使ったベクトルはメモリ上の LRU からも返す。
+    embed_text / embed_texts / iter_embeddings を提供し、VectorStore にそのまま渡せる。
+    """
+
+    def __init__(
+        self,
+        embedder: Any,
+        path: str = ":memory:",
+        memory_size: int = 4096,
+        model: Optional[str] = None,
+    ):
+        self.embedder = embedder
+        self.model = model or getattr(embedder, "model", type(embedder).__name__)
+        self.memory_size = memory_size
+        self._memory: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embedding_cache ("
+            " key BLOB PRIMARY KEY, model TEXT NOT NULL, dim INTEGER NOT NULL,"
+            " vector BLOB NOT NULL, created_at REAL NOT NULL) WITHOUT ROWID"
+        )
+        self._conn.commit()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def key_for(self, text: str) -> bytes:
+        return hashlib.sha256(f"{self.model}\0{text}".encode()).digest()
+
+    def _remember(self, key: bytes, vector: np.ndarray) -> None:
+        if self.memory_size <= 0:
+            return
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _lookup(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+        """メモリ → SQLite の順に探し、見つかったベクトルを返す"""
+        found: Dict[bytes, np.ndarray] = {}
+        with self._lock:
+            rest = []
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+                else:
+                    rest.append(key)
+            self.memory_hits += len(found)
+            for start in range(0, len(rest), _LOOKUP_CHUNK):
+                chunk = rest[start : start + _LOOKUP_CHUNK]  # noqa: E203
+                rows = self._conn.execute(
+                    "SELECT key, vector FROM embedding_cache WHERE key IN"
+                    f" ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                for key, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    found[key] = vector
+                    self._remember(key, vector)
+                self.disk_hits += len(rows)
+        return found
+
+    def _store(self, items: List[Tuple[bytes, np.ndarray]]) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embedding_cache"
+                " (key, model, dim, vector, created_at) VALUES (?, ?, ?, ?, ?)",
+                [(k, self.model, len(v), v.tobytes(), now) for k, v in items],
+            )
+            self._conn.commit()
+            for key, vector in items:
+                self._remember(key, vector)
+
+    def _embed_missing(self, texts: List[str]) -> List[np.ndarray]:
+        if hasattr(self.embedder, "embed_texts"):
+            vectors = self.embedder.embed_texts(texts)
+        else:
+            vectors = [self.embedder.embed_text(t) for t in texts]
+        out = []
+        for v in vectors:
+            arr = np.array(v, dtype=np.float32)
+            # キャッシュと共有するため呼び出し側で書き換えられないようにする
+            arr.flags.writeable = False
+            out.append(arr)
+        return out
+
+    def embed_texts(self, texts: Sequence[str]) -> List[np.ndarray]:
+        """キャッシュにないテキストだけを（重複を除いて）まとめて埋め込む。戻り値は入力順"""
+        keys = [self.key_for(t) for t in texts]
+        found = self._lookup(list(dict.fromkeys(keys)))
+        missing: Dict[bytes, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+        with self._lock:
+            self.misses += len(missing)
+        if missing:
+            vectors = self._embed_missing(list(missing.values()))
+            new = list(zip(missing.keys(), vectors))
+            self._store(new)
+            found.update(new)
+        return [found[key] for key in keys]
+
+    def embed_text(self, text: str) -> np.ndarray:
+        return self.embed_texts([text])[0]
+
+    def iter_embeddings(
+        self, texts: Sequence[str]
+    ) -> Iterator[Tuple[int, List[np.ndarray]]]:
+        """VectorStore.build 用: CACHE_CHUNK_SIZE 件ずつ (先頭位置, ベクトル列) を返す"""
+        for start in range(0, len(texts), CACHE_CHUNK_SIZE):
+            chunk = texts[start : start + CACHE_CHUNK_SIZE]  # noqa: E203
+            yield start, self.embed_texts(chunk)
+
+    def stats(self) -> Dict[str, Any]:
+        """メモリ/ディスクのヒット数・ミス数・ヒット率・保存件数を返す"""
+        with self._lock:
+            (size,) = self._conn.execute(
+                "SELECT COUNT(*) FROM embedding_cache"
+            ).fetchone()
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            hits = self.memory_hits + self.disk_hits
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "size": size,
+                "memory_size": len(self._memory),
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def create_cached_embedder(embedder: Any) -> Any:
+    """
+    環境変数 EMBEDDING_CACHE_PATH（SQLiteファイル）が設定されていれば CachedEmbedder で
+    ラップして返す。未設定時は embedder をそのまま返す。
+    メモリ上の件数上限は EMBEDDING_CACHE_MEMORY_SIZE。
+    """
+    path = os.getenv("EMBEDDING_CACHE_PATH", "")
+    if not path:
+        return embedder
+    return CachedEmbedder(
+        embedder,
+        path,
+        memory_size=int(os.getenv("EMBEDDING_CACHE_MEMORY_SIZE", "4096")),
+    )
@@ -0,0 +1,262 @@
+"""
+Phase6: RAG インデックスのディスク形式（メモリマップ読み込み）
+
+VectorStore をディレクトリに保存し、各プロセスはファイルを np.memmap / FAISS の mmap で
+開くだけで検索を始められる。ページは OS のページキャッシュで複数プロセス間に共有される。
+
+ディレクトリ構成（FORMAT_VERSION = 1）:
+    meta.json       形式名・バージョン・件数・次元・FAISSインデックスの有無
+    embeddings.f32  埋め込み行列 (count, dim) の float32 生データ（C順）
+    sq_norms.f32    各行の二乗ノルム (count,) の float32 生データ
+    docs.idx        文書テーブルの各文書の開始位置 (count + 1,) の uint64
+    docs.bin        文書を UTF-8 で連結したバイト列
+    faiss.index     faiss.write_index の出力（faiss がある場合のみ）
+
+保存先 path は版ディレクトリ <path>.v<時刻> へのシンボリックリンクで、保存のたびに
+アトミックに付け替える（replace_dir）。
+"""
+import json
+import os
+import re
+import shutil
+import time
+from typing import Any, Callable, Iterator, Optional, Sequence, TypeVar, Union
+
+import numpy as np
+
+from src.phase6.vector_store import VectorStore, faiss
+
+FORMAT_NAME = "rag-index"
+FORMAT_VERSION = 1
+
+META_FILE = "meta.json"
+EMBEDDINGS_FILE = "embeddings.f32"
+NORMS_FILE = "sq_norms.f32"
+DOC_OFFSETS_FILE = "docs.idx"
+DOC_DATA_FILE = "docs.bin"
+FAISS_FILE = "faiss.index"
+
+# 保存と重なって読み込みに失敗したときに読み直すまでの秒数
+RELOAD_DELAY = 0.05
+
+T = TypeVar("T")
+
+
+class StringTable(Sequence[str]):
+    """開始位置の配列とUTF-8データから、添字アクセスのたびに文書を取り出す文字列テーブル"""
+
+    def __init__(self, offsets: np.ndarray, data: Union[np.ndarray, bytes]):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: Any) -> Any:
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("StringTable index out of range")
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return bytes(self.data[start:end]).decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(len(self)):
+            yield self[i]
+
+
+def _write_raw(path: str, array: np.ndarray) -> None:
+    with open(path, "wb") as f:
+        f.write(np.ascontiguousarray(array).tobytes())
+
+
+def save_vector_store(store: VectorStore, path: str) -> None:
+    """
+    VectorStore をディレクトリ形式で保存する。
+    一時ディレクトリに書き出してから置き換えるため、読み込み中のプロセスが
+    書きかけのファイルを開くことはない。
+    """
+    tmp = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    write_vector_store(store, tmp)
+    replace_dir(tmp, path)
+
+
+def write_vector_store(store: VectorStore, tmp: str) -> None:
+    """空のディレクトリ tmp にインデックスのファイルを書き出す（公開は replace_dir で行う）"""
+    matrix = np.asarray(store.matrix, dtype=np.float32)
+    count = len(store.docs)
+    dim = matrix.shape[1] if count else 0
+
+    _write_raw(os.path.join(tmp, EMBEDDINGS_FILE), matrix)
+    _write_raw(
+        os.path.join(tmp, NORMS_FILE),
+        np.einsum("ij,ij->i", matrix, matrix).astype(np.float32),
+    )
+    encoded = [doc.encode("utf-8") for doc in store.docs]
+    offsets = np.zeros(count + 1, dtype=np.uint64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    _write_raw(os.path.join(tmp, DOC_OFFSETS_FILE), offsets)
+    with open(os.path.join(tmp, DOC_DATA_FILE), "wb") as f:
+        f.write(b"".join(encoded))
+    has_faiss = faiss is not None and store.index is not None
+    if has_faiss:
+        faiss.write_index(store.index, os.path.join(tmp, FAISS_FILE))
+
+    meta = {
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "count": count,
+        "dim": dim,
+        "dtype": "float32",
+        "faiss": has_faiss,
+        "created_at": time.time(),
+    }
+    with open(os.path.join(tmp, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+
+def replace_dir(tmp: str, path: str) -> None:
+    """
+    書き終えた一時ディレクトリ tmp を path として公開する。
+    tmp を版ごとのディレクトリ <path>.v<時刻> に移し、path のシンボリックリンクを
+    os.replace でアトミックに付け替えるため、読み込み側から path が消える瞬間はない。
+    直前の版は読み込み中のプロセスのために残し、それより古い版を削除する。
+    """
+    path = os.path.abspath(path)
+    parent, name = os.path.split(path)
+    version = f"{name}.v{time.time_ns()}"
+    previous = os.readlink(path) if os.path.islink(path) else None
+    if previous is None and os.path.exists(path):
+        # 旧形式（path が実ディレクトリ）は一度だけ版ディレクトリに移す
+        previous = f"{name}.v0"
+        shutil.rmtree(os.path.join(parent, previous), ignore_errors=True)
+        os.rename(path, os.path.join(parent, previous))
+    os.rename(tmp, os.path.join(parent, version))
+    link = os.path.join(parent, f".{name}.link-{os.getpid()}")
+    if os.path.lexists(link):
+        os.remove(link)
+    try:
+        os.symlink(version, link)
+    except (OSError, NotImplementedError):
+        # シンボリックリンクを作れない環境では rename で置き換える（読み込み側が再試行する）
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        os.rename(os.path.join(parent, version), path)
+        return
+    os.replace(link, path)
+    versions = re.compile(re.escape(name) + r"\.v\d+")
+    for entry in os.listdir(parent):
+        if versions.fullmatch(entry) and entry not in (version, previous):
+            shutil.rmtree(os.path.join(parent, entry), ignore_errors=True)
+
+
+def resolve_dir(path: str) -> str:
+    """path のシンボリックリンクを解決した版ディレクトリを返す（以降の保存の影響を受けない）"""
+    return os.path.realpath(path)
+
+
+def retry_missing(load: Callable[[], T], path: str) -> T:
+    """
+    load() を実行し、保存による版の付け替えと重なって FileNotFoundError になった場合は
+    少し待ってから1度だけ読み直す（path 自体が存在しない場合はそのまま送出する）。
+    """
+    try:
+        return load()
+    except FileNotFoundError:
+        time.sleep(RELOAD_DELAY)
+        if not os.path.lexists(path):
+            raise
+        return load()
+
+
+def read_meta(path: str) -> dict:
+    """meta.json を読み、形式とバージョンを検証する"""
+    meta_path = os.path.join(path, META_FILE)
+    if not os.path.exists(meta_path):
+        raise FileNotFoundError(f"RAG index not found: {path}")
+    with open(meta_path, encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("format") != FORMAT_NAME:
+        raise ValueError(f"Not a RAG index directory: {path}")
+    if meta.get("version") != FORMAT_VERSION:
+        raise ValueError(
+            f"Unsupported RAG index version {meta.get('version')}"
+            f" (expected {FORMAT_VERSION}); rebuild with build_rag_index"
+        )
+    return meta
+
+
+def _open_array(path: str, dtype: Any, shape: tuple, mmap: bool) -> np.ndarray:
+    expected = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    if os.path.getsize(path) != expected:
+        raise ValueError(f"Corrupted RAG index file: {path}")
+    if expected == 0:
+        return np.empty(shape, dtype=dtype)
+    if mmap:
+        return np.memmap(path, dtype=dtype, mode="r", shape=shape)
+    return np.fromfile(path, dtype=dtype).reshape(shape)
+
+
+def load_vector_store(
+    path: str,
+    embedder: Optional[Any] = None,
+    mmap: bool = True,
+    use_faiss: bool = True,
+) -> VectorStore:
+    """
+    ディレクトリ形式のインデックスから VectorStore を復元する。
+    mmap=True ではファイルをメモリマップで開くだけで、実データは検索時に必要な分だけ
+    ページキャッシュから読まれる。use_faiss=False または faiss 未導入時は総当たり検索を使う。
+    """
+    return retry_missing(
+        lambda: _load_vector_store(resolve_dir(path), embedder, mmap, use_faiss), path
+    )
+
+
+def _load_vector_store(
+    path: str, embedder: Optional[Any], mmap: bool, use_faiss: bool
+) -> VectorStore:
+    meta = read_meta(path)
+    count, dim = meta["count"], meta["dim"]
+    store = VectorStore(embedder)
+    store.matrix = _open_array(
+        os.path.join(path, EMBEDDINGS_FILE), np.float32, (count, dim), mmap
+    )
+    store._sq_norms = _open_array(
+        os.path.join(path, NORMS_FILE), np.float32, (count,), mmap
+    )
+    offsets = _open_array(
+        os.path.join(path, DOC_OFFSETS_FILE), np.uint64, (count + 1,), mmap
+    )
+    data_path = os.path.join(path, DOC_DATA_FILE)
+    data_size = os.path.getsize(data_path)
+    if count and int(offsets[-1]) != data_size:
+        raise ValueError(f"Corrupted RAG index file: {data_path}")
+    if mmap and data_size:
+        data: Union[np.ndarray, bytes] = np.memmap(data_path, dtype=np.uint8, mode="r")
+    else:
+        with open(data_path, "rb") as f:
+            data = f.read()
+    store.docs = StringTable(offsets, data)  # type: ignore[assignment]
+    store.index = None
+    if use_faiss and faiss is not None and meta.get("faiss"):
+        index_path = os.path.join(path, FAISS_FILE)
+        if mmap:
+            # 平坦インデックスはコード領域をそのままメモリマップする（faiss 1.8 以降）
+            flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+            try:
+                store.index = faiss.read_index(
+                    index_path, flags | faiss.IO_FLAG_READ_ONLY
+                )
+                # ファイルを参照しているため、更新時は VectorStore が作り直す
+                store._mapped_index = True
+            except RuntimeError:
+                store.index = faiss.read_index(index_path)
+        else:
+            store.index = faiss.read_index(index_path)
+    store.build_stats = {"docs": count, "loaded_from": path}
+    return store
@@ -0,0 +1,254 @@
+"""
+Phase6: Notion の商品・顧客マスタの変更を RAG インデックスへ差分反映する
+
+前回の同期時刻（watermark）以降に作成・更新されたページだけを Notion から取得し、
+内容が変わったエントリだけを埋め込み直して MasterIndex に add/remove する。
+削除されたページは差分クエリでは返らないため、full_every 回に1回は全ページの一覧と
+突き合わせて取り除く。ファイル（products.md / customers.md）から構築した索引は
+ページIDを持たないので、初回は全件を Notion の内容で置き換える。
+
+    python -m src.phase6.index_sync          # 1回同期して保存
+    python -m src.phase6.index_sync --watch  # RAG_SYNC_INTERVAL 秒ごとに同期し続ける
+"""
+import argparse
+import logging
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.phase4.notion_client import _plain_text
+from src.phase6.lexical_index import parse_master_line
+from src.phase6.master_index import MasterIndex
+from src.phase6.vector_store import VectorStore
+
+logger = logging.getLogger(__name__)
+
+# Notion の日時は分単位に丸められるため、前回の同期時刻より少し前から取り直す
+SYNC_OVERLAP_SECONDS = 120
+
+
+def product_entry(page: Dict[str, Any]) -> Optional[str]:
+    """商品ページのエントリ行「商品ID: 商品名」"""
+    props = page.get("properties", {})
+    pid, name = _plain_text(props.get("id")), _plain_text(props.get("name"))
+    if not pid:
+        return None
+    return f"{pid}: {name}" if name else pid
+
+
+def customer_entry(page: Dict[str, Any]) -> Optional[str]:
+    """顧客ページのエントリ行（顧客名。未設定なら顧客ID）"""
+    props = page.get("properties", {})
+    return (
+        _plain_text(props.get("customer_name")) or _plain_text(props.get("id")) or None
+    )
+
+
+# 名前空間ごとの (Notion クライアントのDB ID属性, 差分判定の日付プロパティ, エントリ行)
+SYNC_SOURCES: Dict[str, Tuple[str, str, Callable[[dict], Optional[str]]]] = {
+    "product": ("database_id_products", "last_updated", product_entry),
+    "customer": ("database_id_customers", "created_at", customer_entry),
+}
+
+
+class MasterIndexSync:
+    """
+    MasterIndex を Notion のマスタに追従させる差分同期。
+    path を渡すと同期ごとに保存し、pipeline（RAGPipeline）を渡すと字句索引も更新する。
+    """
+
+    def __init__(
+        self,
+        index: MasterIndex,
+        notion: Any,
+        path: Optional[str] = None,
+        pipeline: Optional[Any] = None,
+        full_every: int = 12,
+    ):
+        self.index = index
+        self.notion = notion
+        self.path = path
+        self.pipeline = pipeline
+        self.full_every = max(1, full_every)
+        self.syncs = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _has_keys(self, kind: str) -> bool:
+        """名前空間 kind の各エントリに対応する Notion ページIDが揃っているか"""
+        keys = self.index.state.get("keys", {}).get(kind)
+        store = self.index.stores.get(kind)
+        return keys is not None and store is not None and len(keys) == len(store.docs)
+
+    def _since(self) -> str:
+        watermark = datetime.fromisoformat(self.index.state["watermark"])
+        return (watermark - timedelta(seconds=SYNC_OVERLAP_SECONDS)).isoformat()
+
+    def _lexical_index(self, kind: str) -> Any:
+        if self.pipeline is None:
+            return None
+        return getattr(self.pipeline, f"{kind}_index", None)
+
+    def _apply(
+        self, kind: str, pages: List[Dict[str, Any]], full: bool
+    ) -> Dict[str, int]:
+        """取得したページを名前空間 kind に反映し、追加・更新・削除件数を返す"""
+        entry = SYNC_SOURCES[kind][2]
+        with self.index.lock:
+            store = self.index.stores.setdefault(kind, VectorStore(self.index.embedder))
+        keys: List[str] = self.index.state.setdefault("keys", {}).setdefault(kind, [])
+        current = {page["id"]: entry(page) for page in pages if page.get("id")}
+        if self._has_keys(kind):
+            position = {key: i for i, key in enumerate(keys)}
+            drop = set()
+        else:
+            # ページIDを持たない索引（ファイルから構築）は全件を置き換える
+            keys.clear()
+            position = {}
+            drop = set(range(len(store.docs)))
+        docs = store.docs
+        changed = {
+            pid: text
+            for pid, text in current.items()
+            if text and (pid not in position or docs[position[pid]] != text)
+        }
+        for pid, text in current.items():
+            if pid in position and (not text or pid in changed):
+                drop.add(position[pid])
+        if full:
+            drop.update(i for pid, i in position.items() if pid not in current)
+        stats = {
+            "added": sum(pid not in position for pid in changed),
+            "updated": sum(pid in position for pid in changed),
+            "removed": len(drop) - sum(pid in position for pid in changed),
+        }
+        if not drop and not changed:
+            return stats
+
+        # 埋め込み（API 呼び出し）はロックの外で行い、検索を止めるのは反映の間だけ
+        texts = list(changed.values())
+        vectors = self.index.embed(texts) if texts else None
+        lexical = self._lexical_index(kind)
+        with self.index.lock:
+            removed_docs = [store.docs[i] for i in sorted(drop)]
+            store.remove(drop)
+            keys[:] = [key for i, key in enumerate(keys) if i not in drop]
+            store.add(texts, vectors)
+            keys.extend(changed)
+            if lexical is not None:
+                for doc in removed_docs:
+                    parsed = parse_master_line(doc)
+                    if parsed:
+                        lexical.remove(parsed[0])
+                for text in texts:
+                    parsed = parse_master_line(text)
+                    if parsed:
+                        lexical.add(*parsed)
+        return stats
+
+    def sync(self, full: bool = False) -> Dict[str, Any]:
+        """
+        1回分の差分同期。full=True または full_every 回目は全ページを取得して削除も反映する。
+        名前空間ごとの added / updated / removed と取得ページ数を返す。
+        """
+        started = datetime.now(timezone.utc)
+        full = (
+            full
+            or self.syncs % self.full_every == 0
+            or "watermark" not in self.index.state
+            or not all(self._has_keys(kind) for kind in SYNC_SOURCES)
+        )
+        since = None if full else self._since()
+        result: Dict[str, Any] = {"full": full}
+        for kind, (db_attr, date_property, _) in SYNC_SOURCES.items():
+            pages = self.notion.list_changed_pages(
+                getattr(self.notion, db_attr), date_property, since
+            )
+            result[kind] = {
+                "fetched": len(pages),
+                **self._apply(kind, pages, full),
+            }
+        self.index.state["watermark"] = started.isoformat()
+        self.syncs += 1
+        if self.path:
+            changed = any(
+                result[kind][k]
+                for kind in SYNC_SOURCES
+                for k in ("added", "updated", "removed")
+            )
+            if changed or not os.path.isdir(self.path):
+                self.index.save(self.path)
+            else:
+                self.index.save_state(self.path)
+        result["seconds"] = (datetime.now(timezone.utc) - started).total_seconds()
+        logger.info(f"RAG index sync: {result}")
+        return result
+
+    def run_forever(self, interval: float) -> None:
+        """stop() が呼ばれるまで interval 秒ごとに sync する（失敗はログに出して続行）"""
+        while not self._stop.is_set():
+            try:
+                self.sync()
+            except Exception as e:
+                logger.warning(f"RAG index sync failed: {e}")
+            self._stop.wait(interval)
+
+    def start(self, interval: float) -> None:
+        """interval 秒ごとに sync するバックグラウンドスレッドを開始する"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self.run_forever,
+            args=(interval,),
+            name="rag-index-sync",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def create_index_sync(
+    index: MasterIndex, notion: Any, path: str, pipeline: Optional[Any] = None
+) -> MasterIndexSync:
+    """環境変数 RAG_SYNC_FULL_EVERY（何回に1回全件と突き合わせるか）で差分同期を作る"""
+    return MasterIndexSync(
+        index,
+        notion,
+        path,
+        pipeline,
+        full_every=int(os.getenv("RAG_SYNC_FULL_EVERY", "12")),
+    )
+
+
+def main():
+    from src.phase4.notion_client import get_notion_client
+    from src.phase6.embedding import OpenAIEmbedder
+    from src.phase6.embedding_cache import create_cached_embedder
+
+    parser = argparse.ArgumentParser(description="Notion マスタの変更を RAG インデックスへ反映")
+    parser.add_argument("--full", action="store_true", help="全ページと突き合わせる")
+    parser.add_argument("--watch", action="store_true", help="定期的に同期し続ける")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    path = os.getenv("RAG_INDEX_PATH", "rag_index")
+    embedder = create_cached_embedder(OpenAIEmbedder())
+    try:
+        index = MasterIndex.load(path, embedder)
+    except FileNotFoundError:
+        index = MasterIndex({}, embedder)
+    syncer = create_index_sync(index, get_notion_client(), path)
+    print(syncer.sync(full=args.full))
+    if args.watch:
+        syncer.run_forever(float(os.getenv("RAG_SYNC_INTERVAL", "300")))
+
+
+if __name__ == "__main__":
+    main()
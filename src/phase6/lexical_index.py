@@ -0,0 +1,260 @@
+"""
+Phase6: 商品・顧客マスタの字句索引（RAG 正規化の前段）
+
+マスタの各行「正式名: 別名, 別名, ...」（先頭が商品ID/正式な顧客名）から次の2段を作る。
+- exact: NFKC 正規化・小文字化・空白や区切り記号の除去をしたキー → 正式名の辞書
+- fuzzy: 文字 bigram の転置索引で候補を絞り、編集距離から類似度を計算する
+どちらでも確信できない入力だけを、呼び出し側がベクトル検索 + LLM に回す。
+"""
+import os
+import re
+import threading
+import unicodedata
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# 正規化キーから取り除く空白・区切り記号（全角は NFKC で半角になる）
+_SEPARATORS = re.compile(r"[\s\-‐_・.,/()\[\]「」『』]+")
+# マスタ行の区切り（正式名と別名、別名どうし）
+_FIELD_SPLIT = re.compile(r"\s*[:：|,、]\s*")
+# 箇条書き・番号付きリストの行頭記号
+_LINE_PREFIX = re.compile(r"^(?:[-*+]|\d+\.)\s+")
+
+
+def normalize_key(text: str) -> str:
+    """表記の揺れ（全角/半角・大文字/小文字・空白・区切り記号）を吸収した照合キー"""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return _SEPARATORS.sub("", text)
+
+
+def _grams(key: str) -> List[str]:
+    padded = f"^{key}$"
+    return [padded[i : i + 2] for i in range(len(padded) - 1)]  # noqa: E203
+
+
+def edit_distance(a: str, b: str, limit: Optional[int] = None) -> int:
+    """
+    レーベンシュタイン距離（挿入・削除・置換それぞれコスト1）。
+    limit を渡すと、距離が limit を超えることが確定した時点で limit + 1 を返す。
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    if limit is None:
+        prev = list(range(len(b) + 1))
+        for i, ca in enumerate(a, 1):
+            cur = [i]
+            for j, cb in enumerate(b, 1):
+                cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+            prev = cur
+        return prev[-1]
+    if len(a) - len(b) > limit:
+        return limit + 1
+    # 対角線から limit 以内のセルだけを計算する（帯行列 DP）
+    over = limit + 1
+    prev = [j if j <= limit else over for j in range(len(b) + 1)]
+    for i, ca in enumerate(a, 1):
+        lo, hi = max(1, i - limit), min(len(b), i + limit)
+        cur = [over] * (len(b) + 1)
+        cur[0] = i if i <= limit else over
+        for j in range(lo, hi + 1):
+            cur[j] = min(
+                prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != b[j - 1]), over
+            )
+        if min(cur[lo - 1 : hi + 1]) > limit:  # noqa: E203
+            return over
+        prev = cur
+    return prev[-1]
+
+
+def similarity(a: str, b: str) -> float:
+    """正規化キーどうしの類似度（1 - 編集距離 / 長い方の長さ）"""
+    if not a and not b:
+        return 1.0
+    return 1.0 - edit_distance(a, b) / max(len(a), len(b))
+
+
+def parse_master_line(line: str) -> Optional[Tuple[str, List[str]]]:
+    """マスタの1行を (正式名, 別名リスト) に分解する。見出しや表の区切り行は None"""
+    line = line.strip()
+    if line.startswith("#"):
+        return None
+    line = _LINE_PREFIX.sub("", line).strip("|").strip()
+    fields = [f for f in _FIELD_SPLIT.split(line) if f]
+    if not fields or not normalize_key(fields[0]):
+        return None
+    return fields[0], fields[1:]
+
+
+@dataclass
+class LexicalMatch:
+    """字句索引での照合結果（tier は "exact" または "fuzzy"）"""
+
+    value: str
+    score: float
+    tier: str
+
+
+class LexicalIndex:
+    """
+    正式名と別名から作る照合索引。lookup は exact → fuzzy の順に試し、
+    fuzzy は類似度が threshold 以上かつ2位の別候補と margin 以上の差がある場合だけ返す。
+    add / remove（差分同期のスレッド）と lookup（検索側のスレッド）は並行に呼んでよい。
+    """
+
+    def __init__(
+        self,
+        entries: Iterable[Tuple[str, Iterable[str]]] = (),
+        threshold: float = 0.85,
+        margin: float = 0.05,
+        max_candidates: int = 20,
+    ):
+        self.threshold = threshold
+        self.margin = margin
+        self.max_candidates = max_candidates
+        self._exact: Dict[str, str] = {}
+        self._keys: List[str] = []
+        # 削除された位置は None（postings からは外さず、fuzzy で読み飛ばす）
+        self._values: List[Optional[str]] = []
+        self._postings: Dict[str, List[int]] = {}
+        # add / remove と _freeze の排他（lookup は固めた配列をロックなしで読む）
+        self._lock = threading.Lock()
+        # fuzzy 検索用に postings・キー長・bigram 数を numpy 配列へ固めたもの（add で破棄）。
+        # 3つを1つのタプルで差し替えるため、検索中に長さの違う配列が混ざることはない
+        self._frozen: Optional[
+            Tuple[Dict[str, np.ndarray], np.ndarray, np.ndarray]
+        ] = None
+        for value, aliases in entries:
+            self.add(value, aliases)
+
+    def add(self, value: str, aliases: Iterable[str] = ()) -> None:
+        """正式名 value と別名を登録する（正式名自身も照合対象）"""
+        with self._lock:
+            for name in (value, *aliases):
+                key = normalize_key(name)
+                if not key or key in self._exact:
+                    continue
+                self._frozen = None
+                pos = len(self._keys)
+                self._keys.append(key)
+                self._values.append(value)
+                for gram in set(_grams(key)):
+                    self._postings.setdefault(gram, []).append(pos)
+                self._exact[key] = value
+
+    def remove(self, value: str) -> None:
+        """正式名 value とその別名を照合対象から外す（差分同期でマスタが変わったとき）"""
+        with self._lock:
+            for key in [k for k, v in self._exact.items() if v == value]:
+                del self._exact[key]
+            for pos, v in enumerate(self._values):
+                if v == value:
+                    self._values[pos] = None
+
+    @classmethod
+    def from_lines(cls, lines: Iterable[str], **kwargs) -> "LexicalIndex":
+        entries = [e for e in map(parse_master_line, lines) if e is not None]
+        return cls(entries, **kwargs)
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> "LexicalIndex":
+        """products.md / customers.md 形式のマスタファイルから索引を作る"""
+        with open(path, encoding="utf-8") as f:
+            return cls.from_lines((line for line in f if line.strip()), **kwargs)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def exact(self, text: str) -> Optional[str]:
+        return self._exact.get(normalize_key(text))
+
+    def _freeze(self) -> Tuple[Dict[str, np.ndarray], np.ndarray, np.ndarray]:
+        frozen = self._frozen
+        if frozen is None:
+            with self._lock:
+                if self._frozen is None:
+                    arrays = {
+                        g: np.array(p, dtype=np.int32)
+                        for g, p in self._postings.items()
+                    }
+                    lengths = np.array([len(k) for k in self._keys], dtype=np.int32)
+                    counts = np.array(
+                        [len(set(_grams(k))) for k in self._keys], dtype=np.int32
+                    )
+                    self._frozen = (arrays, lengths, counts)
+                frozen = self._frozen
+        return frozen
+
+    def fuzzy(self, text: str) -> Optional[LexicalMatch]:
+        key = normalize_key(text)
+        if not key:
+            return None
+        arrays, all_lengths, all_counts = self._freeze()
+        grams = set(_grams(key))
+        hits = [arrays[g] for g in grams if g in arrays]
+        if not hits:
+            return None
+        overlap = np.bincount(np.concatenate(hits), minlength=len(all_lengths))
+        pos = np.flatnonzero(overlap)
+        shared = overlap[pos]
+        lengths = all_lengths[pos]
+        counts = all_counts[pos]
+        # 編集1回で変わる bigram は高々2つなので、長さの差と共有されない bigram 数から
+        # 編集距離の下限が分かる。下限だけで (閾値 - margin) に届かない候補は除く
+        slack = 1 - self.threshold + self.margin
+        lower = np.maximum(
+            np.abs(lengths - len(key)),
+            (np.maximum(len(grams), counts) - shared + 1) // 2,
+        )
+        keep = lower <= slack * np.maximum(lengths, len(key)) + 1e-9
+        pos, shared, counts = pos[keep], shared[keep], counts[keep]
+        if not len(pos):
+            return None
+        # 共有 bigram の割合（Dice 係数）で上位候補に絞ってから編集距離を計算する
+        dice = shared / (len(grams) + counts)
+        if len(pos) > self.max_candidates:
+            pos = pos[np.argpartition(-dice, self.max_candidates - 1)]
+            pos = pos[: self.max_candidates]
+        best: Dict[str, float] = {}
+        for p in pos:
+            value = self._values[p]
+            if value is None:
+                continue
+            other = self._keys[p]
+            longest = max(len(key), len(other))
+            limit = int(slack * longest + 1e-9)
+            dist = edit_distance(key, other, limit)
+            if dist > limit:
+                continue
+            score = 1.0 - dist / longest
+            if score > best.get(value, -1.0):
+                best[value] = score
+        if not best:
+            return None
+        ranked = sorted(best.items(), key=lambda kv: -kv[1])
+        value, score = ranked[0]
+        if score < self.threshold:
+            return None
+        if len(ranked) > 1 and score - ranked[1][1] < self.margin:
+            return None
+        return LexicalMatch(value, score, "fuzzy")
+
+    def lookup(self, text: str) -> Optional[LexicalMatch]:
+        """確信できる正式名を返す。該当なし・曖昧なら None（ベクトル検索 + LLM へ）"""
+        value = self.exact(text)
+        if value is not None:
+            return LexicalMatch(value, 1.0, "exact")
+        return self.fuzzy(text)
+
+
+def load_lexical_index(path: str) -> Optional[LexicalIndex]:
+    """
+    マスタファイルがあれば字句索引を作って返す（なければ None）。
+    fuzzy の採用閾値は環境変数 RAG_FUZZY_THRESHOLD。
+    """
+    if not os.path.exists(path):
+        return None
+    return LexicalIndex.from_file(
+        path, threshold=float(os.getenv("RAG_FUZZY_THRESHOLD", "0.85"))
+    )
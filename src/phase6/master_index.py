@@ -0,0 +1,176 @@
+"""
+Phase6: 商品・顧客マスタのエントリ単位ベクトルインデックス
+
+マスタの1行（1商品・1顧客）を1文書として埋め込み、商品と顧客を別々の VectorStore
+（名前空間）に分けて保持する。検索は名前空間を指定して上位 top_k 件のエントリだけを返すため、
+マスタが大きくなっても LLM に渡す候補は数行に収まる。
+
+保存形式は名前空間ごとのサブディレクトリ（index_store のディレクトリ形式）:
+    <path>/product/   商品マスタ
+    <path>/customer/  顧客マスタ
+    <path>/state.json 差分同期の状態（各エントリの Notion ページID・同期済み時刻）
+"""
+import json
+import os
+import shutil
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from src.phase6.index_store import (
+    load_vector_store,
+    replace_dir,
+    resolve_dir,
+    retry_missing,
+    write_vector_store,
+)
+from src.phase6.lexical_index import parse_master_line
+from src.phase6.vector_store import VectorStore
+
+# 名前空間とマスタファイル
+MASTER_FILES = {"product": "products.md", "customer": "customers.md"}
+STATE_FILE = "state.json"
+
+
+def master_entries(lines: Sequence[str]) -> List[str]:
+    """マスタファイルの行から、見出しや表の区切り行を除いたエントリ行を返す"""
+    return [line for line in lines if parse_master_line(line) is not None]
+
+
+class MasterIndex:
+    """
+    名前空間（"product" / "customer"）ごとの VectorStore の集まり。
+    query / query_many は VectorStore と同じ形で使え、kind / kinds で名前空間を絞る。
+    """
+
+    def __init__(
+        self,
+        stores: Dict[str, VectorStore],
+        embedder: Any = None,
+        state: Optional[Dict[str, Any]] = None,
+    ):
+        self.stores = stores
+        self.embedder = embedder
+        for store in stores.values():
+            store.embedder = embedder
+        # 差分同期の状態（index_sync が keys / watermark を書き込む）
+        self.state: Dict[str, Any] = state if state is not None else {}
+        # 差分更新と検索が同時に走らないようにするロック
+        self.lock = threading.RLock()
+
+    @classmethod
+    def build(
+        cls,
+        entries: Dict[str, List[str]],
+        embedder: Any,
+        progress: Optional[Callable[[int, int, float], None]] = None,
+    ) -> "MasterIndex":
+        """名前空間ごとのエントリ一覧からインデックスを構築する"""
+        stores = {}
+        for kind, docs in entries.items():
+            store = VectorStore(embedder)
+            store.build(list(docs), progress=progress)
+            stores[kind] = store
+        return cls(stores, embedder)
+
+    def save(self, path: str) -> None:
+        """名前空間ごとのサブディレクトリに保存し、まとめて置き換える"""
+        tmp = f"{path}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        with self.lock:
+            for kind, store in self.stores.items():
+                os.makedirs(os.path.join(tmp, kind))
+                write_vector_store(store, os.path.join(tmp, kind))
+            self._write_state(tmp)
+        replace_dir(tmp, path)
+
+    def _write_state(self, path: str) -> None:
+        state_path = os.path.join(path, STATE_FILE)
+        with open(f"{state_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(self.state, f, ensure_ascii=False)
+        os.replace(f"{state_path}.tmp", state_path)
+
+    def save_state(self, path: str) -> None:
+        """保存済みのインデックスの state.json だけを書き換える（ベクトルに変更がない場合）"""
+        with self.lock:
+            self._write_state(path)
+
+    @classmethod
+    def load(cls, path: str, embedder: Any = None, **kwargs) -> "MasterIndex":
+        """save で保存したインデックスを読み込む（kwargs は load_vector_store に渡す）"""
+        return retry_missing(
+            lambda: cls._load(resolve_dir(path), embedder, **kwargs), path
+        )
+
+    @classmethod
+    def _load(cls, path: str, embedder: Any, **kwargs) -> "MasterIndex":
+        # path は解決済みの版ディレクトリ（全名前空間を同じ版から読む）
+        stores = {
+            kind: load_vector_store(os.path.join(path, kind), embedder, **kwargs)
+            for kind in MASTER_FILES
+            if os.path.isdir(os.path.join(path, kind))
+        }
+        if not stores:
+            raise FileNotFoundError(f"RAG index not found: {path}")
+        state = None
+        state_path = os.path.join(path, STATE_FILE)
+        if os.path.exists(state_path):
+            with open(state_path, encoding="utf-8") as f:
+                state = json.load(f)
+        return cls(stores, embedder, state)
+
+    def __len__(self) -> int:
+        return sum(len(store.docs) for store in self.stores.values())
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """クエリ・エントリをまとめて埋め込み、(件数, 次元) の float32 行列で返す"""
+        if hasattr(self.embedder, "embed_texts"):
+            vectors = self.embedder.embed_texts(texts)
+        else:
+            vectors = [self.embedder.embed_text(t) for t in texts]
+        return np.asarray(vectors, dtype=np.float32)
+
+    def _search(self, vectors: np.ndarray, kind: Optional[str], top_k: int) -> list:
+        """各クエリの (二乗距離, 文書) を近い順に top_k 件返す。kind=None は全名前空間"""
+        kinds = [kind] if kind is not None else list(self.stores)
+        hits: List[list] = [[] for _ in range(len(vectors))]
+        for name in kinds:
+            store = self.stores.get(name)
+            if store is None or not len(store.docs):
+                continue
+            dists, idxs = store.search_vectors(vectors, top_k)
+            for row, (d_row, i_row) in enumerate(zip(dists, idxs)):
+                hits[row].extend(
+                    (float(d), store.docs[i])
+                    for d, i in zip(d_row, i_row)
+                    if 0 <= i < len(store.docs)
+                )
+        return [sorted(h, key=lambda x: x[0])[:top_k] for h in hits]
+
+    def query(self, text: str, top_k: int = 1, kind: Optional[str] = None) -> List[str]:
+        """kind の名前空間（None なら全体）から近いエントリを top_k 件返す"""
+        return self.query_many([text], top_k, kinds=[kind])[0]
+
+    def query_many(
+        self,
+        texts: List[str],
+        top_k: int = 1,
+        kinds: Optional[Sequence[Optional[str]]] = None,
+    ) -> List[List[str]]:
+        """
+        全クエリを1回のリクエストで埋め込み、名前空間ごとに1回の行列演算で検索する。
+        kinds はクエリごとの名前空間（省略時は全名前空間）。結果は入力順。
+        """
+        if not texts:
+            return []
+        kinds = list(kinds) if kinds is not None else [None] * len(texts)
+        vectors = self.embed(list(texts))
+        results: List[List[str]] = [[] for _ in texts]
+        with self.lock:
+            for kind in dict.fromkeys(kinds):
+                rows = [i for i, k in enumerate(kinds) if k == kind]
+                for i, hits in zip(rows, self._search(vectors[rows], kind, top_k)):
+                    results[i] = [doc for _, doc in hits]
+        return results
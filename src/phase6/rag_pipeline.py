@@ -1,20 +1,73 @@
 """Phase6: RAG パイプラインと表記揺れ補正ロジック"""
+import dataclasses
+import json
 import os
-from typing import Any, List
+import re
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
 
 import openai
 
+from src.phase6.lexical_index import LexicalIndex, load_lexical_index
+from src.phase6.master_index import MasterIndex
+
+# 正規化の段階（安い順）。exact/fuzzy は字句索引、rag はベクトル検索 + LLM
+NORMALIZE_TIERS = ("exact", "fuzzy", "rag")
+
+# normalize_order でまとめて LLM に渡すプロンプト（入出力とも JSON 配列）
+ORDER_TEMPLATE = (
+    "注文に含まれる商品名・顧客名を、それぞれの候補（商品/顧客マスタ辞書の検索結果）を"
+    "参考に正規化してください。\n"
+    "kind が product なら商品ID、customer なら顧客マスタの顧客名に正規化します。\n"
+    "入力:\n{entries}\n"
+    '次の形式の JSON 配列だけを返してください: [{{"id": 0, "normalized": "..."}}]'
+)
+
 
 class RAGPipeline:
-    """Retrieval-Augmented Generation を使った正規化パイプライン"""
+    """
+    Retrieval-Augmented Generation を使った正規化パイプライン。
+    product_index / customer_index（商品・顧客マスタの字句索引）を渡すと、
+    完全一致・近似一致で確信できる入力はベクトル検索と LLM を呼ばずに正式名を返す。
+    """
 
-    def __init__(self, vector_store: Any, llm_model: str = "gpt-3.5-turbo"):
+    def __init__(
+        self,
+        vector_store: Any,
+        llm_model: str = "gpt-3.5-turbo",
+        product_index: Optional[LexicalIndex] = None,
+        customer_index: Optional[LexicalIndex] = None,
+    ):
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
             raise ValueError("Missing OPENAI_API_KEY environment variable")
         openai.api_key = api_key
         self.vector_store = vector_store
         self.llm_model = llm_model
+        self.product_index = product_index
+        self.customer_index = customer_index
+        self._tier_counts: Dict[str, Counter] = {
+            "product": Counter(),
+            "customer": Counter(),
+        }
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_masters(
+        cls,
+        vector_store: Any,
+        products_path: str = "products.md",
+        customers_path: str = "customers.md",
+        **kwargs,
+    ) -> "RAGPipeline":
+        """products.md / customers.md（存在するもののみ）から字句索引を作って初期化する"""
+        return cls(
+            vector_store,
+            product_index=load_lexical_index(products_path),
+            customer_index=load_lexical_index(customers_path),
+            **kwargs,
+        )
 
     def _format_prompt(
         self, template: str, retrieved: List[str], user_input: str
@@ -22,34 +75,149 @@ class RAGPipeline:
         docs = "\n".join(retrieved)
         return template.format(retrieved_docs=docs, user_input=user_input)
 
+    def _record(self, kind: str, tier: str) -> None:
+        with self._lock:
+            self._tier_counts[kind][tier] += 1
+
+    def _lexical(self, kind: str, user_input: str) -> Optional[str]:
+        index = self.product_index if kind == "product" else self.customer_index
+        match = index.lookup(user_input) if index is not None else None
+        if match is None:
+            return None
+        self._record(kind, match.tier)
+        return match.value
+
+    def _retrieve(self, texts: List[str], kinds: List[str]) -> List[List[str]]:
+        """候補エントリを検索する。MasterIndex なら商品/顧客の名前空間に絞る"""
+        if isinstance(self.vector_store, MasterIndex):
+            return self.vector_store.query_many(texts, top_k=5, kinds=kinds)
+        if len(texts) == 1:
+            return [self.vector_store.query(texts[0], top_k=5)]
+        return self.vector_store.query_many(texts, top_k=5)
+
+    def _rag(self, template: str, user_input: str, kind: str) -> str:
+        retrieved = self._retrieve([user_input], [kind])[0]
+        prompt = self._format_prompt(template, retrieved, user_input)
+        resp = openai.ChatCompletion.create(
+            model=self.llm_model,
+            messages=[{"role": "system", "content": prompt}],
+        )
+        return resp.choices[0].message.content.strip()
+
     def correct_product_name(self, user_input: str) -> str:
         """ユーザー入力の商品名を正規化し、商品IDを返す"""
-        retrieved = self.vector_store.query(user_input, top_k=5)
+        value = self._lexical("product", user_input)
+        if value is not None:
+            return value
         template = (
             "以下の商品マスタ辞書を参考に、ユーザー入力の商品名を正規化してください。\n"
             "商品リスト:\n{retrieved_docs}\n"
             "ユーザー入力: {user_input}\n"
             "正規化された商品IDを返してください。"
         )
-        prompt = self._format_prompt(template, retrieved, user_input)
-        resp = openai.ChatCompletion.create(
-            model=self.llm_model,
-            messages=[{"role": "system", "content": prompt}],
-        )
-        return resp.choices[0].message.content.strip()
+        self._record("product", "rag")
+        return self._rag(template, user_input, "product")
 
     def correct_customer_name(self, user_input: str) -> str:
         """ユーザー入力の顧客名を正規化し、顧客マスタの名前を返す"""
-        retrieved = self.vector_store.query(user_input, top_k=5)
+        value = self._lexical("customer", user_input)
+        if value is not None:
+            return value
         template = (
             "以下の顧客マスタ辞書を参考に、ユーザー入力の顧客名を正規化してください。\n"
             "顧客リスト:\n{retrieved_docs}\n"
             "ユーザー入力: {user_input}\n"
             "正規化された顧客名を返してください。"
         )
-        prompt = self._format_prompt(template, retrieved, user_input)
+        self._record("customer", "rag")
+        return self._rag(template, user_input, "customer")
+
+    def _rag_batch(self, pending: List[Tuple[str, str]]) -> Dict[Tuple[str, str], str]:
+        """
+        (kind, 入力) の一覧を、1回の埋め込み・1回の検索・1回の LLM 呼び出しで正規化する。
+        LLM の応答に含まれない入力は元の値のまま返す。
+        """
+        retrieved = self._retrieve(
+            [text for _, text in pending], [kind for kind, _ in pending]
+        )
+        entries = [
+            {"id": i, "kind": kind, "input": text, "candidates": docs}
+            for i, ((kind, text), docs) in enumerate(zip(pending, retrieved))
+        ]
+        prompt = ORDER_TEMPLATE.format(
+            entries=json.dumps(entries, ensure_ascii=False, indent=1)
+        )
         resp = openai.ChatCompletion.create(
             model=self.llm_model,
             messages=[{"role": "system", "content": prompt}],
         )
-        return resp.choices[0].message.content.strip()
+        text_out = resp.choices[0].message.content.strip()
+        match = re.search(r"\[.*\]", text_out, re.DOTALL)
+        try:
+            results = json.loads(match.group(0)) if match else None
+        except json.JSONDecodeError:
+            results = None
+        if not isinstance(results, list):
+            raise ValueError(f"LLM レスポンスの JSON パース失敗: {text_out}")
+        resolved = {name: name[1] for name in pending}
+        for r in results:
+            if not isinstance(r, dict) or r.get("normalized") in (None, ""):
+                continue
+            i = r.get("id")
+            if isinstance(i, int) and 0 <= i < len(pending):
+                resolved[pending[i]] = str(r["normalized"]).strip()
+        return resolved
+
+    def normalize_order(self, order: Any) -> Any:
+        """
+        parse_order の結果（OrderData またはそのリスト）の商品ID・顧客名をまとめて正規化し、
+        同じ形で返す。字句索引で決まらなかった名前は重複を除き、埋め込み・検索・LLM を
+        それぞれ1回だけ呼んで解決する。
+        """
+        orders = order if isinstance(order, list) else [order]
+        names: Dict[Tuple[str, str], Optional[str]] = {}
+        for o in orders:
+            for kind, text in (
+                ("product", o.product_id),
+                ("customer", o.customer_name),
+            ):
+                if isinstance(text, str) and text.strip():
+                    names.setdefault((kind, text), None)
+        for kind, text in names:
+            names[kind, text] = self._lexical(kind, text)
+        pending = [name for name, value in names.items() if value is None]
+        if pending:
+            for kind, _ in pending:
+                self._record(kind, "rag")
+            names.update(self._rag_batch(pending))
+
+        def resolve(kind: str, text: Any) -> Any:
+            return names.get((kind, text), text) if isinstance(text, str) else text
+
+        normalized = [
+            dataclasses.replace(
+                o,
+                product_id=resolve("product", o.product_id),
+                customer_name=resolve("customer", o.customer_name),
+            )
+            for o in orders
+        ]
+        return normalized if isinstance(order, list) else normalized[0]
+
+    def tier_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """商品/顧客ごとの段階別の処理件数と割合（fraction）"""
+        with self._lock:
+            metrics = {}
+            for kind, counts in self._tier_counts.items():
+                total = sum(counts.values())
+                metrics[kind] = {
+                    "lookups": total,
+                    **{
+                        tier: {
+                            "count": counts[tier],
+                            "fraction": counts[tier] / total if total else 0.0,
+                        }
+                        for tier in NORMALIZE_TIERS
+                    },
+                }
+            return metrics
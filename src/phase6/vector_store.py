@@ -1,5 +1,7 @@
 """Phase6: FAISSベースのベクトルストア実装"""
-from typing import Any, List
+import logging
+import time
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
 
 import numpy as np
 
@@ -8,52 +10,237 @@ try:
 except ImportError:
     faiss = None
 
+logger = logging.getLogger(__name__)
+
+# embed_texts / iter_embeddings を持たない埋め込み器で進捗を報告する単位
+BUILD_CHUNK_SIZE = 256
+# 総当たり検索で一度に計算する距離行列の要素数の上限（クエリ数 × 文書数）
+SEARCH_BLOCK_ELEMENTS = 1 << 24
+
+
+def log_progress(done: int, total: int, elapsed: float) -> None:
+    """build() の進捗コールバック: 件数とスループットをログに出す"""
+    rate = done / elapsed if elapsed > 0 else 0.0
+    logger.info(f"Embedded {done}/{total} docs ({rate:.1f} docs/s)")
+
 
 class VectorStore:
     """テキストコレクションからベクトルインデックスを構築し、類似検索を行うクラス"""
 
     def __init__(self, embedder: Any):
         """
-        :param embedder: embed_text(text: str) -> List[float] を提供する埋め込み器
+        :param embedder: embed_text(text: str) -> List[float] を提供する埋め込み器。
+            iter_embeddings / embed_texts があればバッチで埋め込む
         """
         self.embedder = embedder
         self.index = None
         self.docs: List[str] = []
-        self.embeddings: List[np.ndarray] = []
+        # 埋め込みは (文書数, 次元) の連続した float32 行列で保持する
+        self.matrix = np.empty((0, 0), dtype=np.float32)
+        # 総当たり検索用の各行の二乗ノルム
+        self._sq_norms = np.empty(0, dtype=np.float32)
+        self.build_stats: dict = {}
+
+    def __setstate__(self, state: dict) -> None:
+        # 行ベクトルのリスト（embeddings）で保存された旧形式の pickle を読み込む
+        if "matrix" not in state:
+            rows = state.pop("embeddings", None) or []
+            state["matrix"] = (
+                np.ascontiguousarray(np.stack(rows), dtype=np.float32)
+                if len(rows)
+                else np.empty((0, 0), dtype=np.float32)
+            )
+            state.pop("_sq_norms", None)
+        self.__dict__.update(state)
+        if "_sq_norms" not in state:
+            self._sq_norms = np.einsum("ij,ij->i", self.matrix, self.matrix)
 
-    def build(self, docs: List[str]) -> None:
-        """ドキュメントリストを受け取り、FAISSインデックスを構築する"""
+    @property
+    def embeddings(self) -> np.ndarray:
+        """各文書の埋め込み（matrix の行）"""
+        return self.matrix
+
+    def _iter_embeddings(
+        self, docs: List[str]
+    ) -> Iterator[Tuple[int, List[List[float]]]]:
+        if hasattr(self.embedder, "iter_embeddings"):
+            yield from self.embedder.iter_embeddings(docs)
+            return
+        for start in range(0, len(docs), BUILD_CHUNK_SIZE):
+            chunk = docs[start : start + BUILD_CHUNK_SIZE]  # noqa: E203
+            if hasattr(self.embedder, "embed_texts"):
+                yield start, self.embedder.embed_texts(chunk)
+            else:
+                yield start, [self.embedder.embed_text(d) for d in chunk]
+
+    def build(
+        self,
+        docs: List[str],
+        progress: Optional[Callable[[int, int, float], None]] = None,
+    ) -> None:
+        """
+        ドキュメントリストを受け取り、FAISSインデックスを構築する。
+        埋め込みはバッチ単位で受け取り、確保済みの float32 行列に直接書き込む。
+        progress(完了件数, 総件数, 経過秒) をバッチごとに呼び出す。
+        """
         self.docs = docs
         if not docs:
             self.index = None
             self.docs = []
-            self.embeddings = []
+            self.matrix = np.empty((0, 0), dtype=np.float32)
+            self._sq_norms = np.empty(0, dtype=np.float32)
             return
-        # 埋め込み取得
-        raw_embs = [self.embedder.embed_text(d) for d in docs]
-        arr = np.array(raw_embs, dtype="float32")
-        self.embeddings = [arr[i] for i in range(arr.shape[0])]
+        total = len(docs)
+        matrix: Optional[np.ndarray] = None
+        done = 0
+        start_time = time.perf_counter()
+        for start, vectors in self._iter_embeddings(docs):
+            block = np.asarray(vectors, dtype=np.float32)
+            if matrix is None:
+                matrix = np.empty((total, block.shape[1]), dtype=np.float32)
+            matrix[start : start + len(block)] = block  # noqa: E203
+            done += len(block)
+            if progress is not None:
+                progress(done, total, time.perf_counter() - start_time)
+        assert matrix is not None and done == total
+        self.matrix = matrix
+        self._sq_norms = np.einsum("ij,ij->i", matrix, matrix)
         if faiss:
-            dim = arr.shape[1]
+            dim = matrix.shape[1]
             self.index = faiss.IndexFlatL2(dim)
-            self.index.add(arr)
+            self.index.add(matrix)
         else:
             self.index = None
+        elapsed = time.perf_counter() - start_time
+        self.build_stats = {
+            "docs": total,
+            "seconds": elapsed,
+            "docs_per_sec": total / elapsed if elapsed > 0 else 0.0,
+        }
+        logger.info(
+            f"Built vector index: {total} docs in {elapsed:.2f}s"
+            f" ({self.build_stats['docs_per_sec']:.1f} docs/s)"
+        )
 
-    def query(self, text: str, top_k: int = 1) -> List[str]:
-        """クエリテキストとの類似度検索を行い、上位 top_k のドキュメントを返す"""
-        qvec_raw = self.embedder.embed_text(text)
-        query_vec = np.array(qvec_raw, dtype="float32")
+    def _make_writable(self) -> None:
+        """mmap で読み込んだ文書テーブル・FAISSインデックスを書き換え可能なものに置き換える"""
+        if not isinstance(self.docs, list):
+            self.docs = list(self.docs)
+        if self.index is not None and getattr(self, "_mapped_index", False):
+            # ファイルを参照している FAISS インデックスは add/remove できないため作り直す
+            index = faiss.IndexFlatL2(self.matrix.shape[1])
+            index.add(np.ascontiguousarray(self.matrix, dtype=np.float32))
+            self.index = index
+            self._mapped_index = False
+
+    def add(self, docs: List[str], vectors: Optional[Any] = None) -> List[int]:
+        """
+        文書を末尾に追加し、追加した位置を返す。vectors を省略すると埋め込み器で埋め込む。
+        FAISSインデックスには追加分だけを add する。
+        """
+        if not docs:
+            return []
+        if vectors is None:
+            vectors = [v for _, block in self._iter_embeddings(docs) for v in block]
+        block = np.asarray(vectors, dtype=np.float32).reshape(len(docs), -1)
+        self._make_writable()
+        start = len(self.docs)
+        if start == 0:
+            self.matrix = np.ascontiguousarray(block)
+            self._sq_norms = np.einsum("ij,ij->i", block, block)
+            self.index = faiss.IndexFlatL2(block.shape[1]) if faiss else None
+        else:
+            self.matrix = np.concatenate([self.matrix, block])
+            self._sq_norms = np.concatenate(
+                [self._sq_norms, np.einsum("ij,ij->i", block, block)]
+            )
         if self.index is not None:
-            vec = np.array([query_vec], dtype="float32")
-            _, idxs = self.index.search(vec, top_k)
-            idxs = idxs[0]
+            self.index.add(block)
+        self.docs.extend(docs)
+        return list(range(start, start + len(docs)))
+
+    def remove(self, positions: Iterable[int]) -> None:
+        """
+        指定位置の文書を削除する。後続の文書は前に詰まり、順序は保たれる
+        （FAISS IndexFlat の remove_ids と同じ番号の付け直し）。
+        """
+        drop = np.unique(np.fromiter(positions, dtype=np.int64))
+        if not len(drop):
+            return
+        self._make_writable()
+        keep = np.ones(len(self.docs), dtype=bool)
+        keep[drop] = False
+        self.matrix = np.array(self.matrix[keep], dtype=np.float32)
+        self._sq_norms = np.array(self._sq_norms[keep], dtype=np.float32)
+        self.docs = [doc for doc, k in zip(self.docs, keep) if k]
+        if self.index is not None:
+            self.index.remove_ids(faiss.IDSelectorBatch(drop))
+
+    def _brute_force_search(
+        self, queries: np.ndarray, top_k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        全文書との二乗L2距離を ||q||^2 - 2 q・x + ||x||^2 の行列演算でまとめて求め、
+        argpartition で上位 top_k だけを取り出して距離順に並べる。
+        """
+        n = self.matrix.shape[0]
+        k = min(top_k, n)
+        dists_out = np.empty((len(queries), k), dtype=np.float32)
+        idxs_out = np.empty((len(queries), k), dtype=np.int64)
+        if k == 0:
+            return dists_out, idxs_out
+        # 距離行列が大きくなりすぎないようクエリを分割する
+        block = max(1, SEARCH_BLOCK_ELEMENTS // n)
+        for start in range(0, len(queries), block):
+            q = queries[start : start + block]  # noqa: E203
+            dists = q @ self.matrix.T
+            dists *= -2
+            dists += self._sq_norms
+            dists += np.einsum("ij,ij->i", q, q)[:, None]
+            if k < n:
+                part = np.argpartition(dists, k - 1, axis=1)[:, :k]
+            else:
+                part = np.broadcast_to(np.arange(n), dists.shape)
+            part_dists = np.take_along_axis(dists, part, axis=1)
+            order = np.argsort(part_dists, axis=1, kind="stable")
+            rows = slice(start, start + len(q))
+            idxs_out[rows] = np.take_along_axis(part, order, axis=1)
+            dists_out[rows] = np.take_along_axis(part_dists, order, axis=1)
+        return dists_out, idxs_out
+
+    def search_vectors(
+        self, queries: np.ndarray, top_k: int = 1
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (クエリ数, 次元) のベクトルで検索し、(二乗L2距離, 文書番号) を返す。
+        FAISSインデックスがなければ総当たりの行列演算で検索する。
+        """
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[None, :]
+        if self.index is not None:
+            return self.index.search(queries, top_k)
+        return self._brute_force_search(queries, top_k)
+
+    def _embed_queries(self, texts: List[str]) -> np.ndarray:
+        if hasattr(self.embedder, "embed_texts"):
+            vectors = self.embedder.embed_texts(texts)
         else:
-            # brute-force search
-            dists = [np.linalg.norm(query_vec - emb) for emb in self.embeddings]
-            idxs = np.argsort(dists)[:top_k]
-        results: List[str] = []
-        for i in idxs:
-            if 0 <= i < len(self.docs):
-                results.append(self.docs[i])
-        return results
+            vectors = [self.embedder.embed_text(t) for t in texts]
+        return np.asarray(vectors, dtype=np.float32)
+
+    def _docs_for(self, idxs: np.ndarray) -> List[str]:
+        return [self.docs[i] for i in idxs if 0 <= i < len(self.docs)]
+
+    def query(self, text: str, top_k: int = 1) -> List[str]:
+        """クエリテキストとの類似度検索を行い、上位 top_k のドキュメントを返す"""
+        query_vec = np.asarray(self.embedder.embed_text(text), dtype=np.float32)
+        _, idxs = self.search_vectors(query_vec, top_k)
+        return self._docs_for(idxs[0])
+
+    def query_many(self, texts: List[str], top_k: int = 1) -> List[List[str]]:
+        """複数クエリをまとめて埋め込み、1回の行列演算で検索する（結果は入力順）"""
+        if not texts:
+            return []
+        _, idxs = self.search_vectors(self._embed_queries(texts), top_k)
+        return [self._docs_for(row) for row in idxs]
@@ -3,15 +3,31 @@
 import logging
 import os
 import time
+from functools import partial
 
 from dotenv import load_dotenv
 
-from src.phase2.transform import parse_order
-from src.phase3.message import build_order_notification
+from src.phase2.async_llm import LLMExtractionError, start_llm_extractor
+from src.phase2.extraction_router import get_default_router
+from src.phase2.pdf_worker import (
+    PdfExtractionError,
+    PdfExtractionService,
+    create_pdf_extraction_service,
+)
+from src.phase3.message import (
+    build_manual_review_notification,
+    build_order_notification,
+)
 from src.phase3.slack_app import slack_app
-from src.phase4.notion_client import NotionClient
+from src.phase4.notion_client import NotionClient, get_notion_client
 from src.phase4.order_service import OrderService
 from src.phase7.email_listener import EmailListener, parse_email_body
+from src.phase7.pipeline import (
+    PipelineStage,
+    StagedPipeline,
+    build_extracted,
+    extract_with_pdf_service,
+)
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
@@ -28,19 +44,117 @@ if not os.getenv("SLACK_BOT_TOKEN") or not os.getenv("SLACK_SIGNING_SECRET"):
 
 # ポーリング間隔（秒）
 POLL_INTERVAL = int(os.getenv("IMAP_POLL_INTERVAL", "60"))
+# IMAP IDLE による新着待ち（サーバ非対応時はポーリングにフォールバック）
+USE_IDLE = os.getenv("IMAP_IDLE", "1").lower() not in ("0", "false", "no")
 # 通知先Slackチャンネル
 SLACK_CHANNEL = os.getenv("SLACK_CHANNEL")
+# パイプラインのステージ別ワーカー数とステージ間キューの上限
+PARSE_WORKERS = int(os.getenv("BRIDGE_PARSE_WORKERS", "2"))
+# 注文抽出のスレッド数（PDF解析自体は PDF_WORKERS 個のワーカープロセスで実行）
+EXTRACT_WORKERS = int(os.getenv("BRIDGE_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+# LLM 抽出の同時実行数。抽出スレッドは LLM 応答待ちで塞がるため、この数以上は確保する
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+STOCK_WORKERS = int(os.getenv("BRIDGE_STOCK_WORKERS", "4"))
+NOTIFY_WORKERS = int(os.getenv("BRIDGE_NOTIFY_WORKERS", "2"))
+QUEUE_SIZE = int(os.getenv("BRIDGE_QUEUE_SIZE", "50"))
+# 商品カタログの再読み込み間隔（秒）。Notion で追加された商品を再起動なしで反映する
+CATALOG_REFRESH_INTERVAL = int(os.getenv("BRIDGE_CATALOG_REFRESH_INTERVAL", "300"))
+
+
+def check_stock_stage(order_service: OrderService, extracted_order):
+    """抽出結果を通知用データに変換し、在庫を一括確認する"""
+    text, order = extracted_order
+    extracted, items = build_extracted(order)
+    # 在庫チェック: 全アイテムの在庫を一括取得して確認
+    in_stock = order_service.check_stocks(items)
+    return text, extracted, in_stock
+
+
+def notify_stage(checked):
+    """Slack通知メッセージを生成して投稿する"""
+    text, extracted, in_stock = checked
+    payload = build_order_notification(
+        original_text=text,
+        extracted=extracted,
+        in_stock=in_stock,
+    )
+    logger.info(f"Posting notification to Slack channel {SLACK_CHANNEL}")
+    slack_app.client.chat_postMessage(
+        channel=SLACK_CHANNEL,
+        **payload,
+    )
+
+
+def route_to_manual_review(stage: str, item, error: Exception) -> None:
+    """
+    PDF/LLM抽出のタイムアウト・失敗は破棄せず、手動確認依頼として通知する。
+    抽出ステージでの LLM 応答の JSON パース失敗（ValueError）やタイムアウトも対象。
+    """
+    manual = isinstance(error, (PdfExtractionError, LLMExtractionError)) or (
+        stage == "extract" and isinstance(error, (ValueError, TimeoutError))
+    )
+    if not manual:
+        return
+    logger.warning(f"Routing order to manual review ({stage}): {error}")
+    payload = build_manual_review_notification(item, str(error))
+    try:
+        slack_app.client.chat_postMessage(channel=SLACK_CHANNEL, **payload)
+    except Exception as e:
+        logger.error(f"Failed to post manual review request: {e}", exc_info=True)
+
+
+def refresh_catalog(notion: NotionClient) -> bool:
+    """
+    抽出結果の商品IDを照合する商品カタログを Notion の商品DBから読み直す。
+    失敗時は現在のカタログを使い続け、False を返す。
+    """
+    try:
+        get_default_router().set_catalog(notion.list_product_identifiers())
+    except Exception as e:
+        logger.warning(f"Could not load product catalog for extraction routing: {e}")
+        return False
+    return True
+
+
+def build_pipeline(
+    order_service: OrderService, pdf_service: PdfExtractionService
+) -> StagedPipeline:
+    """parse → extract → stock-check → notify のパイプラインを構築する"""
+    return StagedPipeline(
+        [
+            PipelineStage("parse", parse_email_body, workers=PARSE_WORKERS),
+            PipelineStage(
+                "extract",
+                partial(extract_with_pdf_service, pdf_service),
+                workers=max(1, EXTRACT_WORKERS, LLM_MAX_CONCURRENCY),
+            ),
+            PipelineStage(
+                "stock-check",
+                partial(check_stock_stage, order_service),
+                workers=STOCK_WORKERS,
+            ),
+            PipelineStage("notify", notify_stage, workers=NOTIFY_WORKERS),
+        ],
+        queue_size=QUEUE_SIZE,
+        on_error=route_to_manual_review,
+    )
 
 
 def main():
     if not SLACK_CHANNEL:
         raise ValueError("Missing SLACK_CHANNEL environment variable")
     listener = EmailListener()
-    notion = NotionClient()
+    notion = get_notion_client()
     order_service = OrderService(notion)
+    pdf_service = create_pdf_extraction_service()
+    # 抽出結果の商品IDを商品DBと照合し、一致しない文書だけを LLM に回す
+    catalog_loaded_at = time.monotonic() if refresh_catalog(notion) else None
+    # 1回のポーリング分のメールの LLM 抽出を共有ループで並行に実行する
+    start_llm_extractor()
+    pipeline = build_pipeline(order_service, pdf_service).start()
 
     logger.info(
-        f"Starting email->Slack bridge: poll_interval={POLL_INTERVAL}s, channel={SLACK_CHANNEL}"
+        f"Starting email->Slack bridge: poll_interval={POLL_INTERVAL}s, idle={USE_IDLE}, channel={SLACK_CHANNEL}"
     )
 
     while True:
@@ -52,49 +166,27 @@ def main():
             time.sleep(POLL_INTERVAL)
             continue
         logger.info(f"  → found {len(raws)} unseen email(s)")
+        # 新着を処理する前に、期限切れ（または前回失敗）のカタログを読み直す
+        if raws and (
+            catalog_loaded_at is None
+            or time.monotonic() - catalog_loaded_at >= CATALOG_REFRESH_INTERVAL
+        ):
+            if refresh_catalog(notion):
+                catalog_loaded_at = time.monotonic()
+        # キューが満杯の間は投入がブロックされ、取り込みが処理速度に合わせて抑制される
         for raw in raws:
+            pipeline.submit(raw)
+        logger.debug(f"Pipeline queue depths: {pipeline.queue_depths()}")
+        logger.debug(f"Extraction routing: {get_default_router().metrics()}")
+        if USE_IDLE:
             try:
-                text = parse_email_body(raw)
-                # 注文抽出 (単一または複数)
-                order = parse_order(text)
-                # extracted データ構造を生成
-                if isinstance(order, list):
-                    # マルチ商品注文
-                    items = [
-                        {"product_id": o.product_id, "quantity": o.quantity}
-                        for o in order
-                    ]
-                    extracted = {
-                        "customer_name": order[0].customer_name,
-                        "items": items,
-                    }
-                    # 配送日が取得できていれば追加
-                    if order[0].delivery_date:
-                        extracted["delivery_date"] = order[0].delivery_date
-                    # メールアドレスが本文にあれば追加
-                    # 在庫チェック: 全アイテムが在庫あり
-                    in_stock = all(
-                        order_service.check_stock(o.product_id, o.quantity)
-                        for o in order
-                    )
-                else:
-                    extracted = vars(order)
-                    in_stock = order_service.check_stock(
-                        order.product_id, order.quantity
-                    )
-                # Slack通知メッセージ生成
-                payload = build_order_notification(
-                    original_text=text,
-                    extracted=extracted,
-                    in_stock=in_stock,
-                )
-                logger.info(f"Posting notification to Slack channel {SLACK_CHANNEL}")
-                slack_app.client.chat_postMessage(
-                    channel=SLACK_CHANNEL,
-                    **payload,
-                )
+                # 新着通知で即座に復帰。IMAP_IDLE_TIMEOUT ごとに再検索して IDLE を張り直す
+                if listener.supports_idle():
+                    listener.wait_for_new_mail()
+                    continue
             except Exception as e:
-                logger.error(f"Failed to process email: {e}", exc_info=True)
+                logger.warning(f"IMAP IDLE failed, falling back to polling: {e}")
+                listener.mail = None
         time.sleep(POLL_INTERVAL)
 
 
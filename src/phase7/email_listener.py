@@ -3,6 +3,10 @@ import email
 import imaplib
 import logging
 import os
+import re
+import select
+import time
+from typing import Any, Dict, List, Optional, Tuple
 
 try:
     from dotenv import load_dotenv
@@ -19,6 +23,148 @@ load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# IDLE はサーバ側で29分程度で切断されるため、それより前に張り直す（秒）
+IDLE_TIMEOUT = int(os.getenv("IMAP_IDLE_TIMEOUT", "1500"))
+# IDLE 開始/終了応答を待つ上限（秒）
+IDLE_RESPONSE_TIMEOUT = 30
+# 1回の UID FETCH で取得するメッセージ数の上限
+FETCH_CHUNK_SIZE = int(os.getenv("IMAP_FETCH_CHUNK_SIZE", "100"))
+
+
+def _uid_set(uids: List[bytes]) -> str:
+    """UIDリストを "1:3,7" 形式のメッセージセットに変換する"""
+    nums = sorted({int(u) for u in uids})
+    ranges = []
+    start = prev = nums[0]
+    for n in nums[1:]:
+        if n == prev + 1:
+            prev = n
+            continue
+        ranges.append(f"{start}:{prev}" if start != prev else str(start))
+        start = prev = n
+    ranges.append(f"{start}:{prev}" if start != prev else str(start))
+    return ",".join(ranges)
+
+
+_TOKEN_RE = re.compile(
+    rb'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|\{(\d+)\}\r\n|([^\s()"{]+))'
+)
+
+
+def _parse_imap_data(data: bytes) -> List[Any]:
+    """IMAP応答を入れ子リストに変換する（NILはNone、文字列/アトムはbytes）"""
+    stack: List[List[Any]] = [[]]
+    pos = 0
+    while pos < len(data):
+        m = _TOKEN_RE.match(data, pos)
+        if not m:
+            break
+        pos = m.end()
+        if m.group(1):
+            stack.append([])
+        elif m.group(2):
+            if len(stack) > 1:
+                inner = stack.pop()
+                stack[-1].append(inner)
+        elif m.group(3) is not None:
+            stack[-1].append(re.sub(rb"\\(.)", rb"\1", m.group(3)))
+        elif m.group(4) is not None:
+            size = int(m.group(4))
+            stack[-1].append(data[pos : pos + size])  # noqa: E203
+            pos += size
+        else:
+            atom = m.group(5)
+            stack[-1].append(None if atom.upper() == b"NIL" else atom)
+    while len(stack) > 1:
+        inner = stack.pop()
+        stack[-1].append(inner)
+    return stack[0]
+
+
+def _parse_fetch_response(data: List[Any]) -> Dict[bytes, Dict[str, Any]]:
+    """UID FETCH 応答を UID→{項目名: 値} に変換する"""
+    chunks = []
+    for part in data:
+        if isinstance(part, tuple):
+            # imaplib はリテラルを (前置部 "{n}", 本体) のタプルで返す
+            chunks.append(part[0] + b"\r\n" + part[1])
+        elif isinstance(part, bytes):
+            chunks.append(b" " + part)
+    tokens = _parse_imap_data(b"".join(chunks))
+    results: Dict[bytes, Dict[str, Any]] = {}
+    for tok in tokens:
+        if not isinstance(tok, list):
+            continue
+        fields: Dict[str, Any] = {}
+        for key, value in zip(tok[0::2], tok[1::2]):
+            if isinstance(key, bytes):
+                name = key.decode(errors="replace").upper()
+                # BODY.PEEK[1] の応答は BODY[1]、部分取得の <0> は除去
+                fields[re.sub(r"<\d+>$", "", name)] = value
+        uid = fields.get("UID")
+        if uid is not None:
+            results[uid] = fields
+    return results
+
+
+def _part_wanted(part: List[Any]) -> bool:
+    """parse_email_body が使うパート（本文 text/plain と PDF 添付）か判定する"""
+    ctype = b"/".join(p or b"" for p in part[:2]).decode(errors="replace").lower()
+    flat = []
+
+    def walk(x):
+        if isinstance(x, list):
+            for y in x:
+                walk(y)
+        elif isinstance(x, bytes):
+            flat.append(x.decode(errors="replace").lower())
+
+    walk(part[2:])
+    is_attachment = "attachment" in flat
+    has_pdf_name = any(v.endswith(".pdf") for v in flat)
+    if ctype in ("application/pdf", "application/octet-stream") or has_pdf_name:
+        return True
+    return ctype == "text/plain" and not is_attachment
+
+
+def _needed_sections(structure: List[Any], prefix: str = "") -> Optional[List[str]]:
+    """BODYSTRUCTURE から取得が必要なパート番号を返す（単一パートは None）"""
+    if not structure or not isinstance(structure[0], list):
+        return None
+    sections: List[str] = []
+    for idx, child in enumerate(structure):
+        if not isinstance(child, list):
+            break
+        sec = f"{prefix}{idx + 1}"
+        if child and isinstance(child[0], list):
+            sections += _needed_sections(child, f"{sec}.") or []
+        elif _part_wanted(child):
+            sections.append(sec)
+    return sections
+
+
+def _assemble_message(uid: bytes, fields: Dict[str, Any], sections: Tuple[str, ...]):
+    """取得したヘッダと必要パートから multipart/mixed メッセージを組み立てる"""
+    boundary = f"=_partial_{uid.decode()}"
+    header = fields.get("BODY[HEADER]") or b""
+    # 元の Content-Type（継続行含む）を置き換える
+    lines = []
+    skipping = False
+    for line in header.split(b"\r\n"):
+        if skipping and line[:1] in (b" ", b"\t"):
+            continue
+        skipping = line.lower().startswith(b"content-type:")
+        if not skipping and line:
+            lines.append(line)
+    lines.append(f'Content-Type: multipart/mixed; boundary="{boundary}"'.encode())
+    out = [b"\r\n".join(lines), b"\r\n\r\n"]
+    for sec in sections:
+        mime = fields.get(f"BODY[{sec}.MIME]") or b""
+        body = fields.get(f"BODY[{sec}]") or b""
+        out += [f"--{boundary}\r\n".encode(), mime, body, b"\r\n"]
+    out.append(f"--{boundary}--\r\n".encode())
+    return b"".join(out)
+
 
 class EmailListener:
     """IMAPを使って新着メールを取得するリスナー"""
@@ -33,12 +179,22 @@ class EmailListener:
         self.user = user
         self.password = password
         self.mail = None
+        self._idle_supported = None
+        # BODYSTRUCTURE を使って必要なパートだけ取得するか
+        self.fetch_parts = os.getenv("IMAP_FETCH_PARTS", "0").lower() in (
+            "1",
+            "true",
+            "yes",
+        )
+        self.last_poll_stats: Dict[str, int] = {}
 
     def connect(self):
         """IMAPサーバへ接続し、INBOXを選択する"""
         self.mail = imaplib.IMAP4_SSL(self.host)
         self.mail.login(self.user, self.password)
         self.mail.select("INBOX")
+        self._take_pending_new_mail()
+        self._idle_supported = None
         logger.info(f"IMAP connected to {self.host} as {self.user}")
 
     def fetch_unseen_emails(self):
@@ -58,31 +214,234 @@ class EmailListener:
                     # 接続が切れている可能性があるため再接続
                     self.connect()
         logger.debug("Searching for UNSEEN emails")
-        status, data = self.mail.search(None, "UNSEEN")
+        # ここまでに届いた新着はこの SEARCH で拾うため、保留中の EXISTS は破棄する
+        self._take_pending_new_mail()
+        stats = {"messages": 0, "round_trips": 1, "bytes": 0}
+        self.last_poll_stats = stats
+        status, data = self.mail.uid("SEARCH", None, "UNSEEN")
         logger.debug(f"Search result: status={status}, data={data}")
         if status != "OK":
             logger.error("IMAP search failed")
             return []
-        messages = data[0].split()
-        results = []
-        for num in messages:
-            ok, parts = self.mail.fetch(num, "(RFC822)")
+        uids = data[0].split() if data and data[0] else []
+        if not uids:
+            return []
+        fetched: Dict[bytes, bytes] = {}
+        for start in range(0, len(uids), FETCH_CHUNK_SIZE):
+            chunk = uids[start : start + FETCH_CHUNK_SIZE]  # noqa: E203
+            if self.fetch_parts:
+                fetched.update(self._fetch_needed_parts(chunk, stats))
+            else:
+                fetched.update(self._uid_fetch(chunk, "(RFC822)", "RFC822", stats))
+        # 取得できたメールをまとめて既読に設定
+        if fetched:
+            self.mail.uid("STORE", _uid_set(list(fetched)), "+FLAGS", "(\\Seen)")
+            stats["round_trips"] += 1
+            logger.info(f"{len(fetched)} email(s) flagged as Seen on server")
+        results = [fetched[uid] for uid in uids if uid in fetched]
+        stats["messages"] = len(results)
+        stats["bytes"] = sum(len(raw) for raw in results)
+        logger.info(
+            "IMAP poll: messages=%d round_trips=%d fetched_bytes=%d",
+            stats["messages"],
+            stats["round_trips"],
+            stats["bytes"],
+        )
+        return results
+
+    def _uid_fetch(
+        self, uids: List[bytes], items: str, key: str, stats: Dict[str, int]
+    ) -> Dict[bytes, bytes]:
+        """UID FETCH を1往復で実行し、UID→指定項目の値を返す"""
+        ok, data = self.mail.uid("FETCH", _uid_set(uids), items)
+        stats["round_trips"] += 1
+        if ok != "OK":
+            logger.warning(f"Failed to fetch emails {uids!r}")
+            return {}
+        return {
+            uid: fields[key]
+            for uid, fields in _parse_fetch_response(data).items()
+            if fields.get(key) is not None
+        }
+
+    def _fetch_needed_parts(
+        self, uids: List[bytes], stats: Dict[str, int]
+    ) -> Dict[bytes, bytes]:
+        """
+        BODYSTRUCTURE を先に取得し、本文(text/plain)とPDF添付のパートだけをダウンロードして
+        parse_email_body で扱える MIME メッセージに組み立て直す
+        """
+        ok, data = self.mail.uid("FETCH", _uid_set(uids), "(BODYSTRUCTURE)")
+        stats["round_trips"] += 1
+        if ok != "OK":
+            logger.warning(f"Failed to fetch BODYSTRUCTURE for {uids!r}")
+            return {}
+        # 必要パートの組み合わせが同じメッセージをまとめて1回で取得する
+        groups: Dict[Tuple[str, ...], List[bytes]] = {}
+        for uid, fields in _parse_fetch_response(data).items():
+            structure = fields.get("BODYSTRUCTURE")
+            sections = _needed_sections(structure) if structure else None
+            groups.setdefault(tuple(sections or ()), []).append(uid)
+        results: Dict[bytes, bytes] = {}
+        for sections, group in groups.items():
+            if not sections:
+                # 単一パートや構造不明のメールは全体を取得
+                results.update(self._uid_fetch(group, "(RFC822)", "RFC822", stats))
+                continue
+            items = ["BODY.PEEK[HEADER]"]
+            for sec in sections:
+                items += [f"BODY.PEEK[{sec}.MIME]", f"BODY.PEEK[{sec}]"]
+            ok, data = self.mail.uid("FETCH", _uid_set(group), f"({' '.join(items)})")
+            stats["round_trips"] += 1
             if ok != "OK":
-                logger.warning(f"Failed to fetch email {num!r}")
+                logger.warning(f"Failed to fetch parts for {group!r}")
                 continue
-            raw = parts[0][1]
-            results.append(raw)
-            # 取得したメールを既読に設定
-            self.mail.store(num, "+FLAGS", "\\Seen")
-            logger.info(f"Email {num!r} flagged as Seen on server")
+            for uid, fields in _parse_fetch_response(data).items():
+                results[uid] = _assemble_message(uid, fields, sections)
         return results
 
-    def mark_as_seen(self, num):
-        """指定したメッセージ番号を既読にする"""
+    def mark_as_seen(self, *, uid):
+        """
+        UID（UID SEARCH / UID FETCH が返す値）で指定したメッセージを既読にする。
+        以前はメッセージ番号を位置引数で受け取っていたため、取り違えないよう uid= で指定させる。
+        fetch_unseen_emails は取得したメールを自身で既読にするので、呼び出しは不要。
+        """
+        if self.mail is None:
+            self.connect()
+        if isinstance(uid, bytes):
+            uid = uid.decode()
+        self.mail.uid("STORE", str(uid), "+FLAGS", "(\\Seen)")
+        logger.info(f"Email UID {uid} flagged as Seen on server")
+
+    def supports_idle(self) -> bool:
+        """サーバが IDLE 拡張 (RFC 2177) に対応しているか（ログイン後の CAPABILITY で判定）"""
         if self.mail is None:
             self.connect()
-        self.mail.store(num, "+FLAGS", "\\Seen")
-        logger.info(f"Email {num!r} flagged as Seen on server")
+        if self._idle_supported is None:
+            caps = set(getattr(self.mail, "capabilities", ()) or ())
+            try:
+                status, data = self.mail.capability()
+                if status == "OK" and data:
+                    caps |= set(data[0].decode().upper().split())
+            except Exception as e:
+                logger.debug(f"CAPABILITY command failed: {e}")
+            self._idle_supported = "IDLE" in caps
+            logger.info(f"IMAP IDLE supported: {self._idle_supported}")
+        return self._idle_supported
+
+    def _take_pending_new_mail(self) -> bool:
+        """
+        imaplib が通常コマンドの応答中に受け取って保留している "* n EXISTS" を取り出す。
+        SELECT 直後と SEARCH 直前にも呼んで破棄するため、残っていれば SEARCH 以降の新着。
+        """
+        responses = getattr(self.mail, "untagged_responses", None)
+        if not isinstance(responses, dict):
+            return False
+        return responses.pop("EXISTS", None) is not None
+
+    def _idle_session(self) -> Optional[Tuple[bytes, Any]]:
+        """
+        IDLE 用の (コマンドタグ, ソケット) を返す。
+        imaplib には IDLE の公開 API がないため、タグ採番（_new_tag）と生ソケットは
+        imaplib.IMAP4 の内部実装に依存する。これらを持たないクライアントでは None を返し、
+        wait_for_new_mail は IDLE をやめてポーリング（timeout 秒待機）に切り替える。
+        """
+        new_tag = getattr(self.mail, "_new_tag", None)
+        sock = getattr(self.mail, "sock", None)
+        if new_tag is None or sock is None:
+            return None
+        if not hasattr(self.mail, "send") or not hasattr(self.mail, "tagged_commands"):
+            return None
+        return new_tag(), sock
+
+    def wait_for_new_mail(self, timeout: float = None) -> bool:
+        """
+        IDLE で新着メールを待つ。新着 (EXISTS/RECENT) を受信したら即座に True を返し、
+        timeout 秒（最大 IMAP_IDLE_TIMEOUT）経過で False を返す。
+        IDLE 非対応サーバでは timeout 秒待機するだけのポーリング動作になる。
+        """
+        timeout = IDLE_TIMEOUT if timeout is None else min(timeout, IDLE_TIMEOUT)
+        if not self.supports_idle():
+            time.sleep(timeout)
+            return False
+        # 直前の SEARCH/FETCH/STORE 中に届いた新着は IDLE 中には再通知されない
+        if self._take_pending_new_mail():
+            logger.debug("New mail arrived before IDLE")
+            return True
+        session = self._idle_session()
+        if session is None:
+            logger.warning("IMAP client does not expose IDLE internals; polling")
+            self._idle_supported = False
+            time.sleep(timeout)
+            return False
+        mail = self.mail
+        tag, sock = session
+        buf = b""
+        new_mail = False
+
+        def read_line(deadline):
+            # IDLE 中は imaplib のバッファを介さずソケットから直接行単位で読む
+            nonlocal buf
+            while b"\r\n" not in buf:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                pending = getattr(sock, "pending", lambda: 0)()
+                if not pending and not select.select([sock], [], [], remaining)[0]:
+                    return None
+                chunk = sock.recv(4096)
+                if not chunk:
+                    raise ConnectionError("IMAP connection closed during IDLE")
+                buf += chunk
+            line, buf = buf.split(b"\r\n", 1)
+            return line
+
+        def is_new_mail(line):
+            parts = line.split()
+            return (
+                len(parts) >= 3
+                and parts[0] == b"*"
+                and parts[2].upper() in (b"EXISTS", b"RECENT")
+            )
+
+        try:
+            mail.send(tag + b" IDLE\r\n")
+            # 継続応答 "+" を待つ
+            deadline = time.monotonic() + IDLE_RESPONSE_TIMEOUT
+            while True:
+                line = read_line(deadline)
+                if line is None:
+                    raise TimeoutError("No continuation response to IDLE")
+                if line.startswith(b"+"):
+                    break
+                if line.startswith(tag):
+                    logger.warning(f"IDLE rejected by server: {line!r}")
+                    self._idle_supported = False
+                    return False
+                new_mail = new_mail or is_new_mail(line)
+            logger.debug("IMAP IDLE started")
+            # 新着通知またはタイムアウトまで待機
+            deadline = time.monotonic() + timeout
+            while not new_mail:
+                line = read_line(deadline)
+                if line is None:
+                    break
+                logger.debug(f"IDLE notification: {line!r}")
+                new_mail = is_new_mail(line)
+            # IDLE 終了
+            mail.send(b"DONE\r\n")
+            deadline = time.monotonic() + IDLE_RESPONSE_TIMEOUT
+            while True:
+                line = read_line(deadline)
+                if line is None:
+                    raise TimeoutError("No tagged response after IDLE DONE")
+                if line.startswith(tag):
+                    break
+                new_mail = new_mail or is_new_mail(line)
+        finally:
+            mail.tagged_commands.pop(tag, None)
+        logger.debug(f"IMAP IDLE finished: new_mail={new_mail}")
+        return new_mail
 
 
 def parse_email_body(raw_email: bytes) -> str:
@@ -0,0 +1,173 @@
+"""Phase7: メール注文処理のステージ分割パイプライン
+
+fetch → parse → extract → stock-check → notify の各ステージを有界キューで繋ぎ、
+ステージごとのワーカー数で並列処理する。下流が詰まるとキューが満杯になり、
+上流の put がブロックすることで取り込み速度を抑える（バックプレッシャー）。
+"""
+import logging
+import queue
+import threading
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.phase2.extraction_cache import get_default_extraction_cache
+from src.phase2.pdf_worker import PdfExtractionService
+from src.phase2.transform import parse_order
+
+logger = logging.getLogger(__name__)
+
+# ステージ終了を伝える番兵
+_STOP = object()
+
+
+@dataclass
+class PipelineStage:
+    """パイプラインの1ステージ（func が None を返した要素は下流へ流さない）"""
+
+    name: str
+    func: Callable[[Any], Any]
+    workers: int = 1
+    # CPU負荷の高い処理をプロセスプール等で実行する場合に指定
+    executor: Optional[Executor] = None
+
+
+class StagedPipeline:
+    """ステージ間を有界キューで繋ぎ、ステージごとのスレッドで処理するパイプライン"""
+
+    def __init__(
+        self,
+        stages: List[PipelineStage],
+        queue_size: int = 100,
+        on_error: Optional[Callable[[str, Any, Exception], None]] = None,
+    ):
+        self.stages = stages
+        self.queues: List["queue.Queue[Any]"] = [
+            queue.Queue(maxsize=queue_size) for _ in stages
+        ]
+        self.on_error = on_error
+        self._threads: List[List[threading.Thread]] = []
+        self._lock = threading.Lock()
+        self.stats: Dict[str, Dict[str, int]] = {
+            stage.name: {"processed": 0, "failed": 0, "dropped": 0} for stage in stages
+        }
+
+    def start(self) -> "StagedPipeline":
+        for idx, stage in enumerate(self.stages):
+            threads = [
+                threading.Thread(
+                    target=self._work,
+                    args=(idx,),
+                    name=f"pipeline-{stage.name}-{n}",
+                    daemon=True,
+                )
+                for n in range(max(1, stage.workers))
+            ]
+            for t in threads:
+                t.start()
+            self._threads.append(threads)
+        return self
+
+    def submit(self, item: Any, timeout: Optional[float] = None) -> None:
+        """先頭ステージへ投入（キュー満杯時はブロック）"""
+        self.queues[0].put(item, timeout=timeout)
+
+    def _count(self, stage: str, key: str) -> None:
+        with self._lock:
+            self.stats[stage][key] += 1
+
+    def _work(self, idx: int) -> None:
+        stage = self.stages[idx]
+        inbox = self.queues[idx]
+        outbox = self.queues[idx + 1] if idx + 1 < len(self.queues) else None
+        while True:
+            item = inbox.get()
+            try:
+                if item is _STOP:
+                    return
+                try:
+                    if stage.executor is not None:
+                        result = stage.executor.submit(stage.func, item).result()
+                    else:
+                        result = stage.func(item)
+                except Exception as e:
+                    self._count(stage.name, "failed")
+                    logger.error(
+                        f"Pipeline stage '{stage.name}' failed: {e}", exc_info=True
+                    )
+                    if self.on_error:
+                        self.on_error(stage.name, item, e)
+                    continue
+                self._count(stage.name, "processed")
+                if result is None:
+                    self._count(stage.name, "dropped")
+                elif outbox is not None:
+                    outbox.put(result)
+            finally:
+                inbox.task_done()
+
+    def wait_idle(self) -> None:
+        """投入済みの要素が全ステージを通過するまで待つ"""
+        for q in self.queues:
+            q.join()
+
+    def close(self) -> None:
+        """投入済みの要素を処理し終えてから全ワーカーを停止する"""
+        for q, threads in zip(self.queues, self._threads):
+            for _ in threads:
+                q.put(_STOP)
+            for t in threads:
+                t.join()
+        self._threads = []
+
+    def queue_depths(self) -> Dict[str, int]:
+        return {stage.name: q.qsize() for stage, q in zip(self.stages, self.queues)}
+
+
+# --- 注文処理ステージ ------------------------------------------------------
+def extract_stage(text: Any) -> Tuple[Any, Any]:
+    """本文（またはPDF付きdict）から注文を抽出する。プロセスプールで実行可能"""
+    cache = get_default_extraction_cache()
+    if cache is not None:
+        return text, cache.get_or_parse(text)
+    return text, parse_order(text)
+
+
+def extract_with_pdf_service(
+    pdf_service: PdfExtractionService, text: Any
+) -> Tuple[Any, Any]:
+    """
+    PDF添付の解析はワーカープロセスで実行し、抽出結果から注文を組み立てる。
+    制限時間超過などは PdfExtractionError としてそのまま送出する。
+    """
+    if isinstance(text, dict) and text.get("pdf") is not None:
+        body = text.get("body", "") or ""
+
+        def parse() -> Any:
+            # 本文がない場合のみ、メタ情報用にPDFのテキストも抽出する
+            pdf = pdf_service.extract(text["pdf"], need_text=not body)
+            return parse_order({"pdf": pdf, "body": body})
+
+        # 再送された同一PDFはワーカーに渡さずキャッシュから返す
+        cache = get_default_extraction_cache()
+        if cache is not None:
+            return text, cache.get_or_parse(text, parse)
+        return text, parse()
+    return extract_stage(text)
+
+
+def build_extracted(order: Any) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """parse_order の結果から Slack 通知用の抽出データと在庫確認対象の明細を作る"""
+    if isinstance(order, list):
+        # マルチ商品注文
+        items = [{"product_id": o.product_id, "quantity": o.quantity} for o in order]
+        extracted: Dict[str, Any] = {
+            "customer_name": order[0].customer_name,
+            "items": items,
+        }
+        # 配送日が取得できていれば追加
+        if order[0].delivery_date:
+            extracted["delivery_date"] = order[0].delivery_date
+        return extracted, items
+    extracted = dict(vars(order))
+    return extracted, [{"product_id": order.product_id, "quantity": order.quantity}]
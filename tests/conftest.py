@@ -18,3 +18,18 @@ def clear_openai_key(monkeypatch):
     特定のテストで real LLM 呼び出しをテストする場合は monkeypatch.setenv を利用してください
     """
     monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+
+
+@pytest.fixture(autouse=True)
+def unthrottled_notion(monkeypatch):
+    """
+    テストでは Notion リクエストの流量制御を無効化する
+    流量制御自体をテストする場合は NotionRequestScheduler を個別に生成してください
+    """
+    import src.phase4.notion_scheduler as notion_scheduler
+
+    monkeypatch.setattr(
+        notion_scheduler,
+        "_default_scheduler",
+        notion_scheduler.NotionRequestScheduler(rate=0),
+    )
@@ -0,0 +1,127 @@
+import asyncio
+import json
+
+import openai
+import pytest
+
+import src.phase2.llm_stub as llm_stub
+from src.phase2.async_llm import (
+    AsyncLLMExtractor,
+    LLMExtractionError,
+    LLMExtractionRunner,
+    LLMExtractionTimeout,
+)
+
+EXPECTED = {
+    "customer_name": "A",
+    "product_id": "P",
+    "quantity": 1,
+    "delivery_date": "2025-01-01",
+}
+
+
+class DummyChoice:
+    def __init__(self, content):
+        self.message = type("M", (), {"content": content})
+
+
+class DummyResp:
+    def __init__(self, content):
+        self.choices = [DummyChoice(content)]
+
+
+@pytest.fixture(autouse=True)
+def api_key(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "dummy")
+
+
+def fake_acreate(monkeypatch, delay=0.05, failures=0, error=None):
+    """acreate を差し替え、呼び出し回数と最大同時実行数を記録する"""
+    state = {"calls": 0, "active": 0, "peak": 0, "failures": failures}
+
+    async def acreate(**kwargs):
+        state["calls"] += 1
+        state["active"] += 1
+        state["peak"] = max(state["peak"], state["active"])
+        try:
+            await asyncio.sleep(delay)
+            if state["failures"] > 0:
+                state["failures"] -= 1
+                raise error
+            return DummyResp(json.dumps(EXPECTED))
+        finally:
+            state["active"] -= 1
+
+    monkeypatch.setattr(openai.ChatCompletion, "acreate", acreate)
+    return state
+
+
+def test_extract_many_limits_concurrency(monkeypatch):
+    state = fake_acreate(monkeypatch)
+    extractor = AsyncLLMExtractor(max_concurrency=3)
+    texts = [f"注文のお願い-{i}" for i in range(10)]
+    results = asyncio.run(extractor.extract_many(texts))
+    assert results == [EXPECTED] * 10
+    assert state["calls"] == 10
+    assert state["peak"] == 3
+
+
+def test_identical_texts_share_one_request(monkeypatch):
+    state = fake_acreate(monkeypatch)
+    extractor = AsyncLLMExtractor()
+    results = asyncio.run(extractor.extract_many(["same"] * 5 + ["other"]))
+    assert results == [EXPECTED] * 6
+    assert state["calls"] == 2
+    assert extractor.stats.coalesced == 4
+    # 呼び出し側ごとに別オブジェクト
+    assert results[0] is not results[1]
+
+
+def test_rate_limit_is_retried_with_backoff(monkeypatch):
+    error = openai.error.RateLimitError("slow down", headers={"retry-after": "0.01"})
+    state = fake_acreate(monkeypatch, delay=0, failures=2, error=error)
+    extractor = AsyncLLMExtractor(max_retries=3)
+    assert asyncio.run(extractor.extract("text")) == EXPECTED
+    assert state["calls"] == 3
+    assert extractor.stats.retries == 2
+
+
+def test_rate_limit_gives_up_after_max_retries(monkeypatch):
+    error = openai.error.RateLimitError("slow down")
+    fake_acreate(monkeypatch, delay=0, failures=10, error=error)
+    extractor = AsyncLLMExtractor(max_retries=1, backoff_base=0.01)
+    results = asyncio.run(extractor.extract_many(["a", "b"]))
+    assert all(isinstance(r, LLMExtractionError) for r in results)
+    assert extractor.stats.errors == 2
+
+
+def test_timeout_raises(monkeypatch):
+    fake_acreate(monkeypatch, delay=1.0)
+    extractor = AsyncLLMExtractor(timeout=0.05)
+    with pytest.raises(LLMExtractionTimeout):
+        asyncio.run(extractor.extract("text"))
+    assert extractor.stats.timeouts == 1
+
+
+def test_rule_based_formats_skip_llm(monkeypatch):
+    state = fake_acreate(monkeypatch)
+    text = "商品 数量\nA001 2\nB002 3\n"
+    result = asyncio.run(AsyncLLMExtractor().extract(text))
+    assert result == llm_stub.extract_rule_based(text)
+    assert state["calls"] == 0
+
+
+def test_sync_extract_delegates_to_running_extractor(monkeypatch):
+    state = fake_acreate(monkeypatch)
+    monkeypatch.setattr(
+        openai.ChatCompletion,
+        "create",
+        lambda **kwargs: pytest.fail("blocking API must not be used"),
+    )
+    with LLMExtractionRunner(AsyncLLMExtractor(max_concurrency=2)) as runner:
+        monkeypatch.setattr(
+            "src.phase2.async_llm.get_running_llm_extractor", lambda: runner
+        )
+        assert llm_stub.extract_order_fields("dummy") == EXPECTED
+        assert runner.extract_batch(["x", "y", "x"]) == [EXPECTED] * 3
+    assert state["calls"] == 3
@@ -0,0 +1,67 @@
+from datetime import date
+
+from src.phase2.extraction_cache import ExtractionCache
+from src.phase2.transform import OrderData
+
+TEXT = "顧客: テスト商店\n商品: A001\n数量: 2\n配送希望日: 2025-08-01\n"
+
+
+def test_cache_hits_on_identical_content(tmp_path):
+    cache = ExtractionCache(str(tmp_path / "cache.db"))
+    calls = []
+
+    def parse():
+        calls.append(1)
+        return [
+            OrderData("テスト商店", "A001", 2, date(2025, 8, 1)),
+            OrderData("テスト商店", "B002", 3, None),
+        ]
+
+    email = {"pdf": b"%PDF-1.4 same", "body": "顧客: テスト商店"}
+    first = cache.get_or_parse(email, parse)
+    # 改行コード・行末空白の違いは同一視する
+    resend = {"pdf": b"%PDF-1.4 same", "body": "顧客: テスト商店 \r\n"}
+    assert cache.get_or_parse(resend, parse) == first
+    assert len(calls) == 1
+    # PDFが異なれば別エントリ
+    cache.get_or_parse({"pdf": b"%PDF-1.4 other", "body": "顧客: テスト商店"}, parse)
+    assert len(calls) == 2
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["hit_rate"] == 1 / 3
+
+    # 単一注文は OrderData のまま復元され、ファイルを開き直しても残る
+    single = cache.get_or_parse(TEXT)
+    assert isinstance(single, OrderData)
+    cache.close()
+    reopened = ExtractionCache(str(tmp_path / "cache.db"))
+    assert reopened.get(reopened.key_for(TEXT)) == single
+
+
+def test_cache_lru_eviction_and_version_invalidation(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = ExtractionCache(path, max_entries=2)
+    order = OrderData("C", "A001", 1, date(2025, 1, 1))
+    for body in ("a", "b"):
+        cache.put(cache.key_for(body), order)
+    assert cache.get(cache.key_for("a")) == order  # a を最近参照にする
+    cache.put(cache.key_for("c"), order)
+    assert cache.get(cache.key_for("b")) is None
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["size"] == 2
+    cache.close()
+
+    # 抽出ロジックのバージョンが変わると旧エントリは参照されず、掃除できる
+    upgraded = ExtractionCache(path, version="2")
+    assert upgraded.get(upgraded.key_for("a")) is None
+    assert upgraded.invalidate(all_versions=False) == 2
+    assert upgraded.stats()["size"] == 0
+
+
+def test_cache_keeps_line_structure_and_characters():
+    cache = ExtractionCache()
+    one_line = cache.key_for("商品: A001 数量: 2 商品: B002 数量: 3")
+    two_lines = cache.key_for("商品: A001 数量: 2\n商品: B002 数量: 3")
+    assert one_line != two_lines
+    assert two_lines == cache.key_for("商品: A001 数量: 2  \r\n商品: B002 数量: 3\r\n")
+    # 全角の商品ID・数量は半角に畳み込まない
+    assert cache.key_for("商品: Ａ００１") != cache.key_for("商品: A001")
@@ -0,0 +1,103 @@
+import json
+
+import pytest
+
+import src.phase2.llm_stub as llm_stub
+from src.phase2.extraction_router import ExtractionRouter
+
+FULL_TEXT = """顧客: テスト店
+商品: B123
+数量: 2
+配送希望日: 2025-08-01
+"""
+
+
+def fail_llm(text):
+    pytest.fail("LLM must not be called for confident documents")
+
+
+def test_score_weights_required_fields_catalog_and_quantity():
+    router = ExtractionRouter(catalog={"B123"}, max_quantity=100)
+    full = {
+        "customer_name": "テスト店",
+        "product_id": "B123",
+        "quantity": 2,
+        "delivery_date": "2025-08-01",
+    }
+    assert router.score(full).score == 1.0
+    assert router.score({}).score == 0.0
+    assert router.score({"customer_name": "テスト店"}).score == 0.0
+    unknown = router.score({**full, "product_id": "ZZZ"})
+    assert unknown.score == pytest.approx(0.8)
+    assert unknown.reasons == ["unknown product"]
+    insane = router.score({**full, "quantity": 5000})
+    assert insane.score == pytest.approx(0.8)
+    partial = router.score({"items": [{"product_id": "B123", "quantity": 2}]})
+    assert partial.score == pytest.approx(0.8)
+
+
+def test_confident_regex_result_skips_llm(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "dummy")
+    router = ExtractionRouter(catalog={"B123"})
+    fields = router.extract(FULL_TEXT, fail_llm)
+    assert fields["product_id"] == "B123"
+    metrics = router.metrics()
+    assert metrics["escalations"] == 0
+    assert metrics["tiers"]["regex"]["accepted"] == 1
+    # 従来は LLM に送っていた文書
+    assert metrics["llm_calls_saved"] == 1
+    assert metrics["cost_saved"] == pytest.approx(0.01)
+
+
+def test_low_confidence_escalates_to_llm(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "dummy")
+    router = ExtractionRouter(catalog={"A001"})
+    llm_result = {"customer_name": "テスト店", "product_id": "A001", "quantity": 2}
+    calls = []
+
+    def llm(text):
+        calls.append(text)
+        return llm_result
+
+    # カタログにない商品IDで顧客名もない → LLM へ昇格
+    assert router.extract("商品: B123\n数量: 2\n", llm) == llm_result
+    assert router.extract("ご確認ください", llm) == llm_result
+    assert len(calls) == 2
+    metrics = router.metrics()
+    assert metrics["escalation_rate"] == 1.0
+    assert metrics["tiers"]["llm"]["attempts"] == 2
+
+
+def test_without_api_key_returns_best_effort_result():
+    router = ExtractionRouter(catalog=set())
+    assert router.extract("商品: B123\n数量: 2\n", fail_llm) == {
+        "product_id": "B123",
+        "quantity": 2,
+    }
+    assert router.metrics()["escalations"] == 0
+
+
+def test_extract_order_fields_uses_router(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "dummy")
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        content = json.dumps({"product_id": "X", "quantity": 1})
+        return type(
+            "R",
+            (),
+            {
+                "choices": [
+                    type("C", (), {"message": type("M", (), {"content": content})})
+                ]
+            },
+        )
+
+    monkeypatch.setattr(llm_stub.openai.ChatCompletion, "create", create)
+    assert llm_stub.extract_order_fields(FULL_TEXT)["product_id"] == "B123"
+    assert llm_stub.extract_order_fields("ご確認ください") == {
+        "product_id": "X",
+        "quantity": 1,
+    }
+    assert len(calls) == 1
@@ -0,0 +1,36 @@
+import pytest
+
+from src.phase2.bench_field_extractor import (
+    legacy_extract_metadata_from_text,
+    legacy_extract_order_fields,
+    make_corpus,
+)
+from src.phase2.field_extractor import FieldScan
+from src.phase2.llm_stub import extract_order_fields
+from src.phase2.transform import extract_metadata_from_text
+
+
+@pytest.fixture(autouse=True)
+def clear_env(monkeypatch):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+
+
+def test_field_scan_matches_legacy_extractors():
+    corpus = make_corpus(600) + [
+        "顧客: 山田屋 商品: A001 数量: 3\n納期：25年8月1日\n",
+        "顧客:\n  丸の内ストア\n商品名 数量\nA001 2\n合計 2\n",
+        "配送希望日: 2025年8月\n配送希望日: 2025-09-01\n商品：X1\n数量：4\n",
+        "",
+    ]
+    for text in corpus:
+        expected = legacy_extract_metadata_from_text(text)
+        assert extract_order_fields(text) == legacy_extract_order_fields(text)
+        assert extract_metadata_from_text(text) == expected
+
+
+def test_field_scan_values():
+    text = "顧客: テスト商店\n商品: A001\n数量: 2\n納期: 2025年8月1日\n"
+    scan = FieldScan(text)
+    assert (scan.customer_name, scan.delivery_raw) == ("テスト商店", "2025年8月1日")
+    assert (scan.products, scan.quantities) == (["A001"], [2])
+    assert scan.delivery_date is None
@@ -32,3 +32,62 @@ def test_parse_order_from_pdf_multi():
         assert isinstance(o.quantity, int) and o.quantity > 0
         # 配送日や顧客名はPDFの内容次第で None の場合もある
         assert o.delivery_date is None or isinstance(o.delivery_date, date)
+
+
+def test_parse_order_opens_pdf_once(monkeypatch):
+    # 1つの添付に対し pdfplumber.open は1回だけ呼ばれる
+    import src.phase2.transform as transform
+    from src.phase2.bench_pdf_parse import make_invoice_pdf
+
+    if transform.pdfplumber is None:
+        pytest.skip("pdfplumber is not installed")
+    opened = []
+    real_open = transform.pdfplumber.open
+
+    def counting_open(*args, **kwargs):
+        opened.append(1)
+        return real_open(*args, **kwargs)
+
+    monkeypatch.setattr(transform.pdfplumber, "open", counting_open)
+    orders = parse_order({"pdf": make_invoice_pdf(3, rows_per_page=4), "body": ""})
+    assert [(o.product_id, o.quantity) for o in orders] == [
+        ("P000", 1),
+        ("P001", 2),
+        ("P002", 3),
+        ("P003", 4),
+    ]
+    assert len(opened) == 1
+
+    opened.clear()
+    text_pdf = make_invoice_pdf(2, rows_per_page=2, table=False)
+    with transform.ParsedPdf(text_pdf) as parsed:
+        items = transform.extract_items_from_pdf(parsed)
+        assert "Invoice page 1/2" in transform.extract_text_from_pdf(parsed)
+    assert items == [
+        {"product_id": "Item000", "quantity": 1},
+        {"product_id": "Item001", "quantity": 2},
+    ]
+    assert len(opened) == 1
+
+
+def test_table_scan_probes_pages_and_respects_budget():
+    # ヘッダのキーワードがあるページだけテーブル抽出し、上限以降のページは読まない
+    from src.phase2.bench_pdf_parse import make_invoice_pdf
+    from src.phase2.transform import ParsedPdf, extract_items_from_pdf, pdfplumber
+
+    if pdfplumber is None:
+        pytest.skip("pdfplumber is not installed")
+    pdf_bytes = make_invoice_pdf(6, rows_per_page=2, table_page=1)
+    with ParsedPdf(pdf_bytes, max_pages=3) as parsed:
+        items = extract_items_from_pdf(parsed)
+        assert "Invoice page 3/6" in parsed.text
+        assert "Invoice page 4/6" not in parsed.text
+        assert list(parsed._tables) == [1]
+        assert set(parsed._probes) == {0, 1}
+    assert items == [
+        {"product_id": "P000", "quantity": 1},
+        {"product_id": "P001", "quantity": 2},
+    ]
+    # 上限より後ろにある明細は対象外
+    with ParsedPdf(pdf_bytes, max_pages=1) as parsed:
+        assert extract_items_from_pdf(parsed) == []
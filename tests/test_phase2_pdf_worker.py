@@ -0,0 +1,99 @@
+import threading
+import time
+
+import pytest
+
+from src.phase2.bench_pdf_parse import make_invoice_pdf
+from src.phase2.pdf_worker import (
+    PdfExtractionError,
+    PdfExtractionService,
+    PdfExtractionTimeout,
+)
+from src.phase2.transform import ExtractedPdf, parse_order
+
+pytest.importorskip("pdfplumber")
+
+
+@pytest.fixture
+def service():
+    svc = PdfExtractionService(workers=1, timeout=30, start_method="fork")
+    yield svc
+    svc.close()
+
+
+def test_extract_returns_items_and_text(service):
+    result = service.extract(make_invoice_pdf(2, rows_per_page=3))
+    assert isinstance(result, ExtractedPdf)
+    assert result.items == [
+        {"product_id": "P000", "quantity": 1},
+        {"product_id": "P001", "quantity": 2},
+        {"product_id": "P002", "quantity": 3},
+    ]
+    assert "Invoice page 2/2" in result.text
+    # 抽出結果から parse_order で注文を組み立てられる
+    orders = parse_order({"pdf": result, "body": "顧客: テスト商店"})
+    assert [o.customer_name for o in orders] == ["テスト商店"] * 3
+    # 本文がありテーブルが取れた場合はテキスト抽出を省略する
+    assert service.extract(make_invoice_pdf(1, 1), need_text=False).text == ""
+
+
+def test_extract_timeout_replaces_worker(service):
+    pdf = make_invoice_pdf(5)
+    with pytest.raises(PdfExtractionTimeout):
+        service.extract(pdf, timeout=0.001)
+    assert service.stats.timeouts == 1
+    # 強制終了したワーカーは新しいプロセスに置き換わっている
+    assert service.extract(make_invoice_pdf(1, 1)).items == [
+        {"product_id": "P000", "quantity": 1}
+    ]
+
+
+def test_workers_recycled_after_max_tasks():
+    with PdfExtractionService(
+        workers=1, max_tasks_per_worker=1, start_method="fork"
+    ) as svc:
+        pids = set()
+        for _ in range(3):
+            svc.extract(make_invoice_pdf(1, 1), need_text=False)
+            pids.add(svc._all[0].process.pid)
+        assert svc.stats.recycled == 3
+        assert svc.stats.documents == 3
+        assert len(pids) == 3
+    with pytest.raises(PdfExtractionError):
+        svc.extract(b"%PDF-1.4")
+
+
+def test_waiting_extract_fails_when_service_closes(service):
+    # ワーカーが使用中のまま close() されても、空きを待つ呼び出しは例外で戻る
+    worker = service._acquire()
+    errors = []
+
+    def wait_for_worker():
+        try:
+            service.extract(make_invoice_pdf(1, 1))
+        except PdfExtractionError as e:
+            errors.append(e)
+
+    waiter = threading.Thread(target=wait_for_worker)
+    waiter.start()
+    time.sleep(0.2)
+    service.close()
+    waiter.join(timeout=5)
+    assert not waiter.is_alive()
+    assert "closed" in str(errors[0])
+    service._release(worker)
+    with pytest.raises(PdfExtractionError, match="closed"):
+        service.extract(make_invoice_pdf(1, 1))
+
+
+def test_extract_raises_when_worker_cannot_be_respawned(monkeypatch):
+    with PdfExtractionService(workers=1, start_method="fork") as svc:
+
+        def fail():
+            raise OSError("fork failed")
+
+        monkeypatch.setattr(svc, "_spawn", fail)
+        with pytest.raises(PdfExtractionTimeout):
+            svc.extract(make_invoice_pdf(5), timeout=0.001)
+        with pytest.raises(PdfExtractionError, match="No PDF worker"):
+            svc.extract(make_invoice_pdf(1, 1))
@@ -0,0 +1,90 @@
+from src.phase2.llm_stub import build_messages
+from src.phase2.prompt_window import (
+    estimate_tokens,
+    fit_token_budget,
+    order_region,
+    reduce_prompt_text,
+    strip_quoted,
+    strip_signature,
+)
+
+EMAIL = """いつもお世話になっております。
+下記の通り注文いたします。
+
+商品: A001
+数量: 3
+配送希望日: 2025-08-01
+
+--
+株式会社テスト商事 佐藤
+TEL 03-1234-5678
+
+2025年7月1日 山田 <yamada@example.com> さんは書きました:
+> 商品: Z999
+> 数量: 10
+"""
+
+
+def test_strip_quoted_and_signature():
+    body = strip_signature(strip_quoted(EMAIL))
+    assert "Z999" not in body
+    assert "TEL" not in body
+    assert "A001" in body
+    # 署名の会社名は顧客名の手掛かりとして残す
+    assert "株式会社テスト商事 佐藤" in body
+
+
+def test_decorative_line_is_signature_only_with_contact_info():
+    table = "商品 数量\n------------------\nA001 3\nB002 4\n"
+    assert strip_signature(table) == table
+    signed = "商品: A001\n==========\n〒100-0001 東京都\n"
+    assert strip_signature(signed) == "商品: A001"
+
+
+def test_reduce_keeps_order_region_only():
+    text = "本日は晴天なり。\n" * 50 + EMAIL + "ご確認のほどお願いします。\n" * 50
+    reduced = reduce_prompt_text(text)
+    assert "A001" in reduced and "数量: 3" in reduced and "2025-08-01" in reduced
+    assert "本日は晴天なり" not in reduced
+    assert "Z999" not in reduced
+    assert estimate_tokens(reduced) < estimate_tokens(text) / 5
+
+
+def test_quoted_only_order_falls_back_to_original():
+    # 転送などで注文が引用部分にしかない場合は元の本文から注文行を探す
+    text = "以下ご確認ください。\n> 商品: B123\n> 数量: 2\n"
+    assert "B123" in reduce_prompt_text(text)
+
+
+def test_fit_token_budget_never_drops_order_lines(caplog):
+    order = [f"商品: A{i:03d} 数量: {i}" for i in range(200)]
+    assert fit_token_budget("\n".join(order), 100) == "\n".join(order)
+    assert "budget 100" in caplog.text
+    # 上限を超える分は注文行以外（文脈行）から落とす
+    text = "\n".join(["よろしくお願いします。"] * 50 + order[:3])
+    fitted = fit_token_budget(text, 60)
+    assert fitted.splitlines()[-3:] == order[:3]
+    assert estimate_tokens(fitted) <= 60
+    assert fit_token_budget(text, 0) == text
+
+
+def test_units_and_reply_header_detection():
+    # 台・セット・ケースなどの単位付き数量は注文行として残す
+    text = "モニター 3台\n本日は晴天なり。\nマウス 2セット\n\n\n用紙 5ケース"
+    assert order_region(text, context=0).splitlines() == [
+        "モニター 3台",
+        "マウス 2セット",
+        "用紙 5ケース",
+    ]
+    # 「書きました」で終わるだけの行は引用の開始とみなさない
+    body = "見積書を書きました。\n商品: A001\n数量: 3\n"
+    assert "A001" in strip_quoted(body)
+    header = "2025/07/01 12:00 に 山田 <yamada@example.com> が書きました:"
+    assert "A001" not in strip_quoted(f"了解です。\n{header}\n商品: A001\n")
+
+
+def test_build_messages_embeds_reduced_text():
+    prompt = build_messages(EMAIL)[1]["content"]
+    assert "A001" in prompt
+    assert "Z999" not in prompt
+    assert "TEL 03-1234-5678" not in prompt
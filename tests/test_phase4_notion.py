@@ -59,3 +59,80 @@ def test_create_order(monkeypatch):
     monkeypatch.setattr(client.client, "post", lambda url, json: dummy)
     res = client.create_order(data)
     assert res["id"] == "newpage"
+
+
+def _product_page(pid, name, stock=1):
+    return {
+        "id": f"page-{pid}",
+        "properties": {
+            "id": {"title": [{"plain_text": pid}]},
+            "name": {"rich_text": [{"plain_text": name}]},
+            "stock": {"number": stock},
+        },
+    }
+
+
+def test_get_products_batches_or_filter_and_paginates(monkeypatch):
+    client = NotionClient()
+    catalog = [_product_page(f"P{i}", f"商品{i}") for i in range(60)]
+    calls = []
+
+    def fake_query(db, f=None, start_cursor=None):
+        calls.append((f, start_cursor))
+        wanted = {c["rich_text"]["equals"] for c in f["or"]}
+        hits = [
+            p
+            for p in catalog
+            if p["properties"]["id"]["title"][0]["plain_text"] in wanted
+            or p["properties"]["name"]["rich_text"][0]["plain_text"] in wanted
+        ]
+        # 1レスポンス10件ずつページング
+        offset = int(start_cursor or 0)
+        page = hits[offset : offset + 10]  # noqa: E203
+        has_more = offset + 10 < len(hits)
+        return {
+            "results": page,
+            "has_more": has_more,
+            "next_cursor": str(offset + 10) if has_more else None,
+        }
+
+    monkeypatch.setattr(client, "query_database", fake_query)
+    wanted = [f"P{i}" for i in range(55)] + ["商品59", "UNKNOWN"]
+    found = client.get_products(wanted)
+    assert set(found) == set(wanted) - {"UNKNOWN"}
+    assert found["商品59"]["id"] == "page-P59"
+    # 50識別子ずつ2チャンク。各チャンク内は next_cursor でページング
+    assert all(len(f["or"]) <= 100 for f, _ in calls)
+    assert [c for _, c in calls] == [None, "10", "20", "30", "40", None]
+
+
+def test_list_product_identifiers(monkeypatch):
+    client = NotionClient()
+    pages = [
+        {
+            "properties": {
+                "id": {"title": [{"plain_text": "P1"}]},
+                "name": {"rich_text": [{"plain_text": "りんご"}]},
+            }
+        },
+        {"properties": {"id": {"title": [{"plain_text": "P2"}]}}},
+    ]
+    monkeypatch.setattr(client, "query_database_all", lambda db, f=None: pages)
+    assert client.list_product_identifiers() == {"P1", "りんご", "P2"}
+
+
+def test_list_changed_pages_filters_by_date_or_edit_time(monkeypatch):
+    client = NotionClient()
+    calls = []
+    monkeypatch.setattr(
+        client, "query_database_all", lambda db, f=None: calls.append((db, f)) or []
+    )
+    client.list_changed_pages("db-c", "created_at", "2024-05-01T00:00:00+00:00")
+    client.list_changed_pages("db-c", "created_at")
+    (_, changed), (_, full) = calls
+    assert changed["or"][0] == {
+        "property": "created_at",
+        "date": {"on_or_after": "2024-05-01T00:00:00+00:00"},
+    }
+    assert changed["or"][1]["timestamp"] == "last_edited_time"
+    assert full is None
@@ -0,0 +1,94 @@
+import pytest
+
+import src.phase4.product_cache as pc
+from src.phase4.notion_client import NotionClient
+from src.phase4.product_cache import ProductCache
+
+
+@pytest.fixture(autouse=True)
+def env(monkeypatch):
+    monkeypatch.setenv("NOTION_API_KEY", "test-key")
+    monkeypatch.setenv("NOTION_DATABASE_ID_PRODUCTS", "db_products")
+    monkeypatch.setenv("NOTION_DATABASE_ID_CUSTOMERS", "db_customers")
+    monkeypatch.setenv("NOTION_DATABASE_ID_ORDERS", "db_orders")
+
+
+class DummyResponse:
+    def __init__(self, json_data):
+        self._json = json_data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._json
+
+
+def page(pid, name, stock):
+    return {
+        "id": f"page-{pid}",
+        "properties": {
+            "id": {"title": [{"plain_text": pid}]},
+            "name": {"rich_text": [{"plain_text": name}]},
+            "stock": {"number": stock},
+        },
+    }
+
+
+def test_cache_lookup_by_id_and_name_with_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(pc.time, "monotonic", lambda: now[0])
+    cache = ProductCache(ttl=10, max_size=10)
+    cache.put(page("A001", "ノートパソコン", 3))
+    assert cache.get("A001")["id"] == "page-A001"
+    assert cache.get("ノートパソコン")["id"] == "page-A001"
+    now[0] += 11
+    assert cache.get("A001") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["expirations"]) == (2, 1, 1)
+
+
+def test_cache_lru_eviction():
+    cache = ProductCache(ttl=60, max_size=2)
+    cache.put(page("A001", "a", 1))
+    cache.put(page("B002", "b", 1))
+    cache.get("A001")
+    cache.put(page("C003", "c", 1))
+    assert cache.get("B002") is None
+    assert cache.get("b") is None
+    assert cache.get("A001") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_notion_client_uses_cache_and_writes_stock_through(monkeypatch):
+    cache = ProductCache(ttl=60, max_size=10)
+    client = NotionClient(product_cache=cache)
+    queries = []
+
+    def fake_query(db, f=None, start_cursor=None):
+        queries.append(f)
+        return {"results": [page("A001", "ノートパソコン", 5)]}
+
+    monkeypatch.setattr(client, "query_database", fake_query)
+    monkeypatch.setattr(
+        client.client, "patch", lambda url, json: DummyResponse({"id": "page-A001"})
+    )
+    assert client.get_product_stock("A001") == 5
+    products = client.get_products(["A001", "ノートパソコン"])
+    assert products["ノートパソコン"]["id"] == "page-A001"
+    client.update_product_stock("page-A001", 2)
+    assert client.get_product_stock("A001") == 2
+    assert len(queries) == 1
+
+
+def test_cache_drops_extra_keys_and_returns_copies():
+    cache = ProductCache(ttl=60, max_size=1)
+    cache.put(page("A001", "a", 1), "ノートPC")
+    cached = cache.get("ノートPC")
+    cached["properties"]["stock"]["number"] = 99
+    assert cache.get("A001")["properties"]["stock"]["number"] == 1
+    cache.put(page("B002", "b", 1))
+    assert cache.get("ノートPC") is None
+    cache.invalidate("page-B002")
+    assert cache.get("b") is None
+    assert cache.stats()["size"] == 0
@@ -0,0 +1,124 @@
+import httpx
+import pytest
+
+import src.phase4.notion_scheduler as ns
+from src.phase4.notion_client import NotionClient
+from src.phase4.notion_scheduler import NotionRequestScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(round(seconds, 3))
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ns.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(ns.time, "sleep", clock.sleep)
+    monkeypatch.setattr(ns.random, "uniform", lambda a, b: b)
+    return clock
+
+
+def test_token_bucket_spaces_requests_after_burst(clock):
+    scheduler = NotionRequestScheduler(rate=10, burst=2)
+    for _ in range(4):
+        scheduler.acquire()
+    # burst 2件は即時、以降は 1/rate 秒間隔
+    assert clock.sleeps == [0.1, 0.1]
+    metrics = scheduler.metrics()
+    assert metrics["requests"] == 4
+    assert metrics["max_queue_depth"] == 1
+    assert metrics["queue_depth"] == 0
+    assert metrics["total_wait"] == pytest.approx(0.2)
+
+
+def test_send_honors_retry_after_and_backs_off_on_5xx(clock):
+    scheduler = NotionRequestScheduler(rate=0, backoff_base=0.5)
+    responses = iter(
+        [
+            httpx.Response(429, headers={"Retry-After": "2"}),
+            httpx.Response(503),
+            httpx.Response(502),
+            httpx.Response(200),
+        ]
+    )
+    resp = scheduler.send(lambda: next(responses))
+    assert resp.status_code == 200
+    # 429 は Retry-After 秒、5xx は試行回数に応じた指数バックオフ
+    assert clock.sleeps == [2.0, 1.0, 2.0]
+    metrics = scheduler.metrics()
+    assert (metrics["throttled"], metrics["server_errors"], metrics["retries"]) == (
+        1,
+        2,
+        3,
+    )
+
+
+def test_send_gives_up_after_max_retries(clock):
+    scheduler = NotionRequestScheduler(rate=0, max_retries=2)
+    resp = scheduler.send(lambda: httpx.Response(500))
+    assert resp.status_code == 500
+    assert scheduler.metrics()["retries"] == 2
+
+
+def test_notion_client_retries_rate_limited_query(monkeypatch, clock):
+    monkeypatch.setenv("NOTION_API_KEY", "test-key")
+    monkeypatch.setenv("NOTION_DATABASE_ID_PRODUCTS", "db_products")
+    monkeypatch.setenv("NOTION_DATABASE_ID_CUSTOMERS", "db_customers")
+    monkeypatch.setenv("NOTION_DATABASE_ID_ORDERS", "db_orders")
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        if len(calls) == 1:
+            return httpx.Response(429, headers={"Retry-After": "1"})
+        return httpx.Response(200, json={"results": [{"id": "cust1"}]})
+
+    client = NotionClient(scheduler=NotionRequestScheduler(rate=3, burst=3))
+    client.client = httpx.Client(
+        base_url="https://api.notion.com/v1", transport=httpx.MockTransport(handler)
+    )
+    assert client.get_customer("C") == {"id": "cust1"}
+    assert len(calls) == 2
+    assert clock.sleeps == [1.0]
+
+
+def test_page_creation_is_not_retried_on_5xx(monkeypatch, clock):
+    monkeypatch.setenv("NOTION_API_KEY", "test-key")
+    monkeypatch.setenv("NOTION_DATABASE_ID_PRODUCTS", "db_products")
+    monkeypatch.setenv("NOTION_DATABASE_ID_CUSTOMERS", "db_customers")
+    monkeypatch.setenv("NOTION_DATABASE_ID_ORDERS", "db_orders")
+    calls = []
+
+    def handler(request):
+        calls.append((request.method, request.url.path))
+        if len(calls) % 2:
+            return httpx.Response(502)
+        return httpx.Response(200, json={"id": "p1", "results": []})
+
+    client = NotionClient(scheduler=NotionRequestScheduler(rate=0))
+    client.client = httpx.Client(
+        base_url="https://api.notion.com/v1", transport=httpx.MockTransport(handler)
+    )
+    # POST /pages は作成済みの可能性があるため 5xx でも再送しない
+    with pytest.raises(httpx.HTTPStatusError):
+        client.create_customer({"customer_name": "C"})
+    assert calls == [("POST", "/v1/pages")]
+    # query は冪等なので再送する
+    calls.clear()
+    assert client.get_customer("C") is None
+    assert len(calls) == 2
+    # 呼び出し側が明示すれば作成も再送する
+    calls.clear()
+    header = {"order_id": "O1", "total_price": 0, "status": "approved"}
+    assert client.create_order(header, retry_server_errors=True)["id"] == "p1"
+    assert len(calls) == 2
@@ -1,5 +1,9 @@
+import json
+
+import httpx
 import pytest
 
+from src.phase4.notion_client import NotionClient
 from src.phase4.order_service import OrderService
 
 
@@ -67,3 +71,122 @@ def test_process_order_insufficient(service):
     }
     with pytest.raises(ValueError):
         service.process_order(order)
+
+
+def test_check_stocks_uses_batch_lookup(service):
+    service.notion.get_products = lambda pids: {
+        pid: service.notion.pages[pid] for pid in pids if pid in service.notion.pages
+    }
+    assert service.check_stocks([{"product_id": "P1", "quantity": 2}])
+    # 同一商品の数量は合算して判定
+    assert not service.check_stocks(
+        [{"product_id": "P1", "quantity": 3}, {"product_id": "P1", "quantity": 3}]
+    )
+    with pytest.raises(ValueError):
+        service.check_stocks([{"product_id": "X9", "quantity": 1}])
+
+
+class CountingNotionServer:
+    """Notion API を模倣し、受け付けたリクエストを記録する MockTransport ハンドラ"""
+
+    def __init__(self, products):
+        self.products = products
+        self.requests = []
+
+    def __call__(self, request):
+        body = json.loads(request.content or b"{}")
+        self.requests.append((request.method, request.url.path, body))
+        if request.url.path.endswith("/query"):
+            if request.url.path == "/v1/databases/db_customers/query":
+                return httpx.Response(200, json={"results": [{"id": "cust1"}]})
+            wanted = {c["rich_text"]["equals"] for c in body["filter"]["or"]}
+            hits = [p for pid, p in self.products.items() if pid in wanted]
+            return httpx.Response(200, json={"results": hits, "has_more": False})
+        return httpx.Response(200, json={"id": f"page{len(self.requests)}"})
+
+
+@pytest.fixture
+def counting_client(monkeypatch):
+    monkeypatch.setenv("NOTION_API_KEY", "test-key")
+    monkeypatch.setenv("NOTION_DATABASE_ID_PRODUCTS", "db_products")
+    monkeypatch.setenv("NOTION_DATABASE_ID_CUSTOMERS", "db_customers")
+    monkeypatch.setenv("NOTION_DATABASE_ID_ORDERS", "db_orders")
+    monkeypatch.setenv("NOTION_DATABASE_ID_ORDER_DETAILS", "db_details")
+    products = {
+        f"P{i}": {
+            "id": f"prod{i}",
+            "properties": {
+                "id": {"title": [{"plain_text": f"P{i}"}]},
+                "name": {"rich_text": [{"plain_text": f"商品{i}"}]},
+                "price": {"number": 100},
+                "stock": {"number": 10},
+            },
+        }
+        for i in range(5)
+    }
+    server = CountingNotionServer(products)
+    client = NotionClient()
+    client.client = httpx.Client(
+        base_url="https://api.notion.com/v1", transport=httpx.MockTransport(server)
+    )
+    return client, server
+
+
+def test_process_order_request_count(counting_client):
+    client, server = counting_client
+    items = [{"product_id": f"P{i}", "quantity": 2} for i in range(5)]
+    OrderService(client).process_order(
+        {"order_id": "O1", "customer_name": "C", "items": items}
+    )
+    methods = [(m, path.split("/")[2]) for m, path, _ in server.requests]
+    # 顧客1 + 商品一括1 の読み込みと、ヘッダ1 + 明細5 + 在庫5 + 合計金額1 の書き込み
+    assert methods.count(("POST", "databases")) == 2
+    assert methods.count(("POST", "pages")) == 1 + 5
+    assert methods.count(("PATCH", "pages")) == 5 + 1
+    assert len(server.requests) == 2 * len(items) + 4
+    assert server.requests[-1][2] == {"properties": {"total_price": {"number": 1000}}}
+
+
+def test_process_order_validates_before_writing(counting_client):
+    client, server = counting_client
+    items = [
+        {"product_id": "P0", "quantity": 6},
+        {"product_id": "P1", "quantity": 1},
+        {"product_id": "P0", "quantity": 6},
+    ]
+    with pytest.raises(ValueError):
+        OrderService(client).process_order(
+            {"order_id": "O1", "customer_name": "C", "items": items}
+        )
+    # 在庫不足は書き込み前に検出され、商品の一括取得1回のみ
+    assert [m for m, _, _ in server.requests] == ["POST"]
+
+
+def test_process_order_parallel_writes(counting_client):
+    client, server = counting_client
+    items = [{"product_id": f"P{i}", "quantity": 1} for i in range(5)]
+    OrderService(client, max_workers=4).process_order(
+        {"order_id": "O1", "customer_name": "C", "items": items}
+    )
+    assert len(server.requests) == 2 * len(items) + 4
+    # total_price 更新は全明細の書き込み完了後に最後に行う
+    assert server.requests[-1][2] == {"properties": {"total_price": {"number": 500}}}
+
+
+def test_process_order_parallel_error_skips_total(counting_client, monkeypatch):
+    client, server = counting_client
+    original = client.update_product_stock
+
+    def failing(page_id, new_stock):
+        if page_id == "prod2":
+            raise RuntimeError("boom")
+        return original(page_id, new_stock)
+
+    monkeypatch.setattr(client, "update_product_stock", failing)
+    items = [{"product_id": f"P{i}", "quantity": 1} for i in range(5)]
+    with pytest.raises(RuntimeError):
+        OrderService(client, max_workers=4).process_order(
+            {"order_id": "O1", "customer_name": "C", "items": items}
+        )
+    patched = [body for method, _, body in server.requests if method == "PATCH"]
+    assert not any("total_price" in body["properties"] for body in patched)
@@ -1,8 +1,8 @@
-import pickle
-
 import pytest
 
 from src.phase6.build_rag_index import load_docs, main
+from src.phase6.index_store import load_vector_store
+from src.phase6.master_index import MasterIndex
 from src.phase6.vector_store import VectorStore
 
 
@@ -30,13 +30,18 @@ def test_main_creates_index(tmp_path, monkeypatch):
         def embed_text(self, text):
             return [0.1] * 4
 
-    monkeypatch.setenv("RAG_INDEX_PATH", str(tmp_path / "out.pkl"))
+    monkeypatch.setenv("RAG_INDEX_PATH", str(tmp_path / "out_index"))
     # Patch embedder class
     import src.phase6.build_rag_index as bi
 
     monkeypatch.setattr(bi, "OpenAIEmbedder", lambda: DummyEmbed())
     main()
-    out = tmp_path / "out.pkl"
-    assert out.exists()
-    vs = pickle.loads(out.read_bytes())
+    out = tmp_path / "out_index"
+    assert (out / "product" / "meta.json").exists()
+    vs = load_vector_store(str(out / "product"), embedder=DummyEmbed())
     assert isinstance(vs, VectorStore)
+    # 1行1エントリで、商品と顧客は別の名前空間に分かれる
+    assert list(vs.docs) == ["A", "B"]
+    index = MasterIndex.load(str(out), embedder=DummyEmbed())
+    assert list(index.stores["customer"].docs) == ["X", "Y"]
+    assert index.query("X", top_k=5, kind="customer") in (["X", "Y"], ["Y", "X"])
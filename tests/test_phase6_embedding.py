@@ -0,0 +1,62 @@
+import random
+import threading
+
+import numpy as np
+import openai
+import pytest
+
+from src.phase6.embedding import OpenAIEmbedder
+from src.phase6.vector_store import VectorStore
+
+
+@pytest.fixture
+def embedding_api(monkeypatch):
+    """Embedding.create を差し替え、リクエストごとの入力を記録する"""
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    calls = []
+    lock = threading.Lock()
+
+    def create(model, input):
+        texts = input if isinstance(input, list) else [input]
+        with lock:
+            calls.append(texts)
+        data = [
+            {"index": i, "embedding": [float(len(t)), float(i)]}
+            for i, t in enumerate(texts)
+        ]
+        # 応答の並びが入力順と異なっても index で並べ直されること
+        random.shuffle(data)
+        return {"data": data}
+
+    monkeypatch.setattr(openai.Embedding, "create", create)
+    return calls
+
+
+def test_embed_texts_batches_requests_and_keeps_order(embedding_api):
+    embedder = OpenAIEmbedder(batch_size=4, max_workers=3)
+    texts = ["x" * (i + 1) for i in range(10)]
+    vectors = embedder.embed_texts(texts)
+    assert [v[0] for v in vectors] == [float(i + 1) for i in range(10)]
+    assert sorted(len(c) for c in embedding_api) == [2, 4, 4]
+
+
+def test_batches_respect_input_size_limit(embedding_api):
+    embedder = OpenAIEmbedder(batch_size=100, max_batch_tokens=10, max_workers=1)
+    embedder.embed_texts(["abcd", "efgh", "ijkl", "", "mn"])
+    # 空文字は空白に置き換えて送る
+    assert embedding_api == [["abcd", "efgh"], ["ijkl", " ", "mn"]]
+
+
+def test_build_fills_float32_matrix_and_reports_progress(embedding_api):
+    embedder = OpenAIEmbedder(batch_size=3, max_workers=2)
+    store = VectorStore(embedder)
+    progress = []
+    docs = ["a" * (i + 1) for i in range(8)]
+    store.build(docs, progress=lambda done, total, _: progress.append((done, total)))
+    assert len(embedding_api) == 3
+    assert store.embeddings[0].dtype == np.float32
+    assert [float(e[0]) for e in store.embeddings] == [float(i + 1) for i in range(8)]
+    # バッチ完了ごとに累計件数を報告する
+    assert len(progress) == 3 and progress[-1] == (8, 8)
+    assert store.build_stats["docs"] == 8
+    assert store.query("aaaa", top_k=1) == ["aaaa"]
@@ -0,0 +1,88 @@
+import numpy as np
+
+from src.phase6.embedding_cache import CachedEmbedder, create_cached_embedder
+from src.phase6.vector_store import VectorStore
+
+
+class CountingEmbedder:
+    model = "test-embedding"
+
+    def __init__(self):
+        self.calls = []
+
+    def embed_texts(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(t)), float(sum(map(ord, t)) % 7)] for t in texts]
+
+    def embed_text(self, text):
+        return self.embed_texts([text])[0]
+
+
+def test_only_missing_texts_are_embedded_once():
+    inner = CountingEmbedder()
+    cache = CachedEmbedder(inner)
+    cache.embed_texts(["a", "bb"])
+    vectors = cache.embed_texts(["bb", "ccc", "ccc", "a"])
+    assert inner.calls == [["a", "bb"], ["ccc"]]
+    assert [v[0] for v in vectors] == [2.0, 3.0, 3.0, 1.0]
+    assert all(v.dtype == np.float32 for v in vectors)
+
+
+def test_persists_across_instances(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite")
+    first = CachedEmbedder(CountingEmbedder(), path)
+    first.embed_texts(["顧客A", "商品B"])
+    first.close()
+
+    inner = CountingEmbedder()
+    second = CachedEmbedder(inner, path)
+    vector = second.embed_text("商品B")
+    assert inner.calls == []
+    assert vector.tolist() == CountingEmbedder().embed_text("商品B")
+    assert second.stats()["disk_hits"] == 1
+    second.embed_text("商品B")
+    stats = second.stats()
+    assert stats["memory_hits"] == 1
+    assert stats["hit_rate"] == 1.0
+    assert stats["size"] == 2
+
+
+def test_model_name_is_part_of_key(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite")
+    CachedEmbedder(CountingEmbedder(), path).embed_text("x")
+    inner = CountingEmbedder()
+    CachedEmbedder(inner, path, model="other-model").embed_text("x")
+    assert inner.calls == [["x"]]
+
+
+def test_memory_lru_is_bounded():
+    cache = CachedEmbedder(CountingEmbedder(), memory_size=2)
+    cache.embed_texts(["a", "b", "c"])
+    assert cache.stats()["memory_size"] == 2
+    cache.embed_text("a")
+    stats = cache.stats()
+    assert stats["disk_hits"] == 1
+    assert stats["misses"] == 3
+
+
+def test_vector_store_build_uses_cache():
+    inner = CountingEmbedder()
+    cache = CachedEmbedder(inner)
+    docs = ["りんご", "みかん", "ぶどう"]
+    VectorStore(cache).build(docs)
+    store = VectorStore(cache)
+    store.build(docs)
+    assert len(inner.calls) == 1
+    assert store.query("みかん", top_k=1) == ["みかん"]
+
+
+def test_create_cached_embedder_requires_path(monkeypatch, tmp_path):
+    inner = CountingEmbedder()
+    monkeypatch.delenv("EMBEDDING_CACHE_PATH", raising=False)
+    assert create_cached_embedder(inner) is inner
+    monkeypatch.setenv("EMBEDDING_CACHE_PATH", str(tmp_path / "cache.sqlite"))
+    monkeypatch.setenv("EMBEDDING_CACHE_MEMORY_SIZE", "8")
+    cache = create_cached_embedder(inner)
+    assert isinstance(cache, CachedEmbedder)
+    assert cache.memory_size == 8
+    cache.close()
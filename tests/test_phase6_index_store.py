@@ -0,0 +1,134 @@
+import json
+
+import numpy as np
+import pytest
+
+import src.phase6.index_store as index_store
+from src.phase6.index_store import load_vector_store, save_vector_store
+from src.phase6.vector_store import VectorStore
+
+
+class LengthEmbedder:
+    def embed_text(self, text):
+        return [float(len(text)), 1.0]
+
+
+DOCS = ["りんご", "バナナジュース", "A001 ノートPC", ""]
+
+
+@pytest.fixture
+def saved(tmp_path):
+    store = VectorStore(LengthEmbedder())
+    store.build(DOCS)
+    path = str(tmp_path / "index")
+    save_vector_store(store, path)
+    return store, path
+
+
+@pytest.mark.parametrize("use_faiss", [True, False])
+def test_roundtrip_memory_mapped(saved, use_faiss):
+    store, path = saved
+    loaded = load_vector_store(path, LengthEmbedder(), use_faiss=use_faiss)
+    assert isinstance(loaded.matrix, np.memmap)
+    assert loaded.matrix.dtype == np.float32
+    assert np.array_equal(loaded.matrix, store.matrix)
+    assert list(loaded.docs) == DOCS
+    assert len(loaded.docs) == 4 and loaded.docs[-1] == ""
+    for q in ("みかん", "A002 ノートパソコン"):
+        assert loaded.query(q, top_k=2) == store.query(q, top_k=2)
+    assert loaded.query_many(["xyz", "長い長い長い"], top_k=1) == [["りんご"], ["バナナジュース"]]
+
+
+def test_load_without_mmap(saved):
+    store, path = saved
+    loaded = load_vector_store(path, LengthEmbedder(), mmap=False)
+    assert not isinstance(loaded.matrix, np.memmap)
+    assert loaded.query("abc", top_k=1) == store.query("abc", top_k=1)
+
+
+def test_save_replaces_existing_index(saved):
+    _, path = saved
+    store = VectorStore(LengthEmbedder())
+    store.build(["x"])
+    save_vector_store(store, path)
+    assert list(load_vector_store(path).docs) == ["x"]
+
+
+def test_version_and_corruption_checks(saved, tmp_path):
+    _, path = saved
+    meta_path = f"{path}/meta.json"
+    meta = json.load(open(meta_path))
+    with open(f"{path}/embeddings.f32", "ab") as f:
+        f.write(b"\0" * 4)
+    with pytest.raises(ValueError, match="Corrupted"):
+        load_vector_store(path)
+    meta["version"] = index_store.FORMAT_VERSION + 1
+    json.dump(meta, open(meta_path, "w"))
+    with pytest.raises(ValueError, match="version"):
+        load_vector_store(path)
+    with pytest.raises(FileNotFoundError):
+        load_vector_store(str(tmp_path / "missing"))
+
+
+@pytest.mark.parametrize("use_faiss", [True, False])
+def test_memory_mapped_store_can_be_updated(saved, use_faiss):
+    _, path = saved
+    loaded = load_vector_store(path, LengthEmbedder(), use_faiss=use_faiss)
+    loaded.remove([0, 3])
+    loaded.add(["ぶどうジュース100%"])
+    assert list(loaded.docs) == ["バナナジュース", "A001 ノートPC", "ぶどうジュース100%"]
+    assert loaded.query("x" * 13, top_k=1) == ["ぶどうジュース100%"]
+    assert loaded.query("x" * 7, top_k=1) == ["バナナジュース"]
+    if use_faiss and index_store.faiss is not None:
+        assert loaded.index.ntotal == 3
+    # 元のファイルは書き換えない
+    assert list(load_vector_store(path).docs) == DOCS
+
+
+def test_save_swaps_versions_without_removing_path(saved, tmp_path, monkeypatch):
+    _, path = saved
+    # 保存中も path が消えないこと（rename で退避しない）
+    rename = index_store.os.rename
+
+    def checked_rename(src, dst):
+        assert index_store.os.path.exists(path)
+        rename(src, dst)
+
+    monkeypatch.setattr(index_store.os, "rename", checked_rename)
+    for docs in (["x"], ["y"], ["z"]):
+        store = VectorStore(LengthEmbedder())
+        store.build(docs)
+        save_vector_store(store, path)
+    assert list(load_vector_store(path).docs) == ["z"]
+    # 現在の版と直前の版だけが残る
+    versions = [p for p in tmp_path.iterdir() if p.name.startswith("index.v")]
+    assert len(versions) == 2
+
+
+def test_legacy_directory_is_migrated(tmp_path):
+    path = tmp_path / "index"
+    store = VectorStore(LengthEmbedder())
+    store.build(["x"])
+    tmp = tmp_path / "tmp"
+    tmp.mkdir()
+    index_store.write_vector_store(store, str(tmp))
+    tmp.rename(path)  # 旧形式の実ディレクトリ
+    save_vector_store(store, str(path))
+    assert path.is_symlink()
+    assert list(load_vector_store(str(path)).docs) == ["x"]
+
+
+def test_load_retries_once_when_version_disappears(saved, monkeypatch):
+    _, path = saved
+    load = index_store._load_vector_store
+    calls = []
+
+    def flaky(*args):
+        calls.append(args[0])
+        if len(calls) == 1:
+            raise FileNotFoundError("swapped")
+        return load(*args)
+
+    monkeypatch.setattr(index_store, "_load_vector_store", flaky)
+    assert list(load_vector_store(path).docs) == DOCS
+    assert len(calls) == 2
@@ -0,0 +1,188 @@
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from src.phase6.index_sync import MasterIndexSync
+from src.phase6.lexical_index import LexicalIndex
+from src.phase6.master_index import MasterIndex
+from src.phase6.rag_pipeline import RAGPipeline
+
+
+class CharEmbedder:
+    def __init__(self):
+        self.calls = []
+
+    def embed_texts(self, texts):
+        self.calls.append(list(texts))
+        out = []
+        for text in texts:
+            v = np.zeros(64, dtype=np.float32)
+            for c in text:
+                v[ord(c) % 64] += 1
+            out.append(v)
+        return out
+
+    def embed_text(self, text):
+        return self.embed_texts([text])[0]
+
+
+def _text(kind, value):
+    return {kind: [{"plain_text": value}]}
+
+
+class FakeNotion:
+    """list_changed_pages だけを持つ Notion クライアント。since 以降に編集したページを返す"""
+
+    database_id_products = "db-products"
+    database_id_customers = "db-customers"
+
+    def __init__(self):
+        self.pages = {"db-products": {}, "db-customers": {}}
+        self.calls = []
+
+    def put_product(self, page_id, pid, name):
+        self.pages["db-products"][page_id] = {
+            "id": page_id,
+            "properties": {"id": _text("title", pid), "name": _text("rich_text", name)},
+            "edited": datetime.now(timezone.utc).isoformat(),
+        }
+
+    def put_customer(self, page_id, name):
+        self.pages["db-customers"][page_id] = {
+            "id": page_id,
+            "properties": {"customer_name": _text("rich_text", name)},
+            "edited": datetime.now(timezone.utc).isoformat(),
+        }
+
+    def list_changed_pages(self, database_id, date_property, since=None):
+        self.calls.append((database_id, date_property, since))
+        pages = self.pages[database_id].values()
+        if since is None:
+            return list(pages)
+        return [p for p in pages if p["edited"] >= since]
+
+
+@pytest.fixture
+def notion():
+    notion = FakeNotion()
+    notion.put_product("page-1", "A001", "ノートパソコン")
+    notion.put_product("page-2", "A002", "マウス")
+    notion.put_customer("page-c1", "山田商店")
+    return notion
+
+
+def test_first_sync_replaces_file_built_index(notion, tmp_path):
+    embedder = CharEmbedder()
+    index = MasterIndex.build(
+        {"product": ["X999: 古い商品"], "customer": ["古い顧客"]}, embedder
+    )
+    path = str(tmp_path / "rag_index")
+    result = MasterIndexSync(index, notion, path).sync()
+
+    assert result["full"] is True
+    assert result["product"] == {"fetched": 2, "added": 2, "updated": 0, "removed": 1}
+    assert list(index.stores["product"].docs) == ["A001: ノートパソコン", "A002: マウス"]
+    assert index.state["keys"]["product"] == ["page-1", "page-2"]
+
+    loaded = MasterIndex.load(path, CharEmbedder())
+    assert loaded.state["keys"] == index.state["keys"]
+    assert loaded.state["watermark"] == index.state["watermark"]
+    assert loaded.query("マウス", kind="product") == ["A002: マウス"]
+
+
+def test_incremental_sync_embeds_only_changes(notion):
+    embedder = CharEmbedder()
+    index = MasterIndex({}, embedder)
+    syncer = MasterIndexSync(index, notion, full_every=100)
+    syncer.sync()
+    embedder.calls.clear()
+
+    notion.put_customer("page-c2", "佐藤工業")
+    notion.put_product("page-2", "A002", "ワイヤレスマウス")
+    result = syncer.sync()
+
+    assert result["full"] is False
+    assert all(since is not None for _, _, since in notion.calls[-2:])
+    assert sorted(embedder.calls) == [["A002: ワイヤレスマウス"], ["佐藤工業"]]
+    assert result["customer"]["added"] == 1
+    assert result["product"]["updated"] == 1
+    assert index.query("佐藤工業", kind="customer") == ["佐藤工業"]
+    assert list(index.stores["product"].docs) == [
+        "A001: ノートパソコン",
+        "A002: ワイヤレスマウス",
+    ]
+    assert index.state["keys"]["product"] == ["page-1", "page-2"]
+
+    # 変更のないページを再取得しても埋め込み直さない
+    embedder.calls.clear()
+    syncer.sync()
+    assert embedder.calls == []
+
+
+def test_deleted_pages_are_removed_on_full_sync(notion):
+    index = MasterIndex({}, CharEmbedder())
+    syncer = MasterIndexSync(index, notion, full_every=2)
+    syncer.sync()
+    del notion.pages["db-products"]["page-1"]
+    assert syncer.sync()["product"]["removed"] == 0
+    result = syncer.sync()
+    assert result["full"] is True
+    assert result["product"]["removed"] == 1
+    assert list(index.stores["product"].docs) == ["A002: マウス"]
+    assert index.state["keys"]["product"] == ["page-2"]
+
+
+def test_sync_updates_lexical_indexes(notion, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    index = MasterIndex({}, CharEmbedder())
+    rag = RAGPipeline(
+        index, product_index=LexicalIndex(), customer_index=LexicalIndex()
+    )
+    syncer = MasterIndexSync(index, notion, pipeline=rag)
+    syncer.sync()
+    assert rag.correct_product_name("ノートパソコン") == "A001"
+
+    notion.put_customer("page-c2", "佐藤工業")
+    notion.put_product("page-1", "A001", "ラップトップ")
+    syncer.sync()
+    assert rag.correct_customer_name("佐藤 工業") == "佐藤工業"
+    assert rag.correct_product_name("ラップトップ") == "A001"
+    assert rag.product_index.lookup("ノートパソコン") is None
+
+
+def test_lookups_run_safely_during_sync(notion, monkeypatch):
+    # 検索スレッドの fuzzy 照合と同期スレッドの add / remove が重なっても例外にならない
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    index = MasterIndex({}, CharEmbedder())
+    rag = RAGPipeline(
+        index, product_index=LexicalIndex(), customer_index=LexicalIndex()
+    )
+    syncer = MasterIndexSync(index, notion, pipeline=rag)
+    syncer.sync()
+    errors = []
+    done = threading.Event()
+
+    def lookups():
+        while not done.is_set():
+            try:
+                rag.product_index.lookup("ノートパソコソ")
+                rag.product_index.lookup("商品12")
+            except Exception as e:
+                errors.append(e)
+                return
+
+    worker = threading.Thread(target=lookups)
+    worker.start()
+    try:
+        for round_ in range(20):
+            for i in range(50):
+                n = round_ * 50 + i
+                notion.put_product(f"page-x{n}", f"X{n:04d}", f"商品{n}番")
+            syncer.sync()
+    finally:
+        done.set()
+        worker.join()
+    assert errors == []
+    assert rag.correct_product_name("ノートパソコン") == "A001"
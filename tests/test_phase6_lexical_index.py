@@ -0,0 +1,66 @@
+from src.phase6.lexical_index import (
+    LexicalIndex,
+    edit_distance,
+    normalize_key,
+    parse_master_line,
+)
+
+MASTER = [
+    "# 商品マスタ",
+    "| ID | 商品名 |",
+    "|---|---|",
+    "- A001: ノートパソコン, ノートPC",
+    "- A002: ワイヤレスマウス, マウス",
+    "B010：USB-Cケーブル 1m",
+]
+
+
+def test_normalize_key_absorbs_width_case_and_separators():
+    assert normalize_key("Ａ００１") == "a001"
+    assert normalize_key(" a-001 ") == "a001"
+    assert normalize_key("ノートＰＣ") == normalize_key("ノート pc")
+
+
+def test_parse_master_line():
+    assert parse_master_line("- A001: ノートパソコン, ノートPC") == (
+        "A001",
+        ["ノートパソコン", "ノートPC"],
+    )
+    assert parse_master_line("|---|---|") is None
+    assert parse_master_line("# 商品マスタ") is None
+
+
+def test_edit_distance():
+    assert edit_distance("kitten", "sitting") == 3
+    assert edit_distance("", "abc") == 3
+
+
+def test_exact_lookup_returns_canonical_value():
+    index = LexicalIndex.from_lines(MASTER)
+    for text in ("A001", "ａ００１", "a 001", "ノート PC", "ノートパソコン"):
+        match = index.lookup(text)
+        assert (match.value, match.tier) == ("A001", "exact")
+    assert index.lookup("usb-c ケーブル 1M").value == "B010"
+
+
+def test_fuzzy_lookup_accepts_small_typos():
+    index = LexicalIndex.from_lines(MASTER)
+    match = index.lookup("ワイヤレスマウズ")
+    assert match.value == "A002"
+    assert match.tier == "fuzzy"
+    assert 0.85 <= match.score < 1.0
+
+
+def test_ambiguous_or_unknown_inputs_fall_through():
+    index = LexicalIndex.from_lines(MASTER)
+    # A001 と A002 のどちらとも1文字違い
+    assert index.lookup("A003") is None
+    assert index.lookup("プリンター") is None
+    assert index.lookup("   ") is None
+
+
+def test_margin_rejects_close_runner_up():
+    index = LexicalIndex([("X", ["abcdefghij"]), ("Y", ["abcdefghik"])])
+    assert index.lookup("abcdefghiz") is None
+    assert index.lookup("abcdefghi") is None
+    assert LexicalIndex([("X", ["abcdefghij"])]).lookup("abcdefghiz").value == "X"
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from src.phase6.master_index import MasterIndex, master_entries
+from src.phase6.rag_pipeline import RAGPipeline
+
+
+class CharEmbedder:
+    """文字の出現数を 64 次元に畳み込んだ埋め込み。embed_texts の呼び出しを記録する"""
+
+    def __init__(self):
+        self.calls = []
+
+    def embed_texts(self, texts):
+        self.calls.append(list(texts))
+        out = []
+        for text in texts:
+            v = np.zeros(64, dtype=np.float32)
+            for c in text:
+                v[ord(c) % 64] += 1
+            out.append(v)
+        return out
+
+    def embed_text(self, text):
+        return self.embed_texts([text])[0]
+
+
+PRODUCTS = ["A001: ノートパソコン", "A002: マウス", "A003: キーボード"]
+CUSTOMERS = ["山田商店: ヤマダ", "佐藤工業: サトウ"]
+
+
+@pytest.fixture
+def index():
+    return MasterIndex.build(
+        {"product": PRODUCTS, "customer": CUSTOMERS}, CharEmbedder()
+    )
+
+
+def test_master_entries_skips_headings_and_separators():
+    lines = ["# 商品マスタ", "|---|---|", "A001: ノートパソコン"]
+    assert master_entries(lines) == ["A001: ノートパソコン"]
+
+
+def test_query_is_restricted_to_namespace(index):
+    assert index.query("マウス", top_k=1, kind="product") == ["A002: マウス"]
+    assert set(index.query("マウス", top_k=5, kind="customer")) == set(CUSTOMERS)
+    assert len(index.query("マウス", top_k=2, kind="product")) == 2
+    # kind を省略すると全名前空間から近い順
+    assert index.query("山田商店", top_k=1) == ["山田商店: ヤマダ"]
+    assert len(index) == 5
+
+
+def test_query_many_embeds_once_and_keeps_order(index):
+    index.embedder.calls.clear()
+    results = index.query_many(
+        ["サトウ", "キーボード", "ヤマダ"], top_k=1, kinds=["customer", "product", None]
+    )
+    assert results == [["佐藤工業: サトウ"], ["A003: キーボード"], ["山田商店: ヤマダ"]]
+    assert index.embedder.calls == [["サトウ", "キーボード", "ヤマダ"]]
+
+
+def test_save_and_load(index, tmp_path):
+    path = str(tmp_path / "rag_index")
+    index.save(path)
+    index.save(path)
+    loaded = MasterIndex.load(path, embedder=CharEmbedder())
+    assert list(loaded.stores["product"].docs) == PRODUCTS
+    assert loaded.query("ノートパソコン", kind="product") == ["A001: ノートパソコン"]
+    with pytest.raises(FileNotFoundError):
+        MasterIndex.load(str(tmp_path / "missing"))
+
+
+def test_rag_pipeline_prompts_only_nearest_entries(index, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    many = ["A001: ノートパソコン"] + [f"B{i:03d}: 部品{i}" for i in range(20)]
+    index = MasterIndex.build({"product": many, "customer": CUSTOMERS}, CharEmbedder())
+    prompts = []
+
+    class Message:
+        content = "A001"
+
+    def create(model, messages):
+        prompts.append(messages[0]["content"])
+        return type("Resp", (), {"choices": [type("C", (), {"message": Message})]})
+
+    monkeypatch.setattr(__import__("openai").ChatCompletion, "create", create)
+    rag = RAGPipeline(vector_store=index)
+    assert rag.correct_product_name("ノートPC") == "A001"
+    assert "A001: ノートパソコン" in prompts[0]
+    assert sum(line.startswith("B") for line in prompts[0].splitlines()) == 4
+    assert "山田商店" not in prompts[0]
@@ -64,3 +64,202 @@ def test_rag_pipeline_correct_customer_name(monkeypatch):
     rag = RAGPipeline(vector_store=vs, llm_model="dummy-model")
     result = rag.correct_customer_name("Yamada Store")
     assert result == "normalized"
+
+
+@pytest.fixture
+def no_faiss(monkeypatch):
+    import src.phase6.vector_store as vector_store
+
+    monkeypatch.setattr(vector_store, "faiss", None)
+
+
+def test_brute_force_matches_sorted_distances(no_faiss):
+    import numpy as np
+
+    rng = np.random.default_rng(1)
+    vectors = rng.standard_normal((50, 8)).astype(np.float32)
+
+    class MatrixEmbedder:
+        def embed_text(self, text):
+            return vectors[int(text)]
+
+    store = VectorStore(embedder=MatrixEmbedder())
+    store.build([str(i) for i in range(50)])
+    assert store.index is None
+    assert store.matrix.shape == (50, 8) and store.matrix.flags["C_CONTIGUOUS"]
+    query = rng.standard_normal(8).astype(np.float32)
+    dists, idxs = store.search_vectors(query, top_k=5)
+    expected = np.argsort(np.linalg.norm(vectors - query, axis=1))[:5]
+    assert list(idxs[0]) == list(expected)
+    assert np.allclose(dists[0], np.sum((vectors[expected] - query) ** 2, axis=1))
+    # 文書数より大きい top_k は全件を距離順に返す
+    assert len(store.search_vectors(query, top_k=100)[1][0]) == 50
+
+
+def test_query_many_matches_query(no_faiss):
+    store = VectorStore(embedder=DummyEmbedder())
+    store.build(["aaa", "bb", "c", "dddddd"])
+    queries = ["dddd", "x", "eeeee"]
+    assert store.query_many(queries, top_k=2) == [
+        store.query(q, top_k=2) for q in queries
+    ]
+    assert store.query_many([]) == []
+
+
+def test_unpickle_legacy_embeddings_list(no_faiss):
+    import pickle
+
+    import numpy as np
+
+    store = VectorStore(embedder=None)
+    legacy_state = {
+        "embedder": None,
+        "index": None,
+        "docs": ["aaa", "bb"],
+        "embeddings": [np.array([3.0], "float32"), np.array([2.0], "float32")],
+    }
+    store.__dict__ = legacy_state
+    restored = pickle.loads(pickle.dumps(store))
+    restored.embedder = DummyEmbedder()
+    assert restored.matrix.shape == (2, 1)
+    assert restored.query("b", top_k=1) == ["bb"]
+
+
+def test_rag_pipeline_uses_lexical_index_before_rag(monkeypatch):
+    from src.phase6.lexical_index import LexicalIndex
+
+    vs = VectorStore(embedder=DummyEmbedder())
+    queries = []
+    monkeypatch.setattr(vs, "query", lambda text, top_k=5: queries.append(text) or [])
+    rag = RAGPipeline(
+        vector_store=vs,
+        llm_model="dummy-model",
+        product_index=LexicalIndex([("A001", ["ノートパソコン"])]),
+        customer_index=LexicalIndex([("山田商店", ["ヤマダ商店"])]),
+    )
+    assert rag.correct_product_name("Ａ００１") == "A001"
+    assert rag.correct_product_name("ノートパソコソ") == "A001"
+    assert rag.correct_product_name("プリンター") == "normalized"
+    assert rag.correct_customer_name("ヤマダ 商店") == "山田商店"
+    assert queries == ["プリンター"]
+
+    metrics = rag.tier_metrics()
+    assert metrics["product"]["lookups"] == 3
+    assert metrics["product"]["exact"]["count"] == 1
+    assert metrics["product"]["fuzzy"]["count"] == 1
+    assert metrics["product"]["rag"]["fraction"] == 1 / 3
+    assert metrics["customer"]["exact"]["fraction"] == 1.0
+
+
+def test_rag_pipeline_from_masters(tmp_path):
+    products = tmp_path / "products.md"
+    products.write_text("A001: ノートパソコン\n", encoding="utf-8")
+    rag = RAGPipeline.from_masters(
+        VectorStore(embedder=DummyEmbedder()),
+        products_path=str(products),
+        customers_path=str(tmp_path / "missing.md"),
+    )
+    assert rag.customer_index is None
+    assert rag.correct_product_name("ノート パソコン") == "A001"
+
+
+def test_normalize_order_batches_rag_lookups(monkeypatch):
+    import json
+    from datetime import date
+
+    from src.phase2.transform import OrderData
+    from src.phase6.lexical_index import LexicalIndex
+
+    vs = VectorStore(embedder=DummyEmbedder())
+    batches = []
+    monkeypatch.setattr(
+        vs,
+        "query_many",
+        lambda texts, top_k=5: batches.append(texts) or [["A001"]] * len(texts),
+    )
+    prompts = []
+
+    def create(model, messages):
+        prompts.append(messages[0]["content"])
+        out = [{"id": 0, "normalized": "山田商店"}, {"id": 1, "normalized": "B002"}]
+        resp = DummyLLM.create(model, messages)
+        resp.choices[0].message.content = f"結果:\n{json.dumps(out)}"
+        return resp
+
+    monkeypatch.setattr(__import__("openai").ChatCompletion, "create", create)
+    rag = RAGPipeline(
+        vector_store=vs,
+        llm_model="dummy-model",
+        product_index=LexicalIndex([("A001", ["ノートパソコン"])]),
+    )
+    day = date(2024, 1, 1)
+    orders = [
+        OrderData("ヤマダ", "ノートパソコン", 1, day),
+        OrderData("ヤマダ", "マウス", 2, day),
+        OrderData("ヤマダ", "マウス", 3, day),
+    ]
+    result = rag.normalize_order(orders)
+
+    assert [o.product_id for o in result] == ["A001", "B002", "B002"]
+    assert {o.customer_name for o in result} == {"山田商店"}
+    assert [o.quantity for o in result] == [1, 2, 3]
+    assert batches == [["ヤマダ", "マウス"]]
+    assert len(prompts) == 1
+    assert '"kind": "customer"' in prompts[0]
+    assert rag.tier_metrics()["product"]["rag"]["count"] == 1
+
+    single = rag.normalize_order(OrderData("山田商店", "A001", 1, day))
+    assert single.product_id == "A001"
+    assert len(prompts) == 2
+
+
+def test_normalize_order_skips_llm_when_all_resolved(monkeypatch):
+    from datetime import date
+
+    from src.phase2.transform import OrderData
+    from src.phase6.lexical_index import LexicalIndex
+
+    monkeypatch.setattr(
+        __import__("openai").ChatCompletion,
+        "create",
+        lambda **kwargs: pytest.fail("LLM should not be called"),
+    )
+    rag = RAGPipeline(
+        vector_store=VectorStore(embedder=DummyEmbedder()),
+        product_index=LexicalIndex([("A001", [])]),
+        customer_index=LexicalIndex([("山田商店", [])]),
+    )
+    order = OrderData("山田 商店", "ａ００１", 1, date(2024, 1, 1))
+    assert rag.normalize_order(order) == OrderData(
+        "山田商店", "A001", 1, order.delivery_date
+    )
+
+
+def test_normalize_order_rejects_invalid_llm_response(monkeypatch):
+    from datetime import date
+
+    from src.phase2.transform import OrderData
+
+    vs = VectorStore(embedder=DummyEmbedder())
+    monkeypatch.setattr(vs, "query_many", lambda texts, top_k=5: [[]] * len(texts))
+    rag = RAGPipeline(vector_store=vs)
+    with pytest.raises(ValueError):
+        rag.normalize_order(OrderData("x", "y", 1, date(2024, 1, 1)))
+
+
+@pytest.mark.parametrize("with_faiss", [True, False])
+def test_vector_store_add_and_remove(monkeypatch, with_faiss):
+    import src.phase6.vector_store as vector_store
+
+    if not with_faiss:
+        monkeypatch.setattr(vector_store, "faiss", None)
+    store = VectorStore(embedder=DummyEmbedder())
+    assert store.add(["a", "bbbb"]) == [0, 1]
+    assert store.add(["cc"], vectors=[[2.0]]) == [2]
+    store.remove([0])
+    assert store.docs == ["bbbb", "cc"]
+    assert store.query("xxx", top_k=2) == ["bbbb", "cc"]
+    assert store.query("x", top_k=1) == ["cc"]
+    store.remove([])
+    store.remove([0, 1])
+    assert store.docs == [] and store.matrix.shape[0] == 0
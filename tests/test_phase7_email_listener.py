@@ -43,16 +43,20 @@ def test_connect_and_login(monkeypatch):
 def test_fetch_unseen_emails_and_mark_seen(monkeypatch):
     class DummyMail:
         def __init__(self):
-            self._store = []
-
-        def search(self, charset, criterion):
-            return "OK", [b"1 2"]
-
-        def fetch(self, num, spec):
-            return "OK", [(None, b"RAW_CONTENT_" + num)]
-
-        def store(self, num, flags, flag):
-            self._store.append((num, flags, flag))
+            self.calls = []
+
+        def uid(self, command, *args):
+            self.calls.append((command, *args))
+            if command == "SEARCH":
+                return "OK", [b"1 2"]
+            if command == "FETCH":
+                return "OK", [
+                    (b"1 (UID 1 RFC822 {13}", b"RAW_CONTENT_1"),
+                    b")",
+                    (b"2 (UID 2 RFC822 {13}", b"RAW_CONTENT_2"),
+                    b")",
+                ]
+            return "OK", [None]
 
     monkeypatch.setenv("IMAP_HOST", "h")
     monkeypatch.setenv("IMAP_USER", "u")
@@ -62,7 +66,122 @@ def test_fetch_unseen_emails_and_mark_seen(monkeypatch):
     listener.mail = dummy
     mails = listener.fetch_unseen_emails()
     assert mails == [b"RAW_CONTENT_1", b"RAW_CONTENT_2"]
-    assert dummy._store == [(b"1", "+FLAGS", "\\Seen"), (b"2", "+FLAGS", "\\Seen")]
+    # 検索・一括取得・一括既読化の3往復
+    assert dummy.calls == [
+        ("SEARCH", None, "UNSEEN"),
+        ("FETCH", "1:2", "(RFC822)"),
+        ("STORE", "1:2", "+FLAGS", "(\\Seen)"),
+    ]
+    assert listener.last_poll_stats == {"messages": 2, "round_trips": 3, "bytes": 26}
+
+
+def test_mark_as_seen_takes_uid_keyword(monkeypatch):
+    class DummyMail:
+        def __init__(self):
+            self.calls = []
+
+        def uid(self, command, *args):
+            self.calls.append((command, *args))
+            return "OK", [None]
+
+    monkeypatch.setenv("IMAP_HOST", "h")
+    monkeypatch.setenv("IMAP_USER", "u")
+    monkeypatch.setenv("IMAP_PASS", "p")
+    listener = EmailListener()
+    listener.mail = DummyMail()
+    listener.mark_as_seen(uid=b"42")
+    assert listener.mail.calls == [("STORE", "42", "+FLAGS", "(\\Seen)")]
+    # メッセージ番号を位置引数で渡す旧来の呼び出しは黙って別のメールを既読にせず失敗する
+    with pytest.raises(TypeError):
+        listener.mark_as_seen(3)
+
+
+def test_fetch_unseen_emails_chunks_large_backlog(monkeypatch):
+    import src.phase7.email_listener as el
+
+    class DummyMail:
+        def __init__(self):
+            self.fetches = []
+
+        def uid(self, command, *args):
+            if command == "SEARCH":
+                return "OK", [b"1 2 3 5 6"]
+            if command == "FETCH":
+                self.fetches.append(args[0])
+                data = []
+                for part in args[0].split(","):
+                    lo, _, hi = part.partition(":")
+                    for n in range(int(lo), int(hi or lo) + 1):
+                        data += [(f"{n} (UID {n} RFC822 {{1}}".encode(), b"x"), b")"]
+                return "OK", data
+            return "OK", [None]
+
+    monkeypatch.setenv("IMAP_HOST", "h")
+    monkeypatch.setenv("IMAP_USER", "u")
+    monkeypatch.setenv("IMAP_PASS", "p")
+    monkeypatch.setattr(el, "FETCH_CHUNK_SIZE", 3)
+    listener = EmailListener()
+    listener.mail = DummyMail()
+    assert len(listener.fetch_unseen_emails()) == 5
+    assert listener.mail.fetches == ["1:3", "5:6"]
+
+
+def test_fetch_unseen_emails_only_needed_parts(monkeypatch):
+    header = (
+        b"Subject: order\r\nContent-Type: multipart/mixed;\r\n"
+        b' boundary="orig"\r\n\r\n'
+    )
+    text_mime = b"Content-Type: text/plain; charset=utf-8\r\n\r\n"
+    pdf_mime = (
+        b"Content-Type: application/pdf\r\n"
+        b"Content-Disposition: attachment; filename=order.pdf\r\n"
+        b"Content-Transfer-Encoding: base64\r\n\r\n"
+    )
+    structure = (
+        b'7 (UID 7 BODYSTRUCTURE ((("TEXT" "PLAIN" ("CHARSET" "utf-8") NIL NIL '
+        b'"7BIT" 5 1 NIL NIL NIL NIL)("TEXT" "HTML" ("CHARSET" "utf-8") NIL NIL '
+        b'"7BIT" 900 10 NIL NIL NIL NIL) "ALTERNATIVE" ("BOUNDARY" "alt") NIL NIL '
+        b'NIL)("APPLICATION" "PDF" NIL NIL NIL "BASE64" 12 NIL ("ATTACHMENT" '
+        b'("FILENAME" "order.pdf")) NIL NIL) "MIXED" ("BOUNDARY" "orig") NIL NIL NIL))'
+    )
+
+    class DummyMail:
+        def __init__(self):
+            self.calls = []
+
+        def uid(self, command, *args):
+            self.calls.append((command, *args))
+            if command == "SEARCH":
+                return "OK", [b"7"]
+            if command == "FETCH" and args[1] == "(BODYSTRUCTURE)":
+                return "OK", [structure]
+            if command == "FETCH":
+                return "OK", [
+                    (b"7 (UID 7 BODY[HEADER] {%d}" % len(header), header),
+                    (b" BODY[1.1.MIME] {%d}" % len(text_mime), text_mime),
+                    (b" BODY[1.1] {5}", b"Hello"),
+                    (b" BODY[2.MIME] {%d}" % len(pdf_mime), pdf_mime),
+                    (b" BODY[2] {12}", b"JVBERi0xLjQK"),
+                    b")",
+                ]
+            return "OK", [None]
+
+    monkeypatch.setenv("IMAP_HOST", "h")
+    monkeypatch.setenv("IMAP_USER", "u")
+    monkeypatch.setenv("IMAP_PASS", "p")
+    monkeypatch.setenv("IMAP_FETCH_PARTS", "1")
+    listener = EmailListener()
+    listener.mail = DummyMail()
+    (raw,) = listener.fetch_unseen_emails()
+    # HTML パートは取得しない
+    assert listener.mail.calls[2][2] == (
+        "(BODY.PEEK[HEADER] BODY.PEEK[1.1.MIME] BODY.PEEK[1.1] "
+        "BODY.PEEK[2.MIME] BODY.PEEK[2])"
+    )
+    parsed = parse_email_body(raw)
+    assert parsed["body"].strip() == "Hello"
+    assert parsed["pdf"] == b"%PDF-1.4\n"
+    assert listener.last_poll_stats["round_trips"] == 4
 
 
 def test_parse_email_body_plain_and_multipart():
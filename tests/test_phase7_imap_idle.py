@@ -0,0 +1,117 @@
+import imaplib
+import socket
+import threading
+import time
+
+import pytest
+
+from src.phase7.email_listener import EmailListener
+
+
+class FakeIMAPServer:
+    """IDLE の動作確認用の最小限の IMAP サーバ"""
+
+    def __init__(self, idle=True, notify_after=None, exists_on_noop=False):
+        self.caps = "IMAP4rev1 IDLE" if idle else "IMAP4rev1"
+        self.notify_after = notify_after
+        self.exists_on_noop = exists_on_noop
+        self.commands = []
+        self.sock = socket.socket()
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(1)
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        conn, _ = self.sock.accept()
+        f = conn.makefile("rb")
+        conn.sendall(f"* OK [CAPABILITY {self.caps}] ready\r\n".encode())
+        while True:
+            line = f.readline()
+            if not line:
+                return
+            tag, cmd, *_ = line.decode().strip().split(" ") + [""]
+            cmd = cmd.upper()
+            self.commands.append(cmd)
+            if cmd == "CAPABILITY":
+                conn.sendall(f"* CAPABILITY {self.caps}\r\n".encode())
+            elif cmd == "SELECT":
+                conn.sendall(b"* 2 EXISTS\r\n")
+                conn.sendall(f"{tag} OK [READ-WRITE] SELECT completed\r\n".encode())
+                continue
+            elif cmd == "IDLE":
+                conn.sendall(b"+ idling\r\n")
+                if self.notify_after is not None:
+                    time.sleep(self.notify_after)
+                    conn.sendall(b"* 3 EXISTS\r\n")
+                f.readline()  # DONE
+                self.commands.append("DONE")
+            elif cmd == "NOOP" and self.exists_on_noop:
+                # 通常コマンドの応答中に新着が届いたケース
+                conn.sendall(b"* 3 EXISTS\r\n")
+            elif cmd == "LOGOUT":
+                conn.sendall(b"* BYE\r\n")
+            conn.sendall(f"{tag} OK {cmd} completed\r\n".encode())
+
+
+@pytest.fixture
+def connect(monkeypatch):
+    monkeypatch.setenv("IMAP_HOST", "127.0.0.1")
+    monkeypatch.setenv("IMAP_USER", "u")
+    monkeypatch.setenv("IMAP_PASS", "p")
+
+    def _connect(server):
+        monkeypatch.setattr(
+            imaplib, "IMAP4_SSL", lambda host: imaplib.IMAP4(host, server.port)
+        )
+        listener = EmailListener()
+        listener.connect()
+        return listener
+
+    return _connect
+
+
+def test_idle_wakes_on_new_mail(connect):
+    server = FakeIMAPServer(notify_after=0.1)
+    listener = connect(server)
+    start = time.monotonic()
+    assert listener.wait_for_new_mail(timeout=5) is True
+    assert time.monotonic() - start < 2
+    assert server.commands[-2:] == ["IDLE", "DONE"]
+    # IDLE 終了後も通常のコマンドが使える
+    assert listener.mail.noop()[0] == "OK"
+
+
+def test_idle_times_out_and_can_be_reissued(connect):
+    server = FakeIMAPServer()
+    listener = connect(server)
+    assert listener.wait_for_new_mail(timeout=0.2) is False
+    assert listener.wait_for_new_mail(timeout=0.2) is False
+    assert server.commands.count("IDLE") == 2
+    assert server.commands.count("DONE") == 2
+
+
+def test_new_mail_seen_before_idle_returns_immediately(connect):
+    server = FakeIMAPServer(exists_on_noop=True)
+    listener = connect(server)
+    listener.mail.noop()
+    start = time.monotonic()
+    assert listener.wait_for_new_mail(timeout=5) is True
+    assert time.monotonic() - start < 1
+    assert "IDLE" not in server.commands
+    # 保留分は取り出し済みなので次回は IDLE する
+    assert listener.wait_for_new_mail(timeout=0.2) is False
+    assert server.commands.count("IDLE") == 1
+
+
+def test_falls_back_to_polling_without_idle(connect, monkeypatch):
+    server = FakeIMAPServer(idle=False)
+    listener = connect(server)
+    slept = []
+    monkeypatch.setattr(
+        "src.phase7.email_listener.time.sleep", lambda s: slept.append(s)
+    )
+    assert listener.supports_idle() is False
+    assert listener.wait_for_new_mail(timeout=7) is False
+    assert slept == [7]
+    assert "IDLE" not in server.commands
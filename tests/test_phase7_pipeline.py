@@ -0,0 +1,106 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import pytest
+
+from src.phase2.transform import OrderData
+from src.phase7.pipeline import (
+    PipelineStage,
+    StagedPipeline,
+    build_extracted,
+    extract_stage,
+)
+
+
+def test_pipeline_runs_all_stages_and_counts_failures():
+    results = []
+    errors = []
+
+    def parse(x):
+        if x == 3:
+            raise ValueError("bad email")
+        return x * 10
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        pipeline = StagedPipeline(
+            [
+                PipelineStage("parse", parse, workers=2),
+                PipelineStage("extract", abs, workers=2, executor=pool),
+                PipelineStage("notify", results.append),
+            ],
+            queue_size=2,
+            on_error=lambda stage, item, e: errors.append((stage, item)),
+        ).start()
+        for i in range(6):
+            pipeline.submit(i)
+        pipeline.close()
+    assert sorted(results) == [0, 10, 20, 40, 50]
+    assert errors == [("parse", 3)]
+    assert pipeline.stats["parse"] == {"processed": 5, "failed": 1, "dropped": 0}
+    # notify は None を返すため下流へは流さない
+    assert pipeline.stats["notify"]["dropped"] == 5
+
+
+def test_pipeline_backpressure_blocks_submit():
+    release = threading.Event()
+    pipeline = StagedPipeline(
+        [PipelineStage("slow", lambda x: release.wait())], queue_size=1
+    ).start()
+    pipeline.submit(1)  # ワーカーが処理中
+    pipeline.submit(2)  # キューに1件
+    with pytest.raises(queue.Full):
+        pipeline.submit(3, timeout=0.05)
+    release.set()
+    pipeline.submit(3, timeout=1)
+    pipeline.close()
+    assert pipeline.stats["slow"]["processed"] == 3
+
+
+def test_extract_stage_and_build_extracted():
+    text = "顧客: テスト商店\n商品: A001\n数量: 2\n商品: B002\n数量: 3\n配送希望日: 2025-08-01\n"
+    original, order = extract_stage(text)
+    assert original == text
+    extracted, items = build_extracted(order)
+    assert items == [
+        {"product_id": "A001", "quantity": 2},
+        {"product_id": "B002", "quantity": 3},
+    ]
+    assert extracted["customer_name"] == "テスト商店"
+    assert extracted["delivery_date"] == date(2025, 8, 1)
+
+    single = OrderData("C", "A001", 1, date(2025, 1, 1))
+    extracted, items = build_extracted(single)
+    assert extracted["product_id"] == "A001"
+    assert items == [{"product_id": "A001", "quantity": 1}]
+
+
+def test_extract_with_pdf_service_and_manual_review_message():
+    from src.phase2.pdf_worker import PdfExtractionTimeout
+    from src.phase2.transform import ExtractedPdf
+    from src.phase3.message import build_manual_review_notification
+    from src.phase7.pipeline import extract_with_pdf_service
+
+    class FakeService:
+        def __init__(self):
+            self.calls = []
+
+        def extract(self, pdf, need_text=True):
+            self.calls.append((pdf, need_text))
+            if pdf == b"slow":
+                raise PdfExtractionTimeout("PDF extraction exceeded 30.0s")
+            return ExtractedPdf(items=[{"product_id": "A001", "quantity": 2}])
+
+    svc = FakeService()
+    email = {"body": "顧客: テスト商店", "pdf": b"pdf"}
+    original, orders = extract_with_pdf_service(svc, email)
+    assert original is email
+    assert [(o.customer_name, o.product_id) for o in orders] == [("テスト商店", "A001")]
+    assert svc.calls == [(b"pdf", False)]
+
+    with pytest.raises(PdfExtractionTimeout) as exc:
+        extract_with_pdf_service(svc, {"body": "", "pdf": b"slow"})
+    payload = build_manual_review_notification({"pdf": b"slow"}, str(exc.value))
+    assert "手動で確認" in payload["blocks"][0]["text"]["text"]
+    assert "exceeded 30.0s" in payload["text"]